@@ -0,0 +1,143 @@
+import argparse
+import json
+import logging
+import pathlib
+import shirley as sh
+import sys
+import time
+from typing import Dict, Iterator, Set
+
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+
+
+def read_records(filename: pathlib.Path) -> Iterator[Dict]:
+    with open(filename, encoding='utf-8') as file:
+        for line_number, line in enumerate(file):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            # Records without an id are identified by their line, which stays stable across resumed runs.
+            record.setdefault('id', line_number)
+            yield record
+
+
+def read_done(filename: pathlib.Path) -> Set[str]:
+    done = set()
+    if not filename.exists():
+        return done
+    with open(filename, encoding='utf-8') as file:
+        for line in file:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                # A line cut short by an interruption is simply run again.
+                continue
+            if result.get('error') is None:
+                done.add(json.dumps(result['id']))
+    return done
+
+
+def drop_partial_line(filename: pathlib.Path) -> None:
+    # An interrupted run may leave the last result without its newline; the next result is appended after it, so the
+    # fragment is cut off first rather than left to corrupt that line too.
+    if not filename.exists():
+        return
+    with open(filename, 'rb+') as file:
+        data = file.read()
+        if data and not data.endswith(b'\n'):
+            file.truncate(data.rfind(b'\n') + 1)
+
+
+def get_query(record: Dict, directory: pathlib.Path) -> str:
+    pictures = ''
+    for i, image in enumerate(record.get('images') or [], start=1):
+        filepath = image if '://' in image else str((directory / image).resolve())
+        pictures += f'Picture {i}: <img>{filepath}</img>\n'
+    return pictures + record['query']
+
+
+def get_history(record: Dict) -> sh.QwenHistory:
+    return [(query, response) for query, response in record.get('history') or []]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Run chat queries from a JSONL file and write responses to JSONL.')
+    parser.add_argument('input', type=pathlib.Path, help='JSONL file of "query", "history", "images" and "id".')
+    parser.add_argument('output', type=pathlib.Path, help='JSONL file to append responses to.')
+    parser.add_argument('--model', type=str, default=None, help='Model in ./models (default: the first one).')
+    parser.add_argument('--max-batch-size', type=int, default=8)
+    parser.add_argument('--max-new-tokens', type=int, default=None)
+    parser.add_argument('--precision', type=str, default=None, choices=['bf16', 'fp16', 'fp32'])
+    parser.add_argument('--overwrite', action='store_true', help='Start over instead of resuming from the output.')
+    parser.add_argument('--report-interval', type=float, default=10.0)
+    args = parser.parse_args()
+
+    if args.overwrite and args.output.exists():
+        args.output.unlink()
+
+    done = read_done(filename=args.output)
+    drop_partial_line(filename=args.output)
+    records = list(read_records(filename=args.input))
+    skipped = len(records)
+    records = [record for record in records if json.dumps(record['id']) not in done]
+    skipped -= len(records)
+    logger.info(f'{skipped} record(s) already done, {len(records)} to run.')
+    if not records:
+        return
+
+    client = sh.ChatClient(options=sh.ChatClientOptions(max_batch_size=args.max_batch_size, precision=args.precision))
+    pretrained_model_name_or_path = client.get_model_name_or_path(model_name=args.model or client.get_models()[0])
+    start = time.perf_counter()
+    client.load_model(pretrained_model_name_or_path=pretrained_model_name_or_path)
+    load_seconds = time.perf_counter() - start
+
+    directory = args.input.resolve().parent
+    queries = [(get_query(record=record, directory=directory), get_history(record=record)) for record in records]
+    results = client.chat_batch(
+        queries=queries,
+        pretrained_model_name_or_path=pretrained_model_name_or_path,
+        max_new_tokens=args.max_new_tokens,
+    )
+
+    args.output.parent.mkdir(exist_ok=True, parents=True)
+    completed, failed, input_tokens, output_tokens = 0, 0, 0, 0
+    start = report = time.perf_counter()
+    with open(args.output, 'a', encoding='utf-8') as file:
+        for result in results:
+            line: Dict = {'id': records[result.index]['id']}
+            if result.error is None:
+                line.update(response=result.response, input_tokens=result.input_tokens,
+                            output_tokens=result.output_tokens)
+                completed += 1
+            else:
+                line.update(error=result.error)
+                failed += 1
+            # Every result is flushed as soon as it is written, so an interrupted run resumes from here.
+            file.write(json.dumps(line, ensure_ascii=False) + '\n')
+            file.flush()
+            input_tokens += result.input_tokens
+            output_tokens += result.output_tokens
+
+            if time.perf_counter() - report >= args.report_interval:
+                report = time.perf_counter()
+                logger.info(f'{completed + failed}/{len(records)} done, '
+                            f'{output_tokens / (report - start):.1f} output tokens/s.')
+
+    seconds = time.perf_counter() - start
+    print(json.dumps({
+        'model': pretrained_model_name_or_path,
+        'skipped': skipped,
+        'completed': completed,
+        'failed': failed,
+        'load_seconds': load_seconds,
+        'seconds': seconds,
+        'requests_per_second': (completed + failed) / seconds,
+        'input_tokens_per_second': input_tokens / seconds,
+        'output_tokens_per_second': output_tokens / seconds,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+import argparse
+import datetime
+import importlib.metadata
+import json
+import platform
+import shirley as sh
+import subprocess
+import sys
+import tempfile
+import torch
+import transformers
+from benchmarks import chat, parse, tinyqwen, tts
+from typing import Dict
+
+
+def get_metadata() -> Dict:
+    try:
+        version = importlib.metadata.version('shirley')
+    except importlib.metadata.PackageNotFoundError:
+        version = None
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+
+    return {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'shirley': version,
+        'commit': commit,
+        'python': platform.python_version(),
+        'torch': torch.__version__,
+        'transformers': transformers.__version__,
+        'platform': platform.platform(),
+        'threads': torch.get_num_threads(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Run the offline benchmarks against a tiny stand-in model and a fake synthesizer.')
+    parser.add_argument('--output', type=str, default=None, help='JSON file to write results to (default: stdout).')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--history', type=int, nargs='+', default=[1, 10, 100, 1000])
+    parser.add_argument('--max-new-tokens', type=int, default=64)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        pretrained_model_name_or_path = tinyqwen.build(
+            directory=f'{directory}/tinyqwen',
+            max_new_tokens=args.max_new_tokens,
+        )
+
+        client = sh.ChatClient(options=sh.ChatClientOptions(local=False))
+        client.load_model(pretrained_model_name_or_path=pretrained_model_name_or_path)
+
+        results = {
+            'metadata': get_metadata(),
+            'load_model': chat.run_load_model(
+                pretrained_model_name_or_path=pretrained_model_name_or_path,
+                repeat=args.repeat,
+            ),
+            'chat_stream': [
+                chat.run_chat_stream(
+                    client=client,
+                    pretrained_model_name_or_path=pretrained_model_name_or_path,
+                    concurrency=concurrency,
+                )
+                for concurrency in args.concurrency
+            ],
+            'get_query_and_history': chat.run_history(
+                pretrained_model_name_or_path=pretrained_model_name_or_path,
+                lengths=args.history,
+                repeat=args.repeat,
+            ),
+            'parse': parse.run(),
+            'tts': tts.run(),
+        }
+        client.unload_model(pretrained_model_name_or_path=pretrained_model_name_or_path)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output)
+    else:
+        sys.stdout.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
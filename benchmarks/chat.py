@@ -0,0 +1,106 @@
+import gradio as gr
+import shirley as sh
+import statistics
+import threading
+import time
+from shirley.interfaces.chat import ChatSession
+from typing import Dict, List
+
+
+def _summarize(values: List[float]) -> Dict:
+    values = sorted(values)
+    return {
+        'median': statistics.median(values),
+        'p90': values[min(len(values) - 1, int(len(values) * 0.9))],
+        'min': values[0],
+        'max': values[-1],
+    }
+
+
+def run_load_model(pretrained_model_name_or_path: str, repeat: int = 3) -> Dict:
+    seconds = []
+    for _ in range(repeat):
+        client = sh.ChatClient(options=sh.ChatClientOptions(local=False))
+        start = time.perf_counter()
+        client.load_model(pretrained_model_name_or_path=pretrained_model_name_or_path)
+        seconds.append(time.perf_counter() - start)
+        client.unload_model(pretrained_model_name_or_path=pretrained_model_name_or_path)
+    return {'repeat': repeat, 'seconds': _summarize(seconds)}
+
+
+def run_chat_stream(
+    client: sh.ChatClient,
+    pretrained_model_name_or_path: str,
+    concurrency: int,
+    requests_per_worker: int = 4,
+    history_turns: int = 2,
+) -> Dict:
+    history = [(f'Earlier question {i}?', f'Earlier answer {i}.') for i in range(history_turns)]
+    ttfts: List[float] = []
+    tokens: List[int] = []
+    lock = threading.Lock()
+
+    def worker(index: int) -> None:
+        for i in range(requests_per_worker):
+            start = time.perf_counter()
+            ttft, count = None, 0
+            for _ in client.chat_stream(
+                query=f'Question {index}-{i}: what is the weather like?',
+                history=history,
+                pretrained_model_name_or_path=pretrained_model_name_or_path,
+            ):
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                count += 1
+            with lock:
+                ttfts.append(ttft if ttft is not None else time.perf_counter() - start)
+                tokens.append(count)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+
+    return {
+        'concurrency': concurrency,
+        'requests': len(tokens),
+        'tokens': sum(tokens),
+        'seconds': seconds,
+        'tokens_per_second': sum(tokens) / seconds,
+        'ttft_seconds': _summarize(ttfts),
+    }
+
+
+def run_history(pretrained_model_name_or_path: str, lengths: List[int], repeat: int = 5) -> List[Dict]:
+    # The model is loaded so that the history is fitted into its context window: the first run tokenizes every turn,
+    # later runs find the counts cached.
+    with gr.Blocks():
+        interface = sh.ChatInterface(options=sh.ChatInterfaceOptions(client=sh.ChatClientOptions(local=False)))
+    interface._client.load_model(pretrained_model_name_or_path=pretrained_model_name_or_path)
+
+    results = []
+    for length in lengths:
+        session = ChatSession(pretrained_model_name_or_path=pretrained_model_name_or_path, max_history_size=None)
+        session.loaded_model_name_or_path = pretrained_model_name_or_path
+        session.history = [
+            (f'Question {length}-{i}: ' + 'lorem ipsum ' * 20, f'Answer {i}: ' + 'dolor sit amet ' * 40)
+            for i in range(length)
+        ] + [('Final question?', None)]
+
+        seconds = []
+        for _ in range(repeat + 1):
+            start = time.perf_counter()
+            interface._get_query_and_history(session=session)
+            seconds.append(time.perf_counter() - start)
+        results.append({
+            'turns': length,
+            'cold_seconds': seconds[0],
+            'seconds': _summarize(seconds[1:]),
+            'context': session.context_report,
+        })
+
+    interface._client.unload_model(pretrained_model_name_or_path=pretrained_model_name_or_path)
+    return results
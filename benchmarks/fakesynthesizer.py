@@ -0,0 +1,52 @@
+import threading
+from types import SimpleNamespace
+from typing import Any, Callable
+
+
+class EventSignal:
+
+    def __init__(self) -> None:
+        self._callbacks = []
+
+
+    def connect(self, callback) -> None:
+        self._callbacks.append(callback)
+
+
+    def signal(self, event) -> None:
+        for callback in self._callbacks:
+            callback(event)
+
+
+class FakeSynthesizer:
+
+    # Stands in for `speechsdk.SpeechSynthesizer`: completes on a timer thread after a fixed per-request latency plus
+    # a per-character latency, with `make_result(voice, text)` as the result (by default the pair itself).
+    def __init__(
+        self,
+        voice: str,
+        latency: float = 0.05,
+        char_latency: float = 0.0,
+        make_result: Callable[[str, str], Any] | None = None,
+    ) -> None:
+        self.voice = voice
+        self.latency = latency
+        self.char_latency = char_latency
+        self.make_result = make_result or (lambda voice, text: (voice, text))
+        self.active = 0
+        self.synthesis_completed = EventSignal()
+        self.synthesis_canceled = EventSignal()
+
+
+    def speak_text_async(self, text: str) -> SimpleNamespace:
+        # Like the SDK, a synthesizer handles one request at a time.
+        self.active += 1
+        assert self.active == 1
+        result = self.make_result(self.voice, text)
+
+        def complete() -> None:
+            self.active -= 1
+            self.synthesis_completed.signal(SimpleNamespace(result=result))
+
+        threading.Timer(self.latency + self.char_latency * len(text), complete).start()
+        return SimpleNamespace()
@@ -0,0 +1,67 @@
+import argparse
+import json
+import random
+import time
+from shirley.utils import IncrementalParser, parse
+from typing import Dict, List
+
+
+def make_response(num_lines: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    lines = []
+    for i in range(num_lines):
+        if i % 40 == 10:
+            lines.append('```python')
+        elif i % 40 == 30:
+            lines.append('```')
+        elif 10 < i % 40 < 30:
+            lines.append(f'    value_{i} = compute(x[{i}], y.get("{i}")) * 2 - 1  # <tag> $cost!')
+        else:
+            words = [rng.choice(['the', 'model', '<ref>box</ref>', 'answer', 'is', '*bold*', 'code']) for _ in range(12)]
+            lines.append(' '.join(words) + '.')
+    return '\n'.join(lines)
+
+
+def get_prefixes(text: str, chunk_size: int) -> List[str]:
+    return [text[:end] for end in range(chunk_size, len(text) + chunk_size, chunk_size)]
+
+
+def run(num_lines: int = 400, chunk_size: int = 4, remove_image_tags: bool = True) -> Dict:
+    text = make_response(num_lines=num_lines)
+    prefixes = get_prefixes(text=text, chunk_size=chunk_size)
+
+    start = time.perf_counter()
+    for prefix in prefixes:
+        expected = parse(text=prefix, remove_image_tags=remove_image_tags)
+    parse_seconds = time.perf_counter() - start
+
+    parser = IncrementalParser(remove_image_tags=remove_image_tags)
+    start = time.perf_counter()
+    for prefix in prefixes:
+        actual = parser.parse(text=prefix)
+    incremental_seconds = time.perf_counter() - start
+
+    if actual != expected:
+        raise AssertionError('IncrementalParser output differs from parse.')
+
+    return {
+        'chars': len(text),
+        'chunks': len(prefixes),
+        'parse_seconds': parse_seconds,
+        'incremental_seconds': incremental_seconds,
+        'parse_chars_per_second': sum(map(len, prefixes)) / parse_seconds,
+        'speedup': parse_seconds / incremental_seconds,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Compare parse and IncrementalParser on a streamed response.')
+    parser.add_argument('--lines', type=int, default=400)
+    parser.add_argument('--chunk-size', type=int, default=4)
+    args = parser.parse_args()
+
+    print(json.dumps(run(num_lines=args.lines, chunk_size=args.chunk_size), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+import argparse
+import json
+import os
+import pathlib
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks import tinyqwen
+from typing import Dict, List
+
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+IMPORT_SCRIPT = '''
+import sys
+import time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+'''
+
+WEBUI_SCRIPT = '''
+import sys
+sys.path.insert(0, {root!r})
+import webui
+webui.main()
+'''
+
+
+def _run_import(module: str, env: Dict[str, str]) -> float:
+    script = IMPORT_SCRIPT.format(root=str(ROOT), module=module)
+    output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, env=env, check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def _is_listening(host: str, port: int) -> bool:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.settimeout(0.1)
+        return sock.connect_ex((host, port)) == 0
+
+
+def _run_webui(directory: pathlib.Path, env: Dict[str, str], host: str, port: int, timeout: float) -> float:
+    # `webui.main` resolves ./models and ./static relative to the working directory.
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-c', WEBUI_SCRIPT.format(root=str(ROOT))],
+        cwd=directory,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while not _is_listening(host=host, port=port):
+            if process.poll() is not None:
+                raise RuntimeError(f'webui exited with code {process.returncode} before listening.')
+            if time.perf_counter() - start > timeout:
+                raise TimeoutError(f'webui did not listen on {host}:{port} within {timeout} seconds.')
+            time.sleep(0.02)
+        return time.perf_counter() - start
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def _summarize(values: List[float]) -> Dict:
+    return {'median': statistics.median(values), 'min': min(values), 'max': max(values)}
+
+
+def run(repeat: int = 3, host: str = '127.0.0.1', port: int = 8000, timeout: float = 120.0) -> Dict:
+    if _is_listening(host=host, port=port):
+        raise RuntimeError(f'{host}:{port} is already in use.')
+
+    with tempfile.TemporaryDirectory() as directory:
+        directory = pathlib.Path(directory)
+        tinyqwen.build(directory=directory / 'models' / 'tinyqwen')
+        (directory / 'static').symlink_to(ROOT / 'static', target_is_directory=True)
+        env = dict(
+            os.environ,
+            GRADIO_TEMP_DIR=str(directory / 'gradio'),
+            GRADIO_ANALYTICS_ENABLED='False',
+            SHIRLEY_PORT=str(port),
+        )
+
+        return {
+            'repeat': repeat,
+            'import_shirley_seconds': _summarize([_run_import(module='shirley', env=env) for _ in range(repeat)]),
+            'import_webui_seconds': _summarize([_run_import(module='webui', env=env) for _ in range(repeat)]),
+            'time_to_listen_seconds': _summarize([
+                _run_webui(directory=directory, env=env, host=host, port=port, timeout=timeout)
+                for _ in range(repeat)
+            ]),
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Measure import time and time until the WebUI listens.')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+
+    print(json.dumps(run(repeat=args.repeat, port=args.port), indent=2))
+
+
+if __name__ == '__main__':
+    main()
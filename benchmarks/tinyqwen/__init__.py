@@ -0,0 +1,70 @@
+import json
+import pathlib
+import shutil
+import torch
+import transformers
+
+
+FILENAMES = ['configuration_tinyqwen.py', 'modeling_tinychat.py', 'modeling_tinyqwen.py', 'tokenization_tinyqwen.py']
+
+
+def build(
+    directory: str | pathlib.Path,
+    n_layer: int = 2,
+    n_embd: int = 64,
+    n_head: int = 4,
+    n_positions: int = 8192,
+    max_new_tokens: int = 64,
+    seed: int = 0,
+    make_context: bool = True,
+) -> str:
+    # Writes a randomly initialized, Qwen-compatible checkpoint (ChatML `make_context`, stop words, byte tokenizer)
+    # that `ChatClient.load_model` can load with `trust_remote_code` and no network access. Without `make_context`
+    # the model only offers its own `chat_stream`, like the models that the generation engine does not serve.
+    directory = pathlib.Path(directory)
+    directory.mkdir(exist_ok=True, parents=True)
+    for filename in FILENAMES:
+        shutil.copy(pathlib.Path(__file__).parent / filename, directory / filename)
+
+    config = {
+        'model_type': 'tinyqwen',
+        'architectures': ['TinyQwenForCausalLM' if make_context else 'TinyChatForCausalLM'],
+        'auto_map': {
+            'AutoConfig': 'configuration_tinyqwen.TinyQwenConfig',
+            'AutoModelForCausalLM': (
+                'modeling_tinyqwen.TinyQwenForCausalLM' if make_context else 'modeling_tinychat.TinyChatForCausalLM'
+            ),
+        },
+        'vocab_size': 259,
+        'n_layer': n_layer,
+        'n_embd': n_embd,
+        'n_head': n_head,
+        'n_positions': n_positions,
+        'bos_token_id': 256,
+        'eos_token_id': 256,
+    }
+    (directory / 'config.json').write_text(json.dumps(config, indent=2))
+
+    tokenizer_config = {
+        'tokenizer_class': 'TinyQwenTokenizer',
+        'auto_map': {'AutoTokenizer': ['tokenization_tinyqwen.TinyQwenTokenizer', None]},
+    }
+    (directory / 'tokenizer_config.json').write_text(json.dumps(tokenizer_config, indent=2))
+
+    torch.manual_seed(seed)
+    config = transformers.AutoConfig.from_pretrained(directory, local_files_only=True, trust_remote_code=True)
+    model = transformers.AutoModelForCausalLM.from_config(config, trust_remote_code=True)
+    model.save_pretrained(directory)
+
+    generation_config = {
+        'chat_format': 'chatml',
+        'do_sample': True,
+        'top_k': 0,
+        'top_p': 1.0,
+        'max_new_tokens': max_new_tokens,
+        'max_window_size': n_positions - max_new_tokens,
+        'eos_token_id': 256,
+        'pad_token_id': 256,
+    }
+    (directory / 'generation_config.json').write_text(json.dumps(generation_config, indent=2))
+    return str(directory)
@@ -0,0 +1,20 @@
+import transformers
+
+
+class TinyQwenConfig(transformers.GPT2Config):
+
+    model_type = 'tinyqwen'
+
+    def __init__(
+        self,
+        bf16: bool = False,
+        fp16: bool = False,
+        fp32: bool = False,
+        tokenizer_type: str = 'TinyQwenTokenizer',
+        **kwargs,
+    ) -> None:
+        self.bf16 = bf16
+        self.fp16 = fp16
+        self.fp32 = fp32
+        self.tokenizer_type = tokenizer_type
+        super().__init__(**kwargs)
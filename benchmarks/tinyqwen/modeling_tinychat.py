@@ -0,0 +1,6 @@
+from .modeling_tinyqwen import TinyQwenForCausalLM
+
+
+# The same model in a module without `make_context`, so the chat client falls back to `chat_stream`.
+class TinyChatForCausalLM(TinyQwenForCausalLM):
+    pass
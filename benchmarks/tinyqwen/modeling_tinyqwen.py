@@ -0,0 +1,84 @@
+import torch
+import transformers
+from .configuration_tinyqwen import TinyQwenConfig
+from typing import Iterator, List, Tuple
+
+
+def get_stop_words_ids(chat_format: str, tokenizer: transformers.PreTrainedTokenizer) -> List[List[int]]:
+    return [[tokenizer.im_end_id], [tokenizer.im_start_id]]
+
+
+def make_context(
+    tokenizer: transformers.PreTrainedTokenizer,
+    query: str,
+    history: List[Tuple[str, str]] = None,
+    system: str = '',
+    max_window_size: int = 6144,
+    chat_format: str = 'chatml',
+) -> Tuple[str, List[int]]:
+    # Same ChatML layout as Qwen's `make_context`, so prompts have realistic shapes and shared prefixes.
+    history = history or []
+    im_start, im_end = [tokenizer.im_start_id], [tokenizer.im_end_id]
+    nl = tokenizer.encode('\n')
+
+    def tokenize(role: str, content: str) -> List[int]:
+        return tokenizer.encode(role) + nl + tokenizer.encode(content)
+
+    system_tokens = im_start + tokenize('system', system) + im_end
+    raw_text = f'<|im_start|>system\n{system}<|im_end|>'
+    context_tokens: List[int] = []
+    for turn_query, turn_response in reversed(history):
+        query_tokens = im_start + tokenize('user', turn_query) + im_end
+        response_tokens = im_start + tokenize('assistant', turn_response) + im_end
+        next_context_tokens = nl + query_tokens + nl + response_tokens
+        if len(system_tokens) + len(next_context_tokens) + len(context_tokens) >= max_window_size:
+            break
+        context_tokens = next_context_tokens + context_tokens
+        raw_text = raw_text + f'\n<|im_start|>user\n{turn_query}<|im_end|>\n<|im_start|>assistant\n{turn_response}<|im_end|>'
+
+    context_tokens = system_tokens + context_tokens
+    context_tokens += nl + im_start + tokenize('user', query) + im_end + nl + im_start + tokenizer.encode('assistant') + nl
+    raw_text += f'\n<|im_start|>user\n{query}<|im_end|>\n<|im_start|>assistant\n'
+    return raw_text, context_tokens
+
+
+class TinyQwenForCausalLM(transformers.GPT2LMHeadModel):
+
+    config_class = TinyQwenConfig
+
+
+    def chat_stream(
+        self,
+        tokenizer: transformers.PreTrainedTokenizer,
+        query: str,
+        history: List[Tuple[str, str]] | None = None,
+        system: str = 'You are a helpful assistant.',
+    ) -> Iterator[str]:
+        # Like Qwen's `chat_stream`, yields the whole response decoded so far after every token.
+        generation_config = self.generation_config
+        _, context_tokens = make_context(
+            tokenizer,
+            query,
+            history=history,
+            system=system,
+            max_window_size=generation_config.max_window_size,
+            chat_format=generation_config.chat_format,
+        )
+        stop_token_ids = {tokenizer.eod_id, tokenizer.im_start_id, tokenizer.im_end_id}
+        input_ids = torch.tensor([context_tokens], device=self.device)
+        past_key_values = None
+        output_ids: List[int] = []
+        with torch.inference_mode():
+            for _ in range(generation_config.max_new_tokens):
+                outputs = self(input_ids=input_ids, past_key_values=past_key_values, use_cache=True)
+                past_key_values = outputs.past_key_values
+                logits = outputs.logits[0, -1, :]
+                if generation_config.do_sample:
+                    token = int(torch.multinomial(torch.softmax(logits, dim=-1), num_samples=1).item())
+                else:
+                    token = int(torch.argmax(logits).item())
+                if token in stop_token_ids:
+                    return
+                output_ids.append(token)
+                yield tokenizer.decode(output_ids, skip_special_tokens=True, errors='ignore')
+                input_ids = torch.tensor([[token]], device=self.device)
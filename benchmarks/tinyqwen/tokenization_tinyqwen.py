@@ -0,0 +1,81 @@
+import transformers
+from typing import Dict, List, Tuple
+
+
+SPECIAL_TOKENS = {
+    '<|endoftext|>': 256,
+    '<|im_start|>': 257,
+    '<|im_end|>': 258,
+}
+
+
+class TinyQwenTokenizer(transformers.PreTrainedTokenizer):
+
+    vocab_files_names: Dict[str, str] = {}
+    model_input_names = ['input_ids', 'attention_mask']
+
+    def __init__(self, **kwargs) -> None:
+        self.special_tokens = dict(SPECIAL_TOKENS)
+        self.eod_id = self.special_tokens['<|endoftext|>']
+        self.im_start_id = self.special_tokens['<|im_start|>']
+        self.im_end_id = self.special_tokens['<|im_end|>']
+        super().__init__(**kwargs)
+
+
+    @property
+    def vocab_size(self) -> int:
+        return 256 + len(self.special_tokens)
+
+
+    def get_vocab(self) -> Dict[str, int]:
+        vocab = {chr(i): i for i in range(256)}
+        vocab.update(self.special_tokens)
+        return vocab
+
+
+    def _tokenize(self, text: str, **kwargs) -> List[str]:
+        return [chr(byte) for byte in text.encode('utf-8')]
+
+
+    def _convert_token_to_id(self, token: str) -> int:
+        return self.special_tokens[token] if token in self.special_tokens else ord(token)
+
+
+    def _convert_id_to_token(self, index: int) -> str:
+        for token, token_id in self.special_tokens.items():
+            if token_id == index:
+                return token
+        return chr(index)
+
+
+    def convert_tokens_to_string(self, tokens: List[str]) -> str:
+        return bytes(ord(token) for token in tokens if token not in self.special_tokens).decode('utf-8', 'replace')
+
+
+    def _decode(
+        self,
+        token_ids: List[int] | int,
+        skip_special_tokens: bool = False,
+        errors: str = 'replace',
+        **kwargs,
+    ) -> str:
+        if isinstance(token_ids, int):
+            token_ids = [token_ids]
+        text, buffer = '', bytearray()
+        for token_id in token_ids:
+            if token_id < 256:
+                buffer.append(token_id)
+                continue
+            text += buffer.decode('utf-8', errors=errors)
+            buffer = bytearray()
+            if not skip_special_tokens:
+                text += self._convert_id_to_token(token_id)
+        return text + buffer.decode('utf-8', errors=errors)
+
+
+    def save_vocabulary(self, save_directory: str, filename_prefix: str | None = None) -> Tuple[str]:
+        return ()
+
+
+    def draw_bbox_on_latest_picture(self, response: str, history: List[Tuple[str, str]]) -> None:
+        return None
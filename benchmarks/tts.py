@@ -0,0 +1,89 @@
+import argparse
+import asyncio
+import azure.cognitiveservices.speech as speechsdk
+import json
+import numpy as np
+import os
+import shirley as sh
+import tempfile
+import time
+from benchmarks.fakesynthesizer import FakeSynthesizer
+from types import SimpleNamespace
+from typing import Dict, List
+
+
+def make_result(voice: str, text: str) -> SimpleNamespace:
+    # Silent Riff24Khz16BitMonoPcm audio of a length proportional to the text.
+    samples = np.zeros(int(len(text) * 0.06 * 24000), dtype=np.int16)
+    return SimpleNamespace(
+        reason=speechsdk.ResultReason.SynthesizingAudioCompleted,
+        audio_data=sh.utils.encode_wav(sample_rate=24000, samples=samples),
+    )
+
+
+def make_text(num_sentences: int, seed: int) -> str:
+    return ' '.join(f'Sentence {seed}-{i} talks about something for a little while.' for i in range(num_sentences))
+
+
+def run(
+    num_sentences: List[int] = [10, 50, 200],
+    latency: float = 0.2,
+    char_latency: float = 0.0005,
+    max_chunk_chars: int = 1000,
+    max_synthesizers: int = 4,
+) -> List[Dict]:
+    def factory(voice: str) -> FakeSynthesizer:
+        return FakeSynthesizer(voice=voice, latency=latency, char_latency=char_latency, make_result=make_result)
+
+    results = []
+    tempdir = os.environ.get('GRADIO_TEMP_DIR')
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ['GRADIO_TEMP_DIR'] = directory
+        try:
+            for count in num_sentences:
+                result = {'sentences': count}
+                for name, chunk_chars in [('sequential', 1 << 30), ('chunked', max_chunk_chars)]:
+                    client = sh.TextToSpeechClient(
+                        options=sh.TextToSpeechClientOptions(
+                            synthesizer_factory=factory,
+                            max_synthesizers_per_voice=max_synthesizers,
+                            prefetch_voices=False,
+                            max_chunk_chars=chunk_chars,
+                        ),
+                    )
+                    text = make_text(num_sentences=count, seed=len(results) * 2 + (name == 'chunked'))
+                    start = time.perf_counter()
+                    asyncio.run(client.text_to_speech_async(text=text, voice='fake'))
+                    result['chars'] = len(text)
+                    result[f'{name}_seconds'] = time.perf_counter() - start
+                result['speedup'] = result['sequential_seconds'] / result['chunked_seconds']
+                results.append(result)
+        finally:
+            if tempdir is None:
+                os.environ.pop('GRADIO_TEMP_DIR', None)
+            else:
+                os.environ['GRADIO_TEMP_DIR'] = tempdir
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Compare whole-text and chunked synthesis against a fake synthesizer.')
+    parser.add_argument('--sentences', type=int, nargs='+', default=[10, 50, 200])
+    parser.add_argument('--latency', type=float, default=0.2, help='Fixed latency per request in seconds.')
+    parser.add_argument('--char-latency', type=float, default=0.0005, help='Additional latency per character.')
+    parser.add_argument('--max-chunk-chars', type=int, default=1000)
+    parser.add_argument('--max-synthesizers', type=int, default=4)
+    args = parser.parse_args()
+
+    results = run(
+        num_sentences=args.sentences,
+        latency=args.latency,
+        char_latency=args.char_latency,
+        max_chunk_chars=args.max_chunk_chars,
+        max_synthesizers=args.max_synthesizers,
+    )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
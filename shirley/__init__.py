@@ -1,13 +1,52 @@
-from shirley import types
-from shirley.types import *
-
-from shirley import utils
-
+import importlib
 from shirley import options
 from shirley.options import *
+from typing import TYPE_CHECKING, Any, List
+
+
+# Only the light-weight options are imported eagerly. Everything else (gradio, torch, transformers, pypdf and the
+# speech SDK behind them) is imported on first access, e.g. `sh.ChatInterface`, so `import shirley` stays cheap.
+_SUBMODULES = ['types', 'utils', 'options', 'engines', 'clients', 'interfaces']
+
+_ATTRIBUTES = {
+    'QwenQuery': 'types',
+    'QwenHistory': 'types',
+    'GradioComponents': 'types',
+    'DropdownInput': 'types',
+    'DropdownOutput': 'types',
+    'ChatbotTuplesInput': 'types',
+    'ChatbotTuplesOutput': 'types',
+    'MultimodalTextboxInput': 'types',
+    'MultimodalTextboxOutput': 'types',
+    'TextboxInput': 'types',
+    'TextboxOutput': 'types',
+    'AudioInput': 'types',
+    'AudioOutput': 'types',
+    'ChatClient': 'clients',
+    'TextToSpeechClient': 'clients',
+    'ChatInterface': 'interfaces',
+    'FooterInterface': 'interfaces',
+    'HeaderInterface': 'interfaces',
+    'TextToSpeechInterface': 'interfaces',
+}
+
+
+if TYPE_CHECKING:
+    from shirley import types, utils, engines, clients, interfaces
+    from shirley.types import *
+    from shirley.clients import *
+    from shirley.interfaces import *
+
+
+def __getattr__(name: str) -> Any:
+    if name in _SUBMODULES:
+        return importlib.import_module(f'shirley.{name}')
+    if name in _ATTRIBUTES:
+        value = getattr(importlib.import_module(f'shirley.{_ATTRIBUTES[name]}'), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f'module \'shirley\' has no attribute \'{name}\'')
 
-from shirley import clients
-from shirley.clients import *
 
-from shirley import interfaces
-from shirley.interfaces import *
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(_SUBMODULES) | set(_ATTRIBUTES))
@@ -1,41 +1,140 @@
+from __future__ import annotations
+
 import logging
 import os
-import pathlib
 import shirley as sh
 import sys
-import torch
-import transformers
+import threading
+import time
 import uuid
 from .client import Client
 from collections import OrderedDict
+from dataclasses import dataclass
 from shirley.options import ChatClientOptions
-from typing import Any, Dict, Generator, List
+from shirley.utils import metrics, profiling
+from shirley.utils.lazyimport import lazy_import
+from typing import Any, Callable, Dict, Generator, List, Tuple
+
+
+torch = lazy_import('torch')
+transformers = lazy_import('transformers')
 
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(stream=sys.stdout, level=logging.INFO)
 
 
+PRECISIONS = OrderedDict([
+    ('bf16', 'bfloat16'),
+    ('fp16', 'float16'),
+    ('fp32', 'float32'),
+])
+
+WEIGHTS_SUFFIXES = ('.safetensors', '.bin', '.pt', '.pth')
+
+
+@dataclass
+class ChatResult:
+    index: int
+    response: str | None
+    input_tokens: int
+    output_tokens: int
+    error: str | None = None
+
+
+def _storage_nbytes(module: torch.nn.Module) -> int:
+    # Dynamic int8 Linear layers keep their weights packed outside `parameters()` and `buffers()`, and only the state
+    # dict reaches them, as a (weight, bias) tuple; non-persistent buffers (causal masks, rotary tables) are missing
+    # from the state dict instead, so both are walked. Tied weights share storage and are counted once.
+    values = [*module.parameters(), *module.buffers(), *module.state_dict(keep_vars=True).values()]
+    tensors = {}
+    for value in values:
+        for tensor in value if isinstance(value, tuple) else [value]:
+            if isinstance(tensor, torch.Tensor):
+                tensors[tensor.data_ptr()] = tensor.numel() * tensor.element_size()
+    return sum(tensors.values())
+
+
+class ChatModel:
+
+    def __init__(
+        self,
+        pretrained_model_name_or_path: str,
+        tokenizer: transformers.PreTrainedTokenizer,
+        model: transformers.PreTrainedModel,
+        engine: sh.engines.GenerationEngine | None,
+        make_context: Callable | None,
+        precision: str | None,
+        quantization: str | None,
+        compiled: bool = False,
+        draft_model: transformers.PreTrainedModel | None = None,
+    ) -> None:
+        self.pretrained_model_name_or_path = pretrained_model_name_or_path
+        self.tokenizer = tokenizer
+        self.model = model
+        self.engine = engine
+        self.make_context = make_context
+        self.precision = precision
+        self.quantization = quantization
+        self.compiled = compiled
+        self.draft_model = draft_model
+        self.nbytes = sum(_storage_nbytes(module=module) for module in (model, draft_model) if module is not None)
+
+
+    @property
+    def idle(self) -> bool:
+        return self.engine is None or self.engine.idle
+
+
+    def shutdown(self) -> None:
+        if self.engine is not None:
+            self.engine.shutdown()
+
+
 class ChatClient(Client):
 
     def __init__(self, options: ChatClientOptions = ChatClientOptions()) -> None:
         super().__init__(options=options)
 
         self._local = options.local
-        self._pretrained_model_name_or_path: str | None = None
-        self._device: torch.device | None = torch.device('cpu')
+        self._max_batch_size = options.max_batch_size
+        self._prefix_cache_size = options.prefix_cache_size
+        self._precision = options.precision
+        self._quantize = options.quantize
+        self._compile = options.compile
+        self._max_memory = options.max_memory
+        self._draft_model = options.draft_model
+        self._num_draft_tokens = options.num_draft_tokens
+        self.artifacts.register(
+            kind='images',
+            max_size=options.image_artifacts_size,
+            max_age=options.image_artifacts_max_age,
+        )
+        if self._precision is not None and self._precision not in PRECISIONS:
+            raise ValueError(f'Precision \'{self._precision}\' not supported. Use one of {list(PRECISIONS)}.')
+        # The device is resolved when the first model is loaded, so constructing a client does not import torch.
+        self._device: torch.device | None = None
         self._device_name: str | None = None
-        self._tokenizer: transformers.PreTrainedTokenizer | None = None
-        self._model: transformers.PreTrainedModel | None = None
+        self._models: OrderedDict[str, ChatModel] = OrderedDict()
+        self._statuses: Dict[str, str] = {}
+        self._lock = threading.RLock()
+        self._status_changed = threading.Condition(self._lock)
+        self._load_lock = threading.Lock()
 
 
     @property
     def pretrained_model_name_or_path(self) -> str | None:
-        return self._pretrained_model_name_or_path
+        chat_model = self.get_model()
+        return chat_model.pretrained_model_name_or_path if chat_model is not None else None
 
     @property
     def model(self) -> transformers.PreTrainedModel | None:
-        return self._model
+        chat_model = self.get_model()
+        return chat_model.model if chat_model is not None else None
+
+    @property
+    def memory(self) -> int:
+        return sum(chat_model.nbytes for chat_model in list(self._models.values()))
 
 
     def get_models(self) -> List[str]:
@@ -57,12 +156,63 @@ class ChatClient(Client):
             return model_name
 
 
-    def get_model_config(self) -> Dict | None:
-        if not self._model:
-            return None
+    def get_model_name(self, pretrained_model_name_or_path: str) -> str:
+        if self._local:
+            return os.path.basename(os.path.normpath(pretrained_model_name_or_path))
+        else:
+            return pretrained_model_name_or_path
+
+
+    def get_model(self, pretrained_model_name_or_path: str | None = None) -> ChatModel | None:
+        with self._lock:
+            if pretrained_model_name_or_path is None:
+                return next(reversed(self._models.values()), None)
+            chat_model = self._models.get(pretrained_model_name_or_path)
+            if chat_model is not None:
+                self._models.move_to_end(pretrained_model_name_or_path)
+            return chat_model
+
+
+    def is_loaded(self, pretrained_model_name_or_path: str | None = None) -> bool:
+        return self.get_model(pretrained_model_name_or_path=pretrained_model_name_or_path) is not None
 
-        model_config = self._model.config.to_dict()
+
+    def get_status(self, pretrained_model_name_or_path: str | None = None) -> str | None:
+        chat_model = self.get_model(pretrained_model_name_or_path=pretrained_model_name_or_path)
+        if chat_model is not None:
+            pretrained_model_name_or_path = chat_model.pretrained_model_name_or_path
+        with self._lock:
+            status = self._statuses.get(pretrained_model_name_or_path)
+        if status is None and chat_model is not None:
+            return 'ready'
+        return status
+
+
+    def wait_status(
+        self,
+        pretrained_model_name_or_path: str,
+        status: str | None,
+        timeout: float | None = None,
+    ) -> str | None:
+        with self._status_changed:
+            self._status_changed.wait_for(
+                lambda: self._statuses.get(pretrained_model_name_or_path) != status,
+                timeout=timeout,
+            )
+        return self.get_status(pretrained_model_name_or_path=pretrained_model_name_or_path)
+
+
+    def get_model_config(self, pretrained_model_name_or_path: str | None = None) -> Dict | None:
+        chat_model = self.get_model(pretrained_model_name_or_path=pretrained_model_name_or_path)
+        status = self.get_status(pretrained_model_name_or_path=pretrained_model_name_or_path)
+        if chat_model is None:
+            return None if status is None else OrderedDict([('status', status)])
+
+        model_config = chat_model.model.config.to_dict()
+        prefix_cache = chat_model.engine.prefix_cache if chat_model.engine is not None else None
+        speculative_decoder = chat_model.engine.speculative_decoder if chat_model.engine is not None else None
         return OrderedDict([
+            ('status', status),
             ('device', self._device),
             ('device_name', self._device_name),
             ('architectures', model_config['architectures']),
@@ -73,10 +223,154 @@ class ChatClient(Client):
             ('tokenizer_type', model_config['tokenizer_type']),
             ('torch_dtype', model_config['torch_dtype']),
             ('transformers_version', model_config['transformers_version']),
+            ('precision', chat_model.precision),
+            ('quantization', chat_model.quantization),
+            ('compile', chat_model.compiled),
+            ('prefix_cache', prefix_cache.stats() if prefix_cache is not None else None),
+            ('draft_model', chat_model.draft_model.name_or_path if chat_model.draft_model is not None else None),
+            ('speculative_decoding', speculative_decoder.stats() if speculative_decoder is not None else None),
+            ('resident_models', list(self._models)),
+            ('resident_memory', self.memory),
+            ('max_memory', self._max_memory),
         ])
 
 
     def load_model(self, pretrained_model_name_or_path: str) -> None:
+        with self._load_lock:
+            if self.is_loaded(pretrained_model_name_or_path=pretrained_model_name_or_path):
+                logger.info(f'Pre-trained model \'{pretrained_model_name_or_path}\' already resident.')
+                return
+
+            nbytes = self._estimate_memory(pretrained_model_name_or_path=pretrained_model_name_or_path)
+            if self._draft_model is not None:
+                nbytes += self._estimate_memory(
+                    pretrained_model_name_or_path=self.get_model_name_or_path(model_name=self._draft_model),
+                )
+            with self._lock:
+                evicted, busy = self._evict(nbytes=nbytes)
+            self._shutdown_models(chat_models=evicted)
+            if busy:
+                raise RuntimeError(f'Cannot load \'{pretrained_model_name_or_path}\' while {busy} still generating; '
+                                   'try again when they finish.')
+            start = time.perf_counter()
+            chat_model = self._load_model(pretrained_model_name_or_path=pretrained_model_name_or_path)
+            model_name = self.get_model_name(pretrained_model_name_or_path=pretrained_model_name_or_path)
+            metrics.MODEL_LOAD_SECONDS.observe(time.perf_counter() - start, model=model_name)
+            metrics.MODEL_RESIDENT_BYTES.set(chat_model.nbytes, model=model_name)
+            with self._lock:
+                self._models[pretrained_model_name_or_path] = chat_model
+                evicted, busy = self._evict(nbytes=0, keep=pretrained_model_name_or_path)
+            self._shutdown_models(chat_models=evicted)
+            if busy:
+                logger.warning(f'Resident models exceed the memory budget until {busy} finish generating.')
+
+
+    def preload_model(self, pretrained_model_name_or_path: str, warmup: bool = True) -> threading.Thread:
+        self._set_status(pretrained_model_name_or_path=pretrained_model_name_or_path, status='loading')
+        thread = threading.Thread(
+            target=self._preload_model,
+            kwargs={'pretrained_model_name_or_path': pretrained_model_name_or_path, 'warmup': warmup},
+            daemon=True,
+        )
+        thread.start()
+        return thread
+
+
+    def warmup(self, pretrained_model_name_or_path: str | None = None, max_new_tokens: int = 8) -> None:
+        # A short generation pays the one-time costs (kernel selection, allocator growth, tokenizer caches, compiled
+        # graphs) and leaves the system prompt in the prefix cache before the first real request.
+        chat_model = self.get_model(pretrained_model_name_or_path=pretrained_model_name_or_path)
+        if chat_model is None:
+            raise RuntimeError('Model not loaded.')
+
+        query = 'Hello!'
+        if getattr(chat_model.model.config, 'visual', None):
+            # Vision models also initialise the visual encoder on the first picture. It is kept outside the swept
+            # `images` kind so that the sweeper never removes it.
+            filename = self.artifacts.path(kind='warmup', name='warmup.jpg')
+            if not filename.exists():
+                sh.utils.Image.new('RGB', (224, 224), color='white').save(filename)
+            query = f'Picture 1: <img>{filename}</img>\n{query}'
+
+        if chat_model.engine is None:
+            stream = chat_model.model.chat_stream(tokenizer=chat_model.tokenizer, query=query, history=None)
+            for count, _ in enumerate(stream, start=1):
+                if count >= max_new_tokens:
+                    break
+            return
+
+        context_tokens = self._make_context(chat_model=chat_model, query=query, history=None)
+        for _ in chat_model.engine.submit(input_ids=context_tokens, max_new_tokens=max_new_tokens):
+            pass
+
+
+    def unload_model(self, pretrained_model_name_or_path: str) -> None:
+        with self._lock:
+            chat_model = self._models.pop(pretrained_model_name_or_path, None)
+        if chat_model is not None:
+            self._shutdown_models(chat_models=[chat_model])
+
+
+    def _shutdown_models(self, chat_models: List[ChatModel]) -> None:
+        # Shutting an engine down joins its thread, so it happens outside the lock that every `get_model` takes.
+        for chat_model in chat_models:
+            chat_model.shutdown()
+            metrics.MODEL_RESIDENT_BYTES.remove(
+                model=self.get_model_name(pretrained_model_name_or_path=chat_model.pretrained_model_name_or_path),
+            )
+            logger.info(f'Pre-trained model \'{chat_model.pretrained_model_name_or_path}\' unloaded.')
+
+
+    def _preload_model(self, pretrained_model_name_or_path: str, warmup: bool) -> None:
+        try:
+            self.load_model(pretrained_model_name_or_path=pretrained_model_name_or_path)
+            if warmup:
+                self._set_status(pretrained_model_name_or_path=pretrained_model_name_or_path, status='warming up')
+                start = time.perf_counter()
+                self.warmup(pretrained_model_name_or_path=pretrained_model_name_or_path)
+                logger.info(f'Pre-trained model \'{pretrained_model_name_or_path}\' warmed up in '
+                            f'{time.perf_counter() - start:.2f} seconds.')
+        except Exception as error:
+            logger.exception(f'Failed to preload pre-trained model \'{pretrained_model_name_or_path}\'.')
+            self._set_status(pretrained_model_name_or_path=pretrained_model_name_or_path, status=f'failed: {error}')
+            return
+        self._set_status(pretrained_model_name_or_path=pretrained_model_name_or_path, status='ready')
+
+
+    def _set_status(self, pretrained_model_name_or_path: str, status: str) -> None:
+        with self._status_changed:
+            self._statuses[pretrained_model_name_or_path] = status
+            self._status_changed.notify_all()
+
+
+    def _estimate_memory(self, pretrained_model_name_or_path: str) -> int:
+        if not os.path.isdir(pretrained_model_name_or_path):
+            return 0
+        return sum(
+            os.path.getsize(os.path.join(pretrained_model_name_or_path, filename))
+            for filename in os.listdir(pretrained_model_name_or_path)
+            if filename.endswith(WEIGHTS_SUFFIXES)
+        )
+
+
+    def _evict(self, nbytes: int, keep: str | None = None) -> Tuple[List[ChatModel], List[str]]:
+        # Called under the lock. Without a budget only one model stays resident, as before; with one, the least
+        # recently used models are evicted only when the new load would not fit. A model with requests in flight is
+        # never evicted, since shutting its engine down would abort them; the models still in the way are returned
+        # with the evicted ones, which the caller shuts down.
+        evicted: List[ChatModel] = []
+        for name in [name for name in self._models if name != keep]:
+            if self._max_memory is not None and self.memory + nbytes <= self._max_memory:
+                break
+            if self._models[name].idle:
+                evicted.append(self._models.pop(name))
+        busy = [name for name in self._models if name != keep]
+        if self._max_memory is not None and self.memory + nbytes <= self._max_memory:
+            busy = []
+        return evicted, busy
+
+
+    def _load_model(self, pretrained_model_name_or_path: str) -> ChatModel:
         if not os.path.exists(pretrained_model_name_or_path):
             logger.warning(f'Pre-trained model not found in path \'{pretrained_model_name_or_path}\'.')
             logger.info(f'Using remote pre-trained model \'{pretrained_model_name_or_path}\' from 🤗 Hugging Face.')
@@ -85,8 +379,6 @@ class ChatClient(Client):
             logger.info(f'Using local pre-trained model \'{pretrained_model_name_or_path}\'.')
             local_files_only = True
 
-        self._pretrained_model_name_or_path = pretrained_model_name_or_path
-
         if torch.cuda.is_available():
             self._device = torch.device('cuda')
             self._device_name = torch.cuda.get_device_name(torch.cuda.current_device())
@@ -101,12 +393,31 @@ class ChatClient(Client):
             trust_remote_code=True,
         )
 
+        precision = self._precision
+        if self._quantize and self._device.type == 'cpu' and precision not in (None, 'fp32'):
+            logger.warning(f'Dynamic int8 quantization requires fp32 weights; loading in fp32 instead of {precision}.')
+            precision = 'fp32'
+
+        # Qwen reads its precision from the `bf16`/`fp16`/`fp32` config flags; other models use `torch_dtype`.
+        precision_kwargs = {}
+        if precision is not None:
+            precision_kwargs = {precision: True, 'torch_dtype': getattr(torch, PRECISIONS[precision])}
         model: transformers.PreTrainedModel = transformers.AutoModelForCausalLM.from_pretrained(
             pretrained_model_name_or_path=pretrained_model_name_or_path,
             local_files_only=local_files_only,
             trust_remote_code=True,
+            **precision_kwargs,
         )
 
+        quantization = None
+        if self._quantize:
+            if self._device.type == 'cpu':
+                model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+                quantization = 'dynamic-int8'
+                logger.info('Linear layers quantized to dynamic int8.')
+            else:
+                logger.warning(f'Dynamic int8 quantization is only supported on CPU; skipped on {self._device}.')
+
         model.generation_config = transformers.GenerationConfig.from_pretrained(
             pretrained_model_name=pretrained_model_name_or_path,
             local_files_only=local_files_only,
@@ -124,22 +435,276 @@ class ChatClient(Client):
                 device=self._device,
             )
 
-        self._tokenizer = tokenizer
-        self._model = model.to(device=self._device)
+        model = model.to(device=self._device)
+
+        # Models that expose Qwen's `make_context` are decoded by the continuous-batching engine, so that concurrent
+        # sessions share one forward pass per token. Others keep using their own `chat_stream`.
+        make_context = getattr(sys.modules[type(model).__module__], 'make_context', None)
+        engine = None
+        draft_model = None
+        if make_context is not None:
+            if self._draft_model is not None:
+                draft_model = self._load_draft_model(
+                    tokenizer=tokenizer,
+                    precision_kwargs=precision_kwargs,
+                    quantization=quantization,
+                )
+            engine = sh.engines.GenerationEngine(
+                model=model,
+                generation_config=model.generation_config,
+                stop_token_ids=sh.engines.get_stop_token_ids(model=model, tokenizer=tokenizer),
+                max_batch_size=self._max_batch_size,
+                prefix_cache_size=self._prefix_cache_size,
+                compile=self._compile,
+                draft_model=draft_model,
+                num_draft_tokens=self._num_draft_tokens,
+                name=self.get_model_name(pretrained_model_name_or_path=pretrained_model_name_or_path),
+            )
+        elif self._draft_model is not None:
+            logger.warning(f'Draft model \'{self._draft_model}\' unused: speculative decoding needs the generation '
+                           'engine.')
+
+        return ChatModel(
+            pretrained_model_name_or_path=pretrained_model_name_or_path,
+            tokenizer=tokenizer,
+            model=model,
+            engine=engine,
+            make_context=make_context,
+            precision=precision,
+            quantization=quantization,
+            # Only the engine's decode step is compiled.
+            compiled=engine is not None and self._compile,
+            draft_model=draft_model,
+        )
+
 
+    def _load_draft_model(
+        self,
+        tokenizer: transformers.PreTrainedTokenizer,
+        precision_kwargs: Dict,
+        quantization: str | None,
+    ) -> transformers.PreTrainedModel:
+        pretrained_model_name_or_path = self.get_model_name_or_path(model_name=self._draft_model)
+        local_files_only = os.path.exists(pretrained_model_name_or_path)
+        logger.info(f'Loading draft model \'{pretrained_model_name_or_path}\' for speculative decoding.')
 
-    def chat_stream(self, query: sh.QwenQuery, history: sh.QwenHistory = None) -> Generator[str, Any, None]:
-        return self._model.chat_stream(tokenizer=self._tokenizer, query=query, history=history)
+        # Draft tokens are handed to the target model as ids, so both models must tokenize text the same way. Only the
+        # ids they share are compared: a target may append tokens of its own (Qwen-VL's image tokens) that a text-only
+        # draft never proposes.
+        draft_tokenizer: transformers.PreTrainedTokenizer = transformers.AutoTokenizer.from_pretrained(
+            pretrained_model_name_or_path=pretrained_model_name_or_path,
+            local_files_only=local_files_only,
+            trust_remote_code=True,
+        )
+        probe = 'Speculative decoding 推测解码 123.'
+        shared_ids = list(range(min(len(draft_tokenizer), len(tokenizer))))
+        if (draft_tokenizer.convert_ids_to_tokens(shared_ids) != tokenizer.convert_ids_to_tokens(shared_ids)
+                or draft_tokenizer.encode(probe) != tokenizer.encode(probe)):
+            raise ValueError(f'Draft model \'{self._draft_model}\' does not share the tokenizer of the target model.')
+
+        draft_model: transformers.PreTrainedModel = transformers.AutoModelForCausalLM.from_pretrained(
+            pretrained_model_name_or_path=pretrained_model_name_or_path,
+            local_files_only=local_files_only,
+            trust_remote_code=True,
+            **precision_kwargs,
+        )
+        if quantization == 'dynamic-int8':
+            draft_model = torch.ao.quantization.quantize_dynamic(draft_model, {torch.nn.Linear}, dtype=torch.qint8)
+        return draft_model.to(device=self._device).eval()
+
+
+    def count_tokens(self, text: str, pretrained_model_name_or_path: str | None = None) -> int:
+        chat_model = self.get_model(pretrained_model_name_or_path=pretrained_model_name_or_path)
+        if chat_model is None:
+            raise RuntimeError('Model not loaded.')
+        return len(chat_model.tokenizer.encode(text))
 
 
-    def draw_bbox_on_latest_picture(self, history: sh.QwenHistory) -> str | None:
+    def get_max_context_tokens(self, pretrained_model_name_or_path: str | None = None) -> int | None:
+        chat_model = self.get_model(pretrained_model_name_or_path=pretrained_model_name_or_path)
+        if chat_model is None:
+            raise RuntimeError('Model not loaded.')
+
+        # The context window of the model, less the room its responses are given.
+        config = chat_model.model.config
+        window = getattr(config, 'seq_length', None) or getattr(config, 'max_position_embeddings', None)
+        if window is None:
+            return None
+        max_new_tokens = getattr(chat_model.model.generation_config, 'max_new_tokens', None) or 0
+        return max(window - max_new_tokens, 0)
+
+
+    def count_context_tokens(
+        self,
+        query: sh.QwenQuery,
+        history: sh.QwenHistory = None,
+        pretrained_model_name_or_path: str | None = None,
+    ) -> int:
+        chat_model = self.get_model(pretrained_model_name_or_path=pretrained_model_name_or_path)
+        if chat_model is None:
+            raise RuntimeError('Model not loaded.')
+        return self._count_input_tokens(chat_model=chat_model, query=query, history=history)
+
+
+    def chat_stream(
+        self,
+        query: sh.QwenQuery,
+        history: sh.QwenHistory = None,
+        pretrained_model_name_or_path: str | None = None,
+        cancel_event: threading.Event | None = None,
+        timeout: float | None = None,
+    ) -> Generator[str, Any, None]:
+        chat_model = self.get_model(pretrained_model_name_or_path=pretrained_model_name_or_path)
+        if chat_model is None:
+            raise RuntimeError('Model not loaded.')
+
+        if chat_model.engine is None:
+            stream = chat_model.model.chat_stream(tokenizer=chat_model.tokenizer, query=query, history=history)
+            return self._stream_until(stream=stream, cancel_event=cancel_event, timeout=timeout)
+
+        with profiling.span('tokenize'):
+            context_tokens = self._make_context(chat_model=chat_model, query=query, history=history)
+        request = chat_model.engine.submit(input_ids=context_tokens, cancel_event=cancel_event, timeout=timeout)
+        return self._stream(tokenizer=chat_model.tokenizer, request=request, profile=profiling.current())
+
+
+    def chat_batch(
+        self,
+        queries: List[Tuple[sh.QwenQuery, sh.QwenHistory]],
+        pretrained_model_name_or_path: str | None = None,
+        max_new_tokens: int | None = None,
+        poll_interval: float = 0.01,
+    ) -> Generator[ChatResult, Any, None]:
+        chat_model = self.get_model(pretrained_model_name_or_path=pretrained_model_name_or_path)
+        if chat_model is None:
+            raise RuntimeError('Model not loaded.')
+
+        if chat_model.engine is None:
+            for index, (query, history) in enumerate(queries):
+                yield self._chat(chat_model=chat_model, index=index, query=query, history=history)
+            return
+
+        # Prompts are submitted longest first, so rows decoding together have similar lengths and carry little
+        # left padding, and the prompts most likely to run out of memory fail early. Twice the batch size stays in
+        # flight so that the engine always has a request waiting when rows finish.
+        contexts = [
+            self._make_context(chat_model=chat_model, query=query, history=history) for query, history in queries
+        ]
+        pending = sorted(range(len(contexts)), key=lambda index: len(contexts[index]))
+        window = 2 * chat_model.engine.max_batch_size
+        running: List[Tuple[int, sh.engines.GenerationRequest]] = []
+        while pending or running:
+            while pending and len(running) < window:
+                index = pending.pop()
+                request = chat_model.engine.submit(input_ids=contexts[index], max_new_tokens=max_new_tokens)
+                running.append((index, request))
+
+            finished = [item for item in running if item[1].finished]
+            if not finished:
+                running[0][1].wait(timeout=poll_interval)
+                continue
+
+            running = [item for item in running if item not in finished]
+            for index, request in finished:
+                yield ChatResult(
+                    index=index,
+                    response=None if request.error is not None else chat_model.tokenizer.decode(
+                        request.output_ids, skip_special_tokens=True, errors='ignore',
+                    ),
+                    input_tokens=len(request.input_ids),
+                    output_tokens=len(request.output_ids),
+                    error=None if request.error is None else str(request.error),
+                )
+
+
+    def _chat(self, chat_model: ChatModel, index: int, query: sh.QwenQuery, history: sh.QwenHistory) -> ChatResult:
+        input_tokens = self._count_input_tokens(chat_model=chat_model, query=query, history=history)
+        try:
+            response = ''
+            for response in chat_model.model.chat_stream(tokenizer=chat_model.tokenizer, query=query, history=history):
+                pass
+        except Exception as error:
+            logger.exception('Chat failed.')
+            return ChatResult(index=index, response=None, input_tokens=input_tokens, output_tokens=0, error=str(error))
+        output_tokens = len(chat_model.tokenizer.encode(response))
+        return ChatResult(index=index, response=response, input_tokens=input_tokens, output_tokens=output_tokens)
+
+
+    def _count_input_tokens(self, chat_model: ChatModel, query: sh.QwenQuery, history: sh.QwenHistory) -> int:
+        if chat_model.make_context is not None:
+            return len(self._make_context(chat_model=chat_model, query=query, history=history))
+        # Without `make_context` the chat format is the model's own business, so only the text itself is counted.
+        tokenizer = chat_model.tokenizer
+        return len(tokenizer.encode(query)) + sum(
+            len(tokenizer.encode(turn_query)) + len(tokenizer.encode(turn_response or ''))
+            for turn_query, turn_response in history or []
+        )
+
+
+    def _make_context(self, chat_model: ChatModel, query: sh.QwenQuery, history: sh.QwenHistory) -> List[int]:
+        _, context_tokens = chat_model.make_context(
+            chat_model.tokenizer,
+            query,
+            history=history,
+            system='You are a helpful assistant.',
+            max_window_size=chat_model.model.generation_config.max_window_size,
+            chat_format=chat_model.model.generation_config.chat_format,
+        )
+        return context_tokens
+
+
+    def _stream(
+        self,
+        tokenizer: transformers.PreTrainedTokenizer,
+        request: sh.engines.GenerationRequest,
+        profile: sh.utils.Profile | None = None,
+    ) -> Generator[str, Any, None]:
+        output_ids = []
+        try:
+            for token in request:
+                output_ids.append(token)
+                yield tokenizer.decode(output_ids, skip_special_tokens=True, errors='ignore')
+        finally:
+            # A consumer that stops early (a closed or collected generator) also ends the request inside the engine.
+            request.cancel()
+            if profile is not None:
+                # The engine runs the request on its own thread, so its stages are added from their timestamps.
+                for name, start, end in request.spans:
+                    profile.add_span(name=name, start=start, end=end, thread='engine')
+
+
+    def _stream_until(
+        self,
+        stream: Generator[str, Any, None],
+        cancel_event: threading.Event | None,
+        timeout: float | None,
+    ) -> Generator[str, Any, None]:
+        # Without the engine the model computes the next token only when asked, so closing its stream stops it.
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        try:
+            for response in stream:
+                yield response
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+        finally:
+            stream.close()
+
+
+    def draw_bbox_on_latest_picture(
+        self,
+        history: sh.QwenHistory,
+        pretrained_model_name_or_path: str | None = None,
+    ) -> str | None:
+        chat_model = self.get_model(pretrained_model_name_or_path=pretrained_model_name_or_path)
+        if chat_model is None:
+            return None
+
         response = history[-1][1]
-        image = self._tokenizer.draw_bbox_on_latest_picture(response=response, history=history)
+        image = chat_model.tokenizer.draw_bbox_on_latest_picture(response=response, history=history)
         if image is not None:
-            images_tempdir = pathlib.Path(self.tempdir) / 'images'
-            images_tempdir.mkdir(exist_ok=True, parents=True)
-            name = f'img-{uuid.uuid4()}.jpg'
-            filename = images_tempdir / name
+            filename = self.artifacts.path(kind='images', name=f'img-{uuid.uuid4()}.jpg')
             image.save(str(filename))
             logger.info(f'Image file saved in {str(filename)}.')
             return str(filename)
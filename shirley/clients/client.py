@@ -1,9 +1,15 @@
 import os
 import pathlib
 import tempfile
+import threading
 from abc import ABC
 from shirley.options import ClientOptions
-from typing import Type
+from shirley.utils import ArtifactStore
+from typing import Dict, Type
+
+
+_artifact_stores: Dict[str, ArtifactStore] = {}
+_artifact_stores_lock = threading.Lock()
 
 
 class Client(ABC):
@@ -11,7 +17,21 @@ class Client(ABC):
     def __init__(self, options: Type[ClientOptions] = ClientOptions()) -> None:
         self._tempdir = os.environ.get('GRADIO_TEMP_DIR') or str(pathlib.Path(tempfile.gettempdir()) / 'gradio')
 
+        # Every client writing to the same tempdir shares one store, and so one sweeper.
+        with _artifact_stores_lock:
+            if self._tempdir not in _artifact_stores:
+                _artifact_stores[self._tempdir] = ArtifactStore(
+                    directory=self._tempdir,
+                    sweep_interval=options.artifact_sweep_interval,
+                )
+            self._artifacts = _artifact_stores[self._tempdir]
+
 
     @property
     def tempdir(self) -> str:
         return self._tempdir
+
+
+    @property
+    def artifacts(self) -> ArtifactStore:
+        return self._artifacts
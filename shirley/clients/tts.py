@@ -1,18 +1,43 @@
-import azure.cognitiveservices.speech as speechsdk
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import hashlib
+import json
 import logging
+import numpy as np
 import os
 import pathlib
 import sys
-import uuid
+import threading
+import time
 from .client import Client
 from shirley.options import TextToSpeechClientOptions
-from typing import List
+from shirley.utils import (
+    FileCache,
+    MemoryCache,
+    SynthesizerPool,
+    TTLCache,
+    decode_wav,
+    encode_wav,
+    split_chunks,
+    split_sentences,
+)
+from shirley.utils import metrics, profiling
+from shirley.utils.lazyimport import lazy_import
+from typing import Any, AsyncIterator, Dict, List, Set, Tuple
+
+
+speechsdk = lazy_import('azure.cognitiveservices.speech')
 
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(stream=sys.stdout, level=logging.INFO)
 
 
+OUTPUT_FORMAT = 'Riff24Khz16BitMonoPcm'
+
+
 class TextToSpeechClient(Client):
 
     def __init__(self, options: TextToSpeechClientOptions = TextToSpeechClientOptions()) -> None:
@@ -20,6 +45,41 @@ class TextToSpeechClient(Client):
 
         self._speech_key: str | None = os.environ.get('SPEECH_KEY')
         self._speech_region: str | None = os.environ.get('SPEECH_REGION')
+        self._synthesizer_factory = options.synthesizer_factory
+        self._synthesizers = SynthesizerPool(
+            factory=self._make_synthesizer,
+            max_synthesizers=options.max_synthesizers_per_voice,
+        )
+        self._stream_lookahead = options.max_synthesizers_per_voice
+        self._max_chunk_chars = options.max_chunk_chars
+        self._voices = TTLCache(filename=pathlib.Path(self.tempdir) / 'voices.json', ttl=options.voice_cache_ttl)
+        self._voices_synthesizer: speechsdk.SpeechSynthesizer | None = None
+        self._voices_lock = threading.Lock()
+        # In memory mode synthesized audio never touches the tempdir; results are returned as `(sample_rate, samples)`.
+        self._in_memory = options.in_memory
+        if self._in_memory:
+            self._audios: FileCache | MemoryCache = MemoryCache(max_size=options.audio_cache_size)
+        else:
+            self._audios = FileCache(
+                directory=self.artifacts.register(
+                    kind='audios',
+                    max_size=options.audio_cache_size,
+                    max_age=options.audio_max_age,
+                ),
+                suffix='.wav',
+                max_size=options.audio_cache_size,
+            )
+        self._audios_in_flight: Dict[str, concurrent.futures.Future] = {}
+        self._audios_tasks: Set[asyncio.Task] = set()
+        self._audios_lock = threading.Lock()
+
+        if options.prefetch_voices:
+            self.prefetch_voices()
+
+
+    @property
+    def available(self) -> bool:
+        return self._synthesizer_factory is not None or bool(self._speech_key and self._speech_region)
 
 
     def get_available_locales(self) -> List[str]:
@@ -40,14 +100,53 @@ class TextToSpeechClient(Client):
         return locales
 
 
+    def get_cached_voices(self, locale: str) -> List[str] | None:
+        return self._voices.get(locale, stale=True)
+
+
     def get_available_voices(self, locale: str) -> List[str] | None:
+        voices = self._voices.get(locale)
+        if voices is not None:
+            return voices
+
+        with self._voices_lock:
+            voices = self._voices.get(locale)
+            if voices is not None:
+                return voices
+
+            voices = self._fetch_voices(locale=locale)
+            if voices is None:
+                return self._voices.get(locale, stale=True)
+            self._voices.set(locale, voices)
+            return voices
+
+
+    def prefetch_voices(self, locales: List[str] | None = None) -> threading.Thread | None:
         if not self._speech_key or not self._speech_region:
             return None
 
-        speech_config = speechsdk.SpeechConfig(subscription=self._speech_key, region=self._speech_region)
-        speech_synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=None)
+        locales = [locale for locale in locales or self.get_available_locales() if locale not in self._voices]
+        if not locales:
+            return None
+
+        def prefetch() -> None:
+            for locale in locales:
+                self.get_available_voices(locale=locale)
+
+        thread = threading.Thread(target=prefetch, daemon=True)
+        thread.start()
+        return thread
+
+
+    def _fetch_voices(self, locale: str) -> List[str] | None:
+        if not self._speech_key or not self._speech_region:
+            return None
+
+        if self._voices_synthesizer is None:
+            speech_config = speechsdk.SpeechConfig(subscription=self._speech_key, region=self._speech_region)
+            self._voices_synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=None)
 
-        result: speechsdk.SynthesisVoicesResult = speech_synthesizer.get_voices_async(locale).get()
+        result: speechsdk.SynthesisVoicesResult = self._voices_synthesizer.get_voices_async(locale).get()
         if result.reason == speechsdk.ResultReason.VoicesListRetrieved:
             logger.info('Voices successfully retrieved')
             return [voice.short_name for voice in result.voices]
@@ -55,33 +154,140 @@ class TextToSpeechClient(Client):
             logger.error(f'Speech synthesis canceled; error details: {result.error_details}')
 
 
-    def text_to_speech(self, text: str, voice: str) -> pathlib.Path | None:
-        if not self._speech_key or not self._speech_region:
+    def text_to_speech(self, text: str, voice: str) -> pathlib.Path | Tuple[int, np.ndarray] | None:
+        return asyncio.run(self.text_to_speech_async(text=text, voice=voice))
+
+
+    async def text_to_speech_async(self, text: str, voice: str) -> pathlib.Path | Tuple[int, np.ndarray] | None:
+        if not self.available:
             return None
 
-        speech_config = speechsdk.SpeechConfig(subscription=self._speech_key, region=self._speech_region)
-        speech_config.speech_synthesis_voice_name = voice
-        speech_config.set_speech_synthesis_output_format(
-            format_id=speechsdk.SpeechSynthesisOutputFormat.Riff24Khz16BitMonoPcm,
-        )
+        audio = await self._get_audio(text=text, voice=voice)
+        if isinstance(audio, bytes):
+            return decode_wav(audio)
+        return audio
 
-        audios_tempdir = pathlib.Path(self.tempdir) / 'audios'
-        audios_tempdir.mkdir(exist_ok=True, parents=True)
-        name = f'audio-{uuid.uuid4()}.wav'
-        filename = audios_tempdir / name
-        audio_config = speechsdk.audio.AudioOutputConfig(filename=str(filename))
 
-        speech_synthesizer = speechsdk.SpeechSynthesizer(
-            speech_config=speech_config,
-            audio_config=audio_config,
-        )
+    async def text_to_speech_stream(self, text: str, voice: str) -> AsyncIterator[Tuple[int, np.ndarray]]:
+        if not self.available:
+            return
+
+        async def get_sentences() -> AsyncIterator[str]:
+            for sentence in split_sentences(text):
+                yield sentence
+
+        async for chunk in self.sentences_to_speech_stream(sentences=get_sentences(), voice=voice):
+            yield chunk
+
+
+    async def sentences_to_speech_stream(
+        self,
+        sentences: AsyncIterator[str],
+        voice: str,
+    ) -> AsyncIterator[Tuple[int, np.ndarray]]:
+        if not self.available:
+            return
+
+        # Sentences are synthesized ahead of playback by at most one pool's worth, and yielded in order, so the first
+        # chunk only waits for the first sentence however long the text is. Sentences may still be arriving (e.g.
+        # from a streamed chat response) while earlier ones are synthesized and played.
+        tasks: asyncio.Queue = asyncio.Queue()
+        lookahead = asyncio.Semaphore(self._stream_lookahead)
+
+        async def schedule() -> None:
+            async for sentence in sentences:
+                await lookahead.acquire()
+                tasks.put_nowait(asyncio.ensure_future(self._get_audio(text=sentence, voice=voice)))
+
+        scheduler = asyncio.ensure_future(schedule())
+        scheduler.add_done_callback(lambda _: tasks.put_nowait(None))
+        try:
+            while True:
+                task = await tasks.get()
+                if task is None:
+                    break
+                audio = await task
+                lookahead.release()
+                if audio is not None:
+                    yield decode_wav(audio if isinstance(audio, bytes) else audio.read_bytes())
+            await scheduler
+        finally:
+            scheduler.cancel()
+            while not tasks.empty():
+                task = tasks.get_nowait()
+                if task is not None:
+                    task.cancel()
+
+
+    async def _get_audio(self, text: str, voice: str) -> pathlib.Path | bytes | None:
+        key = self._get_audio_key(text=text, voice=voice)
+        audio = self._audios.get(key=key)
+        if audio is not None:
+            logger.info(f'Audio for text [{text}] found in cache.')
+            metrics.TTS_CACHE_LOOKUPS.inc(voice=voice, result='hit')
+            return audio
+        metrics.TTS_CACHE_LOOKUPS.inc(voice=voice, result='miss')
+
+        # Identical requests that arrive while a synthesis is running share its result instead of starting another.
+        with self._audios_lock:
+            future = self._audios_in_flight.get(key)
+            start = future is None
+            if start:
+                future = concurrent.futures.Future()
+                self._audios_in_flight[key] = future
+        if start:
+            # The synthesis runs as its own task so that one requester being cancelled does not fail the others.
+            task = asyncio.ensure_future(self._synthesize(text=text, voice=voice, key=key, future=future))
+            self._audios_tasks.add(task)
+            task.add_done_callback(self._audios_tasks.discard)
+        return await asyncio.wrap_future(future)
+
+
+    def _get_audio_key(self, text: str, voice: str) -> str:
+        return hashlib.sha256(json.dumps([text, voice, OUTPUT_FORMAT]).encode('utf-8')).hexdigest()
 
-        speech_synthesis_result: speechsdk.SpeechSynthesisResult = speech_synthesizer.speak_text_async(text).get()
+
+    async def _synthesize(self, text: str, voice: str, key: str, future: concurrent.futures.Future) -> None:
+        try:
+            future.set_result(await self._speak(text=text, voice=voice, key=key))
+        except BaseException as error:
+            future.set_exception(error)
+        finally:
+            with self._audios_lock:
+                self._audios_in_flight.pop(key, None)
+
+
+    async def _speak(self, text: str, voice: str, key: str) -> pathlib.Path | bytes | None:
+        # Long texts are split at sentence boundaries and the chunks synthesized concurrently, bounded by the voice's
+        # synthesizer pool. All chunks share one output format, so their PCM samples are concatenated under a single
+        # WAV header without re-encoding.
+        start = time.perf_counter()
+        chunks = split_chunks(text, max_chars=self._max_chunk_chars)
+        with profiling.span('synthesize'):
+            if len(chunks) <= 1:
+                data = await self._speak_chunk(text=text, voice=voice)
+            else:
+                results = await asyncio.gather(*[self._speak_chunk(text=chunk, voice=voice) for chunk in chunks])
+                if any(result is None for result in results):
+                    return None
+                pcm = [decode_wav(result) for result in results]
+                data = encode_wav(sample_rate=pcm[0][0], samples=np.concatenate([samples for _, samples in pcm]))
+        if data is None:
+            return None
+        metrics.TTS_LATENCY_SECONDS.observe(time.perf_counter() - start, voice=voice)
+
+        audio = self._audios.put(key=key, data=data)
+        logger.info(f'Speech synthesized for text [{text}] in {len(chunks)} chunk(s)')
+        if isinstance(audio, pathlib.Path):
+            logger.info(f'Audio file saved in {str(audio)}.')
+        return audio
+
+
+    async def _speak_chunk(self, text: str, voice: str) -> bytes | None:
+        speech_synthesis_result: speechsdk.SpeechSynthesisResult = await self._synthesizers.speak(key=voice, text=text)
 
         if speech_synthesis_result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
-            logger.info(f'Speech synthesized for text [{text}]')
-            logger.info(f'Audio file saved in {str(filename)}.')
-            return filename
+            return speech_synthesis_result.audio_data
         elif speech_synthesis_result.reason == speechsdk.ResultReason.Canceled:
             cancellation_details = speech_synthesis_result.cancellation_details
             logger.error(f'Speech synthesis canceled: {cancellation_details.reason}')
@@ -90,3 +296,17 @@ class TextToSpeechClient(Client):
                     logger.error(f'Error details: {cancellation_details.error_details}')
                     logger.error('Did you set the speech resource key and region values?')
             return None
+
+
+    def _make_synthesizer(self, voice: str) -> Any:
+        if self._synthesizer_factory is not None:
+            return self._synthesizer_factory(voice)
+
+        # Synthesizers are pooled per voice and shared across requests, so audio is returned in the result rather than
+        # written through a per-request `AudioOutputConfig`.
+        speech_config = speechsdk.SpeechConfig(subscription=self._speech_key, region=self._speech_region)
+        speech_config.speech_synthesis_voice_name = voice
+        speech_config.set_speech_synthesis_output_format(
+            format_id=getattr(speechsdk.SpeechSynthesisOutputFormat, OUTPUT_FORMAT),
+        )
+        return speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=None)
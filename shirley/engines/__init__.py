@@ -0,0 +1,4 @@
+from shirley.engines.generation import GenerationEngine, GenerationRequest, get_stop_token_ids
+from shirley.engines.kvcache import KVCacheLayout, RotaryKVCacheLayout, get_kv_cache_layout
+from shirley.engines.prefixcache import PrefixCache
+from shirley.engines.speculation import SpeculativeDecoder
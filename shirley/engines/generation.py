@@ -0,0 +1,663 @@
+import logging
+import queue
+import sys
+import threading
+import time
+import torch
+import transformers
+from .kvcache import KVCacheLayout, PastKeyValues, get_kv_cache_layout
+from .prefixcache import PrefixCache
+from .speculation import SpeculativeDecoder
+from shirley.utils import metrics
+from typing import Any, Callable, Iterator, List, Tuple
+
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+
+
+class GenerationRequest:
+
+    _END = object()
+
+    def __init__(
+        self,
+        input_ids: List[int],
+        max_new_tokens: int,
+        stop_token_ids: List[int],
+        cancel_event: threading.Event | None = None,
+        deadline: float | None = None,
+        name: str = '',
+        on_finish: Callable[[], None] | None = None,
+    ) -> None:
+        self._input_ids = input_ids
+        self._max_new_tokens = max_new_tokens
+        self._stop_token_ids = set(stop_token_ids)
+        self._cancel_event = cancel_event or threading.Event()
+        self._deadline = deadline
+        self._name = name
+        self._on_finish = on_finish
+        self._submitted_at = time.perf_counter()
+        self._admitted_at: float | None = None
+        self._first_token_at: float | None = None
+        self._finished_at: float | None = None
+        self._output_ids: List[int] = []
+        self._tokens: queue.Queue = queue.Queue()
+        self._error: BaseException | None = None
+        self._finish_reason: str | None = None
+        self._finished = threading.Event()
+
+
+    @property
+    def input_ids(self) -> List[int]:
+        return self._input_ids
+
+    @property
+    def output_ids(self) -> List[int]:
+        return self._output_ids
+
+    @property
+    def finished(self) -> bool:
+        return self._finished.is_set()
+
+    @property
+    def error(self) -> BaseException | None:
+        return self._error
+
+    @property
+    def finish_reason(self) -> str | None:
+        # One of 'stop', 'length', 'cancelled', 'timeout' or 'error' once the request has finished.
+        return self._finish_reason
+
+    @property
+    def cancelled(self) -> bool:
+        if self._cancel_event.is_set():
+            return True
+        return self._deadline is not None and time.monotonic() >= self._deadline
+
+
+    @property
+    def spans(self) -> List[Tuple[str, float, float]]:
+        # The stages the request has been through so far, as (name, start, end) on the `time.perf_counter` clock.
+        end = self._finished_at or time.perf_counter()
+        spans = [('queue', self._submitted_at, self._admitted_at or end)]
+        if self._admitted_at is not None:
+            spans.append(('prefill', self._admitted_at, self._first_token_at or end))
+        if self._first_token_at is not None:
+            spans.append(('decode', self._first_token_at, end))
+        return spans
+
+
+    def cancel(self) -> None:
+        self._cancel_event.set()
+
+
+    def wait(self, timeout: float | None = None) -> bool:
+        return self._finished.wait(timeout=timeout)
+
+
+    def __iter__(self) -> Iterator[int]:
+        while True:
+            token = self._tokens.get()
+            if token is self._END:
+                break
+            yield token
+        if self._error is not None:
+            raise self._error
+
+
+    def _append(self, token: int) -> bool:
+        if self._first_token_at is None:
+            self._first_token_at = time.perf_counter()
+            seconds = self._first_token_at - self._submitted_at
+            metrics.CHAT_TIME_TO_FIRST_TOKEN_SECONDS.observe(seconds, model=self._name)
+        if token in self._stop_token_ids:
+            self._finish_reason = 'stop'
+            return False
+        self._output_ids.append(token)
+        self._tokens.put(token)
+        if len(self._output_ids) >= self._max_new_tokens:
+            self._finish_reason = 'length'
+            return False
+        return True
+
+
+    def _finish(self, error: BaseException | None = None, cancelled: bool = False) -> None:
+        if self._finished.is_set():
+            return
+        if error is not None:
+            self._finish_reason = 'error'
+        elif cancelled:
+            self._finish_reason = 'cancelled' if self._cancel_event.is_set() else 'timeout'
+        outcome = 'failed' if error is not None else 'cancelled' if cancelled else 'completed'
+        metrics.CHAT_REQUESTS.inc(model=self._name, outcome=outcome)
+        metrics.CHAT_GENERATED_TOKENS.inc(len(self._output_ids), model=self._name)
+        if len(self._output_ids) > 1:
+            seconds = time.perf_counter() - self._first_token_at
+            if seconds > 0:
+                metrics.CHAT_TOKENS_PER_SECOND.observe((len(self._output_ids) - 1) / seconds, model=self._name)
+        self._error = error
+        self._finished_at = time.perf_counter()
+        self._finished.set()
+        self._tokens.put(self._END)
+        if self._on_finish is not None:
+            self._on_finish()
+
+
+class GenerationEngine:
+
+    def __init__(
+        self,
+        model: transformers.PreTrainedModel,
+        generation_config: transformers.GenerationConfig,
+        stop_token_ids: List[int],
+        max_batch_size: int = 8,
+        prefix_cache_size: int = 0,
+        compile: bool = False,
+        draft_model: transformers.PreTrainedModel | None = None,
+        num_draft_tokens: int = 4,
+        name: str = '',
+    ) -> None:
+        self._model = model
+        self._name = name
+        # Decode steps have a fixed query length of one token, which is the shape worth compiling; prefill stays eager.
+        self._decode = torch.compile(model, dynamic=True) if compile else model
+        self._layout: KVCacheLayout = get_kv_cache_layout(model=model)
+        self._prefix_cache: PrefixCache | None = None
+        if prefix_cache_size > 0:
+            self._prefix_cache = PrefixCache(layout=self._layout, max_bytes=prefix_cache_size)
+        self._speculative_decoder: SpeculativeDecoder | None = None
+        if draft_model is not None:
+            self._speculative_decoder = SpeculativeDecoder(draft_model=draft_model, num_draft_tokens=num_draft_tokens)
+        visual = getattr(model.config, 'visual', None)
+        self._image_start_id: int | None = visual.get('image_start_id') if isinstance(visual, dict) else None
+        self._stop_token_ids = stop_token_ids
+        self._max_batch_size = max(1, max_batch_size)
+        self._max_new_tokens: int = generation_config.max_new_tokens or 512
+        self._logits_processor = self._get_logits_processor(generation_config=generation_config)
+        self._do_sample: bool = bool(generation_config.do_sample)
+        self._repetition_penalty: bool = generation_config.repetition_penalty not in (None, 1.0)
+
+        self._waiting: queue.Queue = queue.Queue()
+        self._active: List[GenerationRequest] = []
+        self._past_key_values: PastKeyValues | None = None
+        self._attention_mask: torch.Tensor | None = None
+        self._next_token_ids: torch.Tensor | None = None
+
+        self._shutdown = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._unfinished = 0
+        self._lock = threading.Lock()
+
+
+    @property
+    def batch_size(self) -> int:
+        return len(self._active)
+
+    @property
+    def max_batch_size(self) -> int:
+        return self._max_batch_size
+
+    @property
+    def idle(self) -> bool:
+        # Counted from submission to finish, so a request being prefilled (off the queue, not yet in the batch) is
+        # not mistaken for an idle engine.
+        return self._unfinished == 0
+
+    @property
+    def prefix_cache(self) -> PrefixCache | None:
+        return self._prefix_cache
+
+    @property
+    def speculative_decoder(self) -> SpeculativeDecoder | None:
+        return self._speculative_decoder
+
+
+    def submit(
+        self,
+        input_ids: List[int],
+        max_new_tokens: int | None = None,
+        cancel_event: threading.Event | None = None,
+        timeout: float | None = None,
+    ) -> GenerationRequest:
+        request = GenerationRequest(
+            input_ids=input_ids,
+            max_new_tokens=max_new_tokens or self._max_new_tokens,
+            stop_token_ids=self._stop_token_ids,
+            cancel_event=cancel_event,
+            deadline=time.monotonic() + timeout if timeout is not None else None,
+            name=self._name,
+            on_finish=self._on_finish,
+        )
+        with self._lock:
+            self._unfinished += 1
+        metrics.CHAT_PROMPT_TOKENS.observe(len(input_ids), model=self._name)
+        if self._shutdown.is_set():
+            # A request that raced with an unload would otherwise wait on a queue that nothing reads any more.
+            request._finish(error=RuntimeError('Generation engine shut down.'))
+            return request
+        self._waiting.put(request)
+        self._start()
+        return request
+
+
+    def shutdown(self) -> None:
+        self._shutdown.set()
+        self._waiting.put(None)
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+
+    def _on_finish(self) -> None:
+        with self._lock:
+            self._unfinished -= 1
+
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='shirley-generation-engine', daemon=True)
+                self._thread.start()
+
+
+    def _get_logits_processor(
+        self,
+        generation_config: transformers.GenerationConfig,
+    ) -> transformers.LogitsProcessorList:
+        processors = transformers.LogitsProcessorList()
+        if generation_config.repetition_penalty not in (None, 1.0):
+            processors.append(transformers.RepetitionPenaltyLogitsProcessor(penalty=generation_config.repetition_penalty))
+        if generation_config.do_sample:
+            if generation_config.temperature is not None and generation_config.temperature != 1.0:
+                processors.append(transformers.TemperatureLogitsWarper(temperature=generation_config.temperature))
+            if generation_config.top_k is not None and generation_config.top_k != 0:
+                processors.append(transformers.TopKLogitsWarper(top_k=generation_config.top_k))
+            if generation_config.top_p is not None and generation_config.top_p < 1.0:
+                processors.append(transformers.TopPLogitsWarper(top_p=generation_config.top_p))
+        return processors
+
+
+    def _get_scores(self, input_ids: List[int], logits: torch.Tensor) -> torch.Tensor:
+        tensor = None
+        if self._repetition_penalty:
+            tensor = torch.tensor([input_ids], device=logits.device)
+        return self._logits_processor(tensor, logits.float().unsqueeze(0))
+
+
+    def _choose(self, input_ids: List[int], logits: torch.Tensor) -> Tuple[int, torch.Tensor | None]:
+        scores = self._get_scores(input_ids=input_ids, logits=logits)
+        if self._do_sample:
+            probs = torch.softmax(scores, dim=-1)
+            return int(torch.multinomial(probs, num_samples=1).item()), probs[0]
+        return int(torch.argmax(scores, dim=-1).item()), None
+
+
+    def _sample(self, request: GenerationRequest, logits: torch.Tensor) -> int:
+        token, _ = self._choose(input_ids=request.input_ids + request.output_ids, logits=logits)
+        return token
+
+
+    def _verify(
+        self,
+        request: GenerationRequest,
+        logits: torch.Tensor,
+        draft_id: int,
+        draft_probs: torch.Tensor | None,
+    ) -> Tuple[int, bool]:
+        scores = self._get_scores(input_ids=request.input_ids + request.output_ids, logits=logits)
+        if not self._do_sample:
+            token = int(torch.argmax(scores, dim=-1).item())
+            return token, token == draft_id
+
+        # Speculative sampling: the draft token is kept with probability min(1, p / q), otherwise a token is drawn
+        # from the leftover mass max(0, p - q). Either way tokens follow the target distribution.
+        probs = torch.softmax(scores, dim=-1)[0]
+        size = probs.shape[0]
+        draft_probs = draft_probs.to(device=probs.device)[:size]
+        draft_probs = torch.cat([draft_probs, draft_probs.new_zeros(size - draft_probs.shape[0])])
+        if draft_id < size and float(torch.rand(())) * float(draft_probs[draft_id]) < float(probs[draft_id]):
+            return draft_id, True
+        residual = torch.clamp(probs - draft_probs, min=0.0)
+        if float(residual.sum()) <= 0.0:
+            residual = probs
+        return int(torch.multinomial(residual / residual.sum(), num_samples=1).item()), False
+
+
+    def _run(self) -> None:
+        with torch.inference_mode():
+            while not self._shutdown.is_set():
+                self._admit(block=not self._active)
+                if self._active:
+                    try:
+                        self._decode_step()
+                    except Exception as e:
+                        logger.exception('Batched decode step failed.')
+                        self._abort(error=e)
+
+        self._abort(error=RuntimeError('Generation engine shut down.'))
+
+
+    def _admit(self, block: bool) -> None:
+        while len(self._active) < self._max_batch_size:
+            try:
+                request = self._waiting.get(block=block)
+            except queue.Empty:
+                return
+            if request is None:
+                return
+            block = False
+            if request.cancelled:
+                request._finish(cancelled=True)
+                continue
+            request._admitted_at = time.perf_counter()
+            metrics.CHAT_QUEUE_WAIT_SECONDS.observe(request._admitted_at - request._submitted_at, model=self._name)
+
+            try:
+                self._prefill(request=request)
+            except Exception as e:
+                logger.exception('Prefill failed.')
+                request._finish(error=e)
+
+
+    def _prefill(self, request: GenerationRequest) -> None:
+        device = self._model.device
+        length = len(request.input_ids)
+
+        prefix_length, past_key_values = 0, None
+        if self._prefix_cache is not None:
+            prefix_length, past_key_values = self._prefix_cache.match(
+                input_ids=request.input_ids,
+                min_length=self._get_min_prefix_length(input_ids=request.input_ids),
+                max_length=length - 1,
+            )
+            result = 'hit' if prefix_length > 0 else 'miss'
+            metrics.PREFIX_CACHE_LOOKUPS.inc(model=self._name, result=result)
+            metrics.PREFIX_CACHE_TOKENS.inc(prefix_length, model=self._name, result='hit')
+            metrics.PREFIX_CACHE_TOKENS.inc(length - prefix_length, model=self._name, result='miss')
+
+        input_ids = torch.tensor([request.input_ids[prefix_length:]], device=device)
+        attention_mask = torch.ones((1, length), dtype=torch.long, device=device)
+        position_ids = torch.arange(prefix_length, length, device=device).unsqueeze(0)
+
+        outputs = self._model(
+            input_ids=input_ids,
+            past_key_values=past_key_values,
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            use_cache=True,
+        )
+
+        if self._prefix_cache is not None:
+            self._prefix_cache.insert(input_ids=request.input_ids, past_key_values=outputs.past_key_values)
+
+        token = self._sample(request=request, logits=outputs.logits[0, -1, :])
+        if not request._append(token):
+            request._finish()
+            return
+
+        self._join(
+            request=request,
+            past_key_values=outputs.past_key_values,
+            attention_mask=attention_mask,
+            token=token,
+        )
+
+
+    def _get_min_prefix_length(self, input_ids: List[int]) -> int:
+        # Qwen-VL only encodes pictures during a prefill without cache, so a reused prefix must cover every picture.
+        if self._image_start_id is None:
+            return 0
+        image_end_id = self._image_start_id + 1
+        for i in range(len(input_ids) - 1, -1, -1):
+            if input_ids[i] == image_end_id:
+                return i + 1
+        return 0
+
+
+    def _join(
+        self,
+        request: GenerationRequest,
+        past_key_values: PastKeyValues,
+        attention_mask: torch.Tensor,
+        token: int,
+    ) -> None:
+        next_token_ids = torch.tensor([[token]], device=attention_mask.device)
+
+        if not self._active:
+            self._active = [request]
+            self._past_key_values = past_key_values
+            self._attention_mask = attention_mask
+            self._next_token_ids = next_token_ids
+            return
+
+        # Requests join at a token boundary: both sides are left-padded to a shared cache length so that the new row
+        # decodes in the same forward pass as the running batch.
+        batch_length = self._attention_mask.shape[1]
+        request_length = attention_mask.shape[1]
+        length = max(batch_length, request_length)
+
+        self._past_key_values = self._layout.concat([
+            self._layout.pad(self._past_key_values, count=length - batch_length),
+            self._layout.pad(past_key_values, count=length - request_length),
+        ], dim=0)
+        self._attention_mask = torch.cat([
+            self._pad_attention_mask(self._attention_mask, count=length - batch_length),
+            self._pad_attention_mask(attention_mask, count=length - request_length),
+        ], dim=0)
+        self._next_token_ids = torch.cat([self._next_token_ids, next_token_ids], dim=0)
+        self._active.append(request)
+
+
+    def _pad_attention_mask(self, attention_mask: torch.Tensor, count: int) -> torch.Tensor:
+        if count <= 0:
+            return attention_mask
+        return torch.cat([attention_mask.new_zeros((attention_mask.shape[0], count)), attention_mask], dim=1)
+
+
+    def _step(self) -> None:
+        position_ids = self._attention_mask.sum(dim=1, keepdim=True)
+        attention_mask = torch.cat([self._attention_mask, self._attention_mask.new_ones((len(self._active), 1))], dim=1)
+
+        outputs = self._decode(
+            input_ids=self._next_token_ids,
+            past_key_values=self._past_key_values,
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            use_cache=True,
+        )
+        self._past_key_values = outputs.past_key_values
+        self._attention_mask = attention_mask
+
+        keep = []
+        next_token_ids = []
+        for i, request in enumerate(self._active):
+            token = self._sample(request=request, logits=outputs.logits[i, -1, :])
+            if request._append(token):
+                keep.append(i)
+                next_token_ids.append(token)
+            else:
+                self._cache(row=i)
+                request._finish()
+
+        if len(keep) < len(self._active):
+            self._leave(keep=keep)
+        if self._active:
+            self._next_token_ids = torch.tensor([[token] for token in next_token_ids], device=attention_mask.device)
+
+
+    def _drop_cancelled(self) -> None:
+        # Cancelled and expired rows leave the batch before the next forward pass, which releases their share of the
+        # cache straight away. Their tokens so far stay with the request.
+        keep = [i for i, request in enumerate(self._active) if not request.cancelled]
+        if len(keep) == len(self._active):
+            return
+
+        for i, request in enumerate(self._active):
+            if i not in keep:
+                request._finish(cancelled=True)
+                if self._speculative_decoder is not None:
+                    self._speculative_decoder.discard(owner=request)
+        logger.info(f'{len(self._active) - len(keep)} request(s) cancelled.')
+        next_token_ids = self._next_token_ids
+        self._leave(keep=keep)
+        if self._active:
+            rows = torch.tensor(keep, device=next_token_ids.device)
+            self._next_token_ids = next_token_ids.index_select(0, rows)
+
+
+    def _decode_step(self) -> None:
+        self._drop_cancelled()
+        if not self._active:
+            return
+
+        # Speculation pays off when a single sequence decodes, which is when a forward pass reads every weight for
+        # one token. A batch already shares that read across its rows, so it keeps decoding one token at a time.
+        if self._speculative_decoder is None or len(self._active) != 1:
+            self._step()
+            return
+
+        request = self._active[0]
+        count = len(request.output_ids)
+        start = time.perf_counter()
+        result = None
+        if not self._speculative_decoder.calibrating():
+            result = self._speculate()
+        if result is None:
+            self._step()
+        proposed, accepted = result or (None, None)
+        self._speculative_decoder.record(
+            tokens=len(request.output_ids) - count,
+            seconds=time.perf_counter() - start,
+            proposed=proposed,
+            accepted=accepted,
+        )
+
+
+    def _speculate(self) -> Tuple[int, int] | None:
+        request = self._active[0]
+        count = min(self._speculative_decoder.num_draft_tokens, request._max_new_tokens - len(request.output_ids) - 1)
+        if count < 1:
+            return None
+
+        # A single remaining row carries no padding, so the cache covers every token except the last one sampled.
+        device = self._attention_mask.device
+        length = self._attention_mask.shape[1]
+        input_ids = request.input_ids + request.output_ids
+        draft_ids, draft_probs = self._speculative_decoder.propose(
+            owner=request,
+            input_ids=input_ids,
+            count=count,
+            sample=self._choose,
+        )
+
+        # The target model scores the last sampled token and every draft token in one forward pass.
+        outputs = self._model(
+            input_ids=torch.tensor([input_ids[-1:] + draft_ids], device=device),
+            past_key_values=self._past_key_values,
+            attention_mask=self._attention_mask.new_ones((1, length + 1 + count)),
+            position_ids=torch.arange(length, length + 1 + count, device=device).unsqueeze(0),
+            use_cache=True,
+        )
+
+        accepted = 0
+        alive = True
+        for i in range(count + 1):
+            logits = outputs.logits[0, i, :]
+            if i < count:
+                token, ok = self._verify(
+                    request=request,
+                    logits=logits,
+                    draft_id=draft_ids[i],
+                    draft_probs=draft_probs[i],
+                )
+            else:
+                token, ok = self._sample(request=request, logits=logits), False
+            accepted += int(ok)
+            alive = request._append(token)
+            if not alive or not ok:
+                break
+
+        # Entries for rejected draft tokens are dropped from both caches.
+        length = min(length + 1 + accepted, len(request.input_ids) + len(request.output_ids))
+        past_key_values = outputs.past_key_values
+        if self._layout.length(past_key_values) > length:
+            past_key_values = self._layout.slice(past_key_values, start=0, end=length)
+        self._past_key_values = past_key_values
+        self._attention_mask = self._attention_mask.new_ones((1, length))
+        self._speculative_decoder.truncate(length=length)
+
+        if alive:
+            self._next_token_ids = torch.tensor([[request.output_ids[-1]]], device=device)
+        else:
+            self._cache(row=0)
+            request._finish()
+            self._reset()
+        return count, accepted
+
+
+    def _cache(self, row: int) -> None:
+        if self._prefix_cache is None:
+            return
+
+        request = self._active[row]
+        length = int(self._attention_mask[row].sum().item())
+        padding = self._attention_mask.shape[1] - length
+        rows = torch.tensor([row], device=self._attention_mask.device)
+        past_key_values = self._layout.trim(self._layout.select(self._past_key_values, rows=rows), count=padding)
+        self._prefix_cache.insert(
+            input_ids=(request.input_ids + request.output_ids)[:length],
+            past_key_values=past_key_values,
+        )
+
+
+    def _leave(self, keep: List[int]) -> None:
+        if not keep:
+            self._reset()
+            return
+
+        rows = torch.tensor(keep, device=self._attention_mask.device)
+        self._active = [self._active[i] for i in keep]
+        self._past_key_values = self._layout.select(self._past_key_values, rows=rows)
+        self._attention_mask = self._attention_mask.index_select(0, rows)
+
+        # Drop leading columns that only held padding for the requests that left.
+        padding = int((self._attention_mask.sum(dim=0) == 0).int().cumprod(dim=0).sum().item())
+        if padding > 0:
+            self._past_key_values = self._layout.trim(self._past_key_values, count=padding)
+            self._attention_mask = self._attention_mask[:, padding:]
+
+
+    def _reset(self) -> None:
+        if self._speculative_decoder is not None:
+            self._speculative_decoder.reset()
+        self._active = []
+        self._past_key_values = None
+        self._attention_mask = None
+        self._next_token_ids = None
+
+
+    def _abort(self, error: BaseException) -> None:
+        for request in self._active:
+            request._finish(error=error)
+        self._reset()
+
+        while True:
+            try:
+                request = self._waiting.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None:
+                request._finish(error=error)
+
+
+def get_stop_token_ids(model: transformers.PreTrainedModel, tokenizer: transformers.PreTrainedTokenizer) -> List[int]:
+    stop_token_ids: List[Any] = []
+    module = sys.modules[type(model).__module__]
+    get_stop_words_ids = getattr(module, 'get_stop_words_ids', None)
+    if get_stop_words_ids is not None:
+        for stop_words in get_stop_words_ids(model.generation_config.chat_format, tokenizer):
+            if len(stop_words) == 1:
+                stop_token_ids.extend(stop_words)
+    if model.generation_config.eos_token_id is not None:
+        stop_token_ids.extend(torch.as_tensor(model.generation_config.eos_token_id).flatten().tolist())
+    return [int(token_id) for token_id in stop_token_ids]
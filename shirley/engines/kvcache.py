@@ -0,0 +1,106 @@
+import torch
+import transformers
+from typing import Iterable, Tuple
+
+
+PastKeyValues = Tuple[Tuple[torch.Tensor, torch.Tensor], ...]
+
+
+class KVCacheLayout:
+
+    def __init__(self, seq_dim: int = 2) -> None:
+        self._seq_dim = seq_dim
+
+
+    @property
+    def seq_dim(self) -> int:
+        return self._seq_dim
+
+
+    def length(self, past_key_values: PastKeyValues) -> int:
+        return past_key_values[0][0].shape[self._seq_dim]
+
+
+    def nbytes(self, past_key_values: PastKeyValues) -> int:
+        return sum(tensor.numel() * tensor.element_size() for layer in past_key_values for tensor in layer)
+
+
+    def slice(self, past_key_values: PastKeyValues, start: int, end: int | None = None) -> PastKeyValues:
+        end = self.length(past_key_values) if end is None else end
+        return tuple(
+            tuple(tensor.narrow(self._seq_dim, start, end - start).contiguous() for tensor in layer)
+            for layer in past_key_values
+        )
+
+
+    def concat(self, past_key_values: Iterable[PastKeyValues], dim: int | None = None) -> PastKeyValues:
+        dim = self._seq_dim if dim is None else dim
+        return tuple(
+            tuple(torch.cat(tensors, dim=dim) for tensors in zip(*layers))
+            for layers in zip(*past_key_values)
+        )
+
+
+    def select(self, past_key_values: PastKeyValues, rows: torch.Tensor) -> PastKeyValues:
+        return tuple(tuple(tensor.index_select(0, rows) for tensor in layer) for layer in past_key_values)
+
+
+    def shift(self, past_key_values: PastKeyValues, offset: int) -> PastKeyValues:
+        # Positions are passed explicitly as `position_ids`, so cached keys do not depend on their offset.
+        return past_key_values
+
+
+    def pad(self, past_key_values: PastKeyValues, count: int) -> PastKeyValues:
+        if count <= 0:
+            return past_key_values
+
+        return tuple(
+            (self._pad_tensor(key, count=count), self._pad_tensor(value, count=count))
+            for key, value in self.shift(past_key_values, offset=count)
+        )
+
+
+    def _pad_tensor(self, tensor: torch.Tensor, count: int) -> torch.Tensor:
+        shape = list(tensor.shape)
+        shape[self._seq_dim] = count
+        return torch.cat([tensor.new_zeros(shape), tensor], dim=self._seq_dim)
+
+
+    def trim(self, past_key_values: PastKeyValues, count: int) -> PastKeyValues:
+        if count <= 0:
+            return past_key_values
+
+        past_key_values = self.slice(past_key_values, start=count)
+        return self.shift(past_key_values, offset=-count)
+
+
+class RotaryKVCacheLayout(KVCacheLayout):
+
+    def __init__(self, rotary_emb: torch.nn.Module, seq_dim: int = 1) -> None:
+        super().__init__(seq_dim=seq_dim)
+
+        self._rotary_emb = rotary_emb
+
+
+    def shift(self, past_key_values: PastKeyValues, offset: int) -> PastKeyValues:
+        # Qwen derives rotary positions from the cache length and ignores `position_ids`, so keys that move inside the
+        # batch frame are re-rotated by the same offset to keep every query-key distance unchanged.
+        if offset == 0:
+            return past_key_values
+
+        shifted = []
+        for key, value in past_key_values:
+            inv_freq = self._rotary_emb.inv_freq.float().to(device=key.device)
+            angles = torch.cat([inv_freq, inv_freq]) * offset
+            rot_dim = angles.numel()
+            rotated = key[..., :rot_dim].float()
+            first, second = rotated.chunk(2, dim=-1)
+            rotated = rotated * angles.cos() + torch.cat([-second, first], dim=-1) * angles.sin()
+            shifted.append((torch.cat([rotated.to(dtype=key.dtype), key[..., rot_dim:]], dim=-1), value))
+        return tuple(shifted)
+
+
+def get_kv_cache_layout(model: transformers.PreTrainedModel) -> KVCacheLayout:
+    if model.config.model_type == 'qwen':
+        return RotaryKVCacheLayout(rotary_emb=model.transformer.rotary_emb, seq_dim=1)
+    return KVCacheLayout(seq_dim=2)
@@ -0,0 +1,191 @@
+import threading
+import time
+from .kvcache import KVCacheLayout, PastKeyValues
+from collections import OrderedDict
+from typing import Dict, List, Sequence, Tuple
+
+
+class PrefixCacheNode:
+
+    def __init__(
+        self,
+        tokens: Tuple[int, ...],
+        past_key_values: PastKeyValues | None,
+        parent: 'PrefixCacheNode | None',
+        nbytes: int = 0,
+    ) -> None:
+        self.tokens = tokens
+        self.past_key_values = past_key_values
+        self.parent = parent
+        self.children: Dict[int, PrefixCacheNode] = {}
+        self.nbytes = nbytes
+        self.last_access = time.monotonic()
+
+
+class PrefixCache:
+
+    def __init__(self, layout: KVCacheLayout, max_bytes: int) -> None:
+        self._layout = layout
+        self._max_bytes = max_bytes
+        self._root = PrefixCacheNode(tokens=(), past_key_values=None, parent=None)
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+        self._lookups = 0
+        self._hits = 0
+        self._prompt_tokens = 0
+        self._hit_tokens = 0
+        self._evictions = 0
+
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return OrderedDict([
+                ('lookups', self._lookups),
+                ('hits', self._hits),
+                ('hit_rate', self._hits / self._lookups if self._lookups else 0.0),
+                ('prompt_tokens', self._prompt_tokens),
+                ('hit_tokens', self._hit_tokens),
+                ('token_hit_rate', self._hit_tokens / self._prompt_tokens if self._prompt_tokens else 0.0),
+                ('evictions', self._evictions),
+                ('nbytes', self._nbytes),
+                ('max_bytes', self._max_bytes),
+            ])
+
+
+    def match(
+        self,
+        input_ids: Sequence[int],
+        min_length: int = 0,
+        max_length: int | None = None,
+    ) -> Tuple[int, PastKeyValues | None]:
+        max_length = len(input_ids) if max_length is None else min(max_length, len(input_ids))
+
+        with self._lock:
+            self._lookups += 1
+            self._prompt_tokens += len(input_ids)
+
+            segments: List[PastKeyValues] = []
+            length = 0
+            node = self._root
+            now = time.monotonic()
+            while length < max_length:
+                child = node.children.get(input_ids[length])
+                if child is None:
+                    break
+                count = self._common_length(child.tokens, input_ids[length:max_length])
+                child.last_access = now
+                if count < len(child.tokens):
+                    segments.append(self._layout.slice(child.past_key_values, start=0, end=count))
+                    length += count
+                    break
+                segments.append(child.past_key_values)
+                length += count
+                node = child
+
+            if length == 0 or length < min_length:
+                return 0, None
+
+            self._hits += 1
+            self._hit_tokens += length
+            past_key_values = segments[0] if len(segments) == 1 else self._layout.concat(segments)
+            return length, past_key_values
+
+
+    def insert(self, input_ids: Sequence[int], past_key_values: PastKeyValues) -> None:
+        if self._max_bytes <= 0:
+            return
+
+        length = min(len(input_ids), self._layout.length(past_key_values))
+        input_ids = tuple(input_ids[:length])
+
+        with self._lock:
+            offset = 0
+            node = self._root
+            now = time.monotonic()
+            while offset < length:
+                child = node.children.get(input_ids[offset])
+                if child is None:
+                    segment = self._layout.slice(past_key_values, start=offset, end=length)
+                    leaf = PrefixCacheNode(
+                        tokens=input_ids[offset:],
+                        past_key_values=segment,
+                        parent=node,
+                        nbytes=self._layout.nbytes(segment),
+                    )
+                    node.children[input_ids[offset]] = leaf
+                    self._nbytes += leaf.nbytes
+                    break
+
+                count = self._common_length(child.tokens, input_ids[offset:])
+                if count < len(child.tokens):
+                    child = self._split(child, count=count)
+                child.last_access = now
+                offset += count
+                node = child
+
+            self._evict()
+
+
+    def clear(self) -> None:
+        with self._lock:
+            self._root.children = {}
+            self._nbytes = 0
+
+
+    def _common_length(self, a: Sequence[int], b: Sequence[int]) -> int:
+        count = 0
+        for x, y in zip(a, b):
+            if x != y:
+                break
+            count += 1
+        return count
+
+
+    def _split(self, node: PrefixCacheNode, count: int) -> PrefixCacheNode:
+        head_past_key_values = self._layout.slice(node.past_key_values, start=0, end=count)
+        head = PrefixCacheNode(
+            tokens=node.tokens[:count],
+            past_key_values=head_past_key_values,
+            parent=node.parent,
+            nbytes=self._layout.nbytes(head_past_key_values),
+        )
+        head.last_access = node.last_access
+        node.parent.children[node.tokens[0]] = head
+
+        tail_past_key_values = self._layout.slice(node.past_key_values, start=count)
+        self._nbytes -= node.nbytes
+        node.tokens = node.tokens[count:]
+        node.past_key_values = tail_past_key_values
+        node.nbytes = self._layout.nbytes(tail_past_key_values)
+        node.parent = head
+        head.children[node.tokens[0]] = node
+        self._nbytes += head.nbytes + node.nbytes
+        return head
+
+
+    def _evict(self) -> None:
+        while self._nbytes > self._max_bytes:
+            leaf = self._least_recently_used_leaf()
+            if leaf is None:
+                break
+            del leaf.parent.children[leaf.tokens[0]]
+            self._nbytes -= leaf.nbytes
+            self._evictions += 1
+
+
+    def _least_recently_used_leaf(self) -> PrefixCacheNode | None:
+        lru: PrefixCacheNode | None = None
+        stack = list(self._root.children.values())
+        while stack:
+            node = stack.pop()
+            if node.children:
+                stack.extend(node.children.values())
+            elif lru is None or node.last_access < lru.last_access:
+                lru = node
+        return lru
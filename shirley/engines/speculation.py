@@ -0,0 +1,131 @@
+import threading
+import torch
+import transformers
+from .kvcache import KVCacheLayout, PastKeyValues, get_kv_cache_layout
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Tuple
+
+
+class SpeculativeDecoder:
+
+    def __init__(
+        self,
+        draft_model: transformers.PreTrainedModel,
+        num_draft_tokens: int = 4,
+        calibration_interval: int = 16,
+    ) -> None:
+        self._draft_model = draft_model
+        self._layout: KVCacheLayout = get_kv_cache_layout(model=draft_model)
+        self._num_draft_tokens = max(1, num_draft_tokens)
+        self._calibration_interval = calibration_interval
+        self._owner: Any = None
+        self._past_key_values: PastKeyValues | None = None
+        self._lock = threading.Lock()
+
+        self._steps = 0
+        self._speculative_steps = 0
+        self._proposed = 0
+        self._accepted = 0
+        self._speculative_tokens = 0
+        self._speculative_seconds = 0.0
+        self._plain_tokens = 0
+        self._plain_seconds = 0.0
+
+
+    @property
+    def num_draft_tokens(self) -> int:
+        return self._num_draft_tokens
+
+
+    def stats(self) -> Dict:
+        with self._lock:
+            speculative_rate = None
+            if self._speculative_seconds:
+                speculative_rate = self._speculative_tokens / self._speculative_seconds
+            plain_rate = self._plain_tokens / self._plain_seconds if self._plain_seconds else None
+            steps = self._speculative_steps
+            return OrderedDict([
+                ('num_draft_tokens', self._num_draft_tokens),
+                ('steps', steps),
+                ('proposed_tokens', self._proposed),
+                ('accepted_tokens', self._accepted),
+                ('acceptance_rate', self._accepted / self._proposed if self._proposed else 0.0),
+                ('tokens_per_step', self._speculative_tokens / steps if steps else 0.0),
+                ('speculative_tokens_per_second', speculative_rate),
+                ('plain_tokens_per_second', plain_rate),
+                ('speedup', speculative_rate / plain_rate if speculative_rate and plain_rate else None),
+            ])
+
+
+    def calibrating(self) -> bool:
+        # Every so often a step decodes without the draft model, so that the speedup is measured on the same requests
+        # rather than estimated.
+        with self._lock:
+            return self._calibration_interval > 0 and (self._steps + 1) % self._calibration_interval == 0
+
+
+    def record(self, tokens: int, seconds: float, proposed: int | None = None, accepted: int | None = None) -> None:
+        with self._lock:
+            self._steps += 1
+            if proposed is None:
+                self._plain_tokens += tokens
+                self._plain_seconds += seconds
+                return
+            self._speculative_steps += 1
+            self._proposed += proposed
+            self._accepted += accepted
+            self._speculative_tokens += tokens
+            self._speculative_seconds += seconds
+
+
+    def propose(
+        self,
+        owner: Any,
+        input_ids: List[int],
+        count: int,
+        sample: Callable[[List[int], torch.Tensor], Tuple[int, torch.Tensor | None]],
+    ) -> Tuple[List[int], List[torch.Tensor | None]]:
+        # The draft cache follows a single sequence and only the tokens it has not seen yet are fed, so it catches up
+        # after a prefill, after tokens it got wrong, and after decoding in a batch without it.
+        if owner is not self._owner:
+            self.reset()
+            self._owner = owner
+
+        device = self._draft_model.device
+        past_key_values = self._past_key_values
+        length = 0 if past_key_values is None else self._layout.length(past_key_values)
+        feed = input_ids[length:]
+        draft_ids: List[int] = []
+        draft_probs: List[torch.Tensor | None] = []
+        for _ in range(count):
+            outputs = self._draft_model(
+                input_ids=torch.tensor([feed], device=device),
+                past_key_values=past_key_values,
+                attention_mask=torch.ones((1, length + len(feed)), dtype=torch.long, device=device),
+                position_ids=torch.arange(length, length + len(feed), device=device).unsqueeze(0),
+                use_cache=True,
+            )
+            past_key_values = outputs.past_key_values
+            length += len(feed)
+            token, probs = sample(input_ids + draft_ids, outputs.logits[0, -1, :])
+            draft_ids.append(token)
+            draft_probs.append(probs)
+            feed = [token]
+
+        self._past_key_values = past_key_values
+        return draft_ids, draft_probs
+
+
+    def truncate(self, length: int) -> None:
+        if self._past_key_values is not None and self._layout.length(self._past_key_values) > length:
+            self._past_key_values = self._layout.slice(self._past_key_values, start=0, end=length)
+
+
+    def discard(self, owner: Any) -> None:
+        if owner is self._owner:
+            self.reset()
+
+
+    def reset(self) -> None:
+        self._owner = None
+        self._past_key_values = None
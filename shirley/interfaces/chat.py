@@ -1,18 +1,62 @@
+import asyncio
+import functools
 import gradio as gr
+import hashlib
 import logging
-import pypdf
+import queue
 import shirley as sh
 import sys
+import threading
+import time
 from .interface import Interface
+from gradio.context import Context
 from gradio.events import Dependency
 from shirley.options import ChatInterfaceOptions
-from typing import Any, Callable, Generator, Iterator, List, Tuple
+from shirley.utils import metrics, profiling, tokenbudget
+from typing import Any, AsyncIterator, Callable, Dict, Generator, Iterator, List, Tuple
 
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(stream=sys.stdout, level=logging.INFO)
 
 
+class ChatSession:
+
+    def __init__(self, pretrained_model_name_or_path: str, max_history_size: int | None = None) -> None:
+        self.pretrained_model_name_or_path = pretrained_model_name_or_path
+        self.loaded_model_name_or_path: str | None = None
+        self.generating: bool = False
+        self.cancel_event: threading.Event | None = None
+        self.history: List[Tuple] = []
+        self.context_report: Dict | None = None
+        self.sentences: queue.Queue | None = None
+        self.artifacts: List[str] = []
+        self._max_history_size = max_history_size
+
+
+    @property
+    def history_size(self) -> int:
+        return sum(len(str(query)) + len(response or '') for query, response in self.history)
+
+
+    def append(self, item: Tuple) -> None:
+        self.history = self.history + [item]
+        self._truncate()
+
+
+    def _truncate(self) -> None:
+        if self._max_history_size is None:
+            return
+
+        # Whole turns (uploaded files and the text that follows them) are dropped, oldest first, and the latest turn
+        # is always kept.
+        while self.history_size > self._max_history_size:
+            turns = [i for i, (query, _) in enumerate(self.history) if not isinstance(query, (Tuple, List))]
+            if len(turns) < 2:
+                break
+            self.history = self.history[turns[0] + 1:]
+
+
 class ChatInterface(Interface):
 
     def __init__(self, options: ChatInterfaceOptions = ChatInterfaceOptions()) -> None:
@@ -20,62 +64,288 @@ class ChatInterface(Interface):
 
         self._client: sh.ChatClient = sh.ChatClient(options=options.client)
         self._chat_stream_fn: Callable | None = options.chat_stream_fn
+        self._concurrency_limit: int | None = options.concurrency_limit
+        self._max_updates_per_second: float | None = options.max_updates_per_second
+        self._min_update_chars: int | None = options.min_update_chars
+        self._generation_timeout: float | None = options.generation_timeout
+        self._max_context_tokens: int | None = options.max_context_tokens
+        self._token_counts = sh.utils.TokenCounter()
+        self._speech_client: sh.TextToSpeechClient | None = (
+            sh.TextToSpeechClient(options=options.speech) if options.speech is not None else None
+        )
+        self._speech_voice: str | None = options.speech_voice
         self._pretrained_models: List[str] = self._client.get_models()
+        if options.preload_model is not None and options.preload_model not in self._pretrained_models:
+            raise ValueError(f'Model {options.preload_model} not found.')
+        self._pretrained_model: str = options.preload_model or self._pretrained_models[0]
         self._pretrained_model_name_or_path: str = self._client.get_model_name_or_path(
-            model_name=self._pretrained_models[0],
+            model_name=self._pretrained_model,
+        )
+        self._preloaded_model_name_or_path: str | None = None
+        if options.preload_model is not None:
+            # The model loads and warms up in the background while the UI starts listening; sessions point at it
+            # straight away, and the config panel reports when it is ready.
+            self._preloaded_model_name_or_path = self._pretrained_model_name_or_path
+            self._client.preload_model(
+                pretrained_model_name_or_path=self._preloaded_model_name_or_path,
+                warmup=options.warmup,
+            )
+        self._sessions: sh.utils.SessionStore[ChatSession] = sh.utils.SessionStore(
+            factory=functools.partial(self._make_session, max_history_size=options.max_session_history_size),
+            max_sessions=options.max_sessions,
+            timeout=options.session_timeout,
+        )
+        self._documents = sh.utils.DocumentCache(
+            directory=self._client.artifacts.register(kind='documents', max_size=options.document_cache_size),
+            max_size=options.document_cache_size,
+            max_workers=options.document_workers,
+        )
+        self._profiler = sh.utils.Profiler(
+            directory=self._client.artifacts.register(kind='profiles', max_size=options.profiles_size),
+            rate=options.profile_rate,
         )
-        self._generating: bool = False
-        self._history: List[Tuple] = []
+
+        self._client.artifacts.add_references(fn=self._get_artifacts)
 
         self._make_components(options)
 
 
+    def _make_session(self, max_history_size: int | None) -> ChatSession:
+        session = ChatSession(
+            pretrained_model_name_or_path=self._pretrained_model_name_or_path,
+            max_history_size=max_history_size,
+        )
+        session.loaded_model_name_or_path = self._preloaded_model_name_or_path
+        return session
+
+
+    def _get_artifacts(self) -> List[str]:
+        # Images drawn for a session stay on disk while its chatbot may still show them.
+        return [filepath for session in self._sessions.values() for filepath in session.artifacts]
+
+
+    def _get_session(self, request: gr.Request) -> ChatSession:
+        return self._sessions.get(session_id=request.session_hash or '')
+
+
     def _chat_stream(
         self,
         query: sh.QwenQuery,
         history: sh.QwenHistory = None,
+        pretrained_model_name_or_path: str | None = None,
+        cancel_event: threading.Event | None = None,
     ) -> Generator[str, Any, None]:
         if self._chat_stream_fn:
             return self._chat_stream_fn(
-                fn=self._client.chat_stream,
+                fn=functools.partial(
+                    self._client.chat_stream,
+                    pretrained_model_name_or_path=pretrained_model_name_or_path,
+                    cancel_event=cancel_event,
+                    timeout=self._generation_timeout,
+                ),
                 query=query,
                 history=history,
             )
         else:
-            return self._client.chat_stream(query=query, history=history)
+            return self._client.chat_stream(
+                query=query,
+                history=history,
+                pretrained_model_name_or_path=pretrained_model_name_or_path,
+                cancel_event=cancel_event,
+                timeout=self._generation_timeout,
+            )
+
+
+    def _draw_bbox_on_latest_picture(
+        self,
+        history: sh.QwenHistory,
+        pretrained_model_name_or_path: str | None = None,
+    ) -> str | None:
+        return self._client.draw_bbox_on_latest_picture(
+            history=history,
+            pretrained_model_name_or_path=pretrained_model_name_or_path,
+        )
 
 
-    def _draw_bbox_on_latest_picture(self, history: sh.QwenHistory) -> str | None:
-        return self._client.draw_bbox_on_latest_picture(history=history)
+    def _load_context(self, filepath: str, model_name: str) -> str:
+        start = time.perf_counter()
+        with profiling.span('load_context'):
+            if sh.utils.isimage(filepath):
+                kind, context = 'image', f'Picture: <img>{filepath}</img>'
+            elif filepath.endswith('.pdf'):
+                kind, context = 'pdf', self._documents.get_text(filepath=filepath)
+            else:
+                logger.warning(f'File type {filepath} not supported.')
+                kind, context = 'other', ''
+        metrics.CHAT_CONTEXT_LOAD_SECONDS.observe(time.perf_counter() - start, model=model_name, kind=kind)
+        return context
 
 
-    def _load_context(self, filepath: str) -> str:
-        if sh.utils.isimage(filepath):
-            return f'Picture: <img>{filepath}</img>'
-        elif filepath.endswith('.pdf'):
-            reader = pypdf.PdfReader(stream=filepath)
-            return '\n'.join([page.extract_text() for page in reader.pages])
-        else:
-            logger.warning(f'File type {filepath} not supported.')
-            return ''
+    def _is_document(self, filepath: str) -> bool:
+        return filepath.endswith('.pdf')
 
 
-    def _get_query_and_history(self) -> Tuple[sh.QwenQuery, sh.QwenHistory]:
-        history: sh.QwenHistory = []
+    def _get_turn_text(self, filepaths: List[str], query: str, documents: bool, get_context: Callable) -> str:
         text = ''
-        for _, (query, response) in enumerate(self._history):
+        for filepath in filepaths:
+            if documents or not self._is_document(filepath=filepath):
+                text += get_context(filepath) + '\n'
+        return text + query
+
+
+    def _get_query_and_history(self, session: ChatSession) -> Tuple[sh.QwenQuery, sh.QwenHistory]:
+        model_name = self._client.get_model_name(pretrained_model_name_or_path=session.pretrained_model_name_or_path)
+        contexts: Dict[str, str] = {}
+
+        def get_context(filepath: str) -> str:
+            if filepath not in contexts:
+                contexts[filepath] = self._load_context(filepath=filepath, model_name=model_name)
+            return contexts[filepath]
+
+        # A turn is the files uploaded before a query, the query and its response.
+        turns: List[Tuple[List[str], str, str | None]] = []
+        filepaths: List[str] = []
+        for query, response in session.history:
             if isinstance(query, (Tuple, List)):
-                filepath = query[0]
-                context = self._load_context(filepath=filepath)
-                text += context + '\n'
+                filepaths.append(query[0])
             else:
-                text += query
-                history.append((text, response))
-                text = ''
+                turns.append((filepaths, query, response))
+                filepaths = []
+
+        decisions = self._fit_turns(session=session, turns=turns, get_context=get_context, model_name=model_name)
+        history: sh.QwenHistory = []
+        for (filepaths, query, response), decision in zip(turns, decisions):
+            if decision == tokenbudget.DROPPED:
+                continue
+            documents = decision == tokenbudget.FULL
+            text = self._get_turn_text(filepaths=filepaths, query=query, documents=documents, get_context=get_context)
+            history.append((text, response))
         return history[-1][0], history[:-1]
 
 
-    def _pregenerate(self, *args, **kwargs) -> sh.GradioComponents:
+    def _fit_turns(
+        self,
+        session: ChatSession,
+        turns: List[Tuple[List[str], str, str | None]],
+        get_context: Callable[[str], str],
+        model_name: str,
+    ) -> List[str]:
+        chat_model = self._client.get_model(pretrained_model_name_or_path=session.loaded_model_name_or_path)
+        if chat_model is None:
+            return [tokenbudget.FULL] * len(turns)
+        pretrained_model_name_or_path = chat_model.pretrained_model_name_or_path
+        max_tokens = self._max_context_tokens
+        if max_tokens is None:
+            max_tokens = self._client.get_max_context_tokens(pretrained_model_name_or_path=pretrained_model_name_or_path)
+        if max_tokens is None:
+            return [tokenbudget.FULL] * len(turns)
+
+        # Counts are cached per model and text digest (or uploaded file), so each turn is tokenized once, and the text
+        # of a document dropped on an earlier turn is not even loaded again.
+        def count(key: Tuple[str, str], fn: Callable[[], int]) -> int:
+            return self._token_counts.count(key=(pretrained_model_name_or_path,) + key, fn=fn)
+
+        def count_text(key: Tuple[str, str], get_text: Callable[[], str]) -> int:
+            return count(key=key, fn=lambda: self._client.count_tokens(
+                text=get_text(),
+                pretrained_model_name_or_path=pretrained_model_name_or_path,
+            ))
+
+        def get_digest(text: str) -> str:
+            return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+        with profiling.span('fit_turns'):
+            # The system prompt and the framing of the latest turn are always sent; each earlier turn adds its own
+            # chat format markup (ChatML's role headers and separators) on top of its text.
+            base_tokens = count(key=('context', 'base'), fn=lambda: self._client.count_context_tokens(
+                query='',
+                pretrained_model_name_or_path=pretrained_model_name_or_path,
+            ))
+            turn_tokens = count(key=('context', 'turn'), fn=lambda: self._client.count_context_tokens(
+                query='',
+                history=[('', '')],
+                pretrained_model_name_or_path=pretrained_model_name_or_path,
+            )) - base_tokens
+
+            counts = []
+            for i, (filepaths, query, response) in enumerate(turns):
+                text = self._get_turn_text(filepaths=filepaths, query=query, documents=False, get_context=get_context)
+                text_tokens = count_text(key=('text', get_digest(text)), get_text=lambda: text)
+                text_tokens += count_text(key=('text', get_digest(response or '')), get_text=lambda: response or '')
+                if i < len(turns) - 1:
+                    text_tokens += turn_tokens
+                document_tokens = sum(
+                    count_text(key=('file', filepath), get_text=functools.partial(get_context, filepath))
+                    for filepath in filepaths if self._is_document(filepath=filepath)
+                )
+                counts.append((text_tokens, document_tokens))
+            decisions, report = sh.utils.fit_turns(turns=counts, max_tokens=max(max_tokens - base_tokens, 0))
+
+        session.context_report = report
+        metrics.CHAT_HISTORY_TOKENS.observe(report['kept_tokens'], model=model_name, result='kept')
+        metrics.CHAT_HISTORY_TOKENS.observe(report['dropped_tokens'], model=model_name, result='dropped')
+        logger.info(
+            f'History: kept {report["kept_turns"]} turn(s) with {report["kept_tokens"]} token(s), dropped '
+            f'{report["dropped_turns"]} turn(s) and the documents of {report["trimmed_turns"]}, '
+            f'{report["dropped_tokens"]} token(s).'
+        )
+        return decisions
+
+
+    def _get_speech_text(self, response: str) -> str:
+        text = response.replace('<ref>', '').replace('</ref>', '')
+        text = sh.utils.incrementalparser.BOX_PATTERN.sub('', text)
+        # A tag that is still being streamed is held back until it is complete.
+        index = text.rfind('<')
+        if index != -1 and '>' not in text[index:]:
+            text = text[:index]
+        return text
+
+
+    def _feed_sentences(self, stream: Iterator[str], sentences: queue.Queue) -> Iterator[str]:
+        # Completed sentences are handed to the speech event while the response is still streaming, so synthesis
+        # overlaps with generation.
+        splitter = sh.utils.SentenceSplitter()
+        length = 0
+        try:
+            for response in stream:
+                text = self._get_speech_text(response=response)
+                if len(text) > length:
+                    for sentence in splitter.feed(text[length:]):
+                        sentences.put(sentence)
+                    length = len(text)
+                yield response
+            for sentence in splitter.flush():
+                sentences.put(sentence)
+        finally:
+            sentences.put(None)
+
+
+    async def _get_sentences(self, sentences: queue.Queue) -> AsyncIterator[str]:
+        while True:
+            sentence = await asyncio.to_thread(sentences.get)
+            if sentence is None:
+                break
+            yield sentence
+
+
+    async def _speak(self, request: gr.Request, *args, **kwargs) -> AsyncIterator[sh.AudioOutput]:
+        session = self._get_session(request=request)
+        if self._speech_client is None or session.sentences is None:
+            return
+
+        async for chunk in self._speech_client.sentences_to_speech_stream(
+            sentences=self._get_sentences(sentences=session.sentences),
+            voice=self._speech_voice,
+        ):
+            yield chunk
+
+
+    def _pregenerate(self, request: gr.Request, *args, **kwargs) -> sh.GradioComponents:
+        # Each turn gets its own sentence queue; `_generate` fills it and `_speak` drains it.
+        session = self._get_session(request=request)
+        session.sentences = queue.Queue() if self._speech_client is not None else None
+
         components = [
             gr.MultimodalTextbox(interactive=False),
             gr.Button(variant='secondary', interactive=False),
@@ -86,34 +356,77 @@ class ChatInterface(Interface):
         return tuple(components)
 
 
-    def _generate(self, *args, **kwargs) -> Iterator[sh.ChatbotTuplesOutput]:
+    def _generate(self, request: gr.Request, *args, **kwargs) -> Iterator[sh.ChatbotTuplesOutput]:
+        # A sampled request runs under the profiler one step at a time, since Gradio may run each step on another
+        # thread.
+        stream = self._generate_chatbot(request, *args, **kwargs)
+        profile = self._profiler.sample(name='generate')
+        yield from stream if profile is None else profile.wrap(stream)
+
+
+    def _generate_chatbot(self, request: gr.Request, *args, **kwargs) -> Iterator[sh.ChatbotTuplesOutput]:
         chatbot: sh.ChatbotTuplesInput = args[0]
+        session = self._get_session(request=request)
 
-        self._generating = True
+        session.generating = True
+        session.cancel_event = threading.Event()
         logger.info(f'😀 User: {chatbot[-1][0]}')
 
-        query, history = self._get_query_and_history()
-        full_response = ''
-        for response in self._chat_stream(query=query, history=history):
-            if not self._generating: break
-            chatbot[-1] = (chatbot[-1][0], sh.utils.parse(text=response, remove_image_tags=True))
-            yield chatbot
+        query, history = self._get_query_and_history(session=session)
+        parser = sh.utils.IncrementalParser(remove_image_tags=True)
+        throttle = sh.utils.Throttle(
+            max_updates_per_second=self._max_updates_per_second,
+            min_chars=self._min_update_chars,
+        )
+        stream = self._chat_stream(
+            query=query,
+            history=history,
+            pretrained_model_name_or_path=session.loaded_model_name_or_path,
+            cancel_event=session.cancel_event,
+        )
+        if session.sentences is not None:
+            stream = self._feed_sentences(stream=stream, sentences=session.sentences)
+        response = ''
+        try:
+            for response in stream:
+                if not session.generating: break
+                # Tokens are coalesced into fewer UI updates; the final update below always carries the full response.
+                if not throttle.ready(length=len(response)): continue
+                chatbot[-1] = (chatbot[-1][0], parser.parse(text=response))
+                yield chatbot
+        finally:
+            # Whatever ended the loop (Stop, a closed generator, an error), the model stops at its next token.
+            session.cancel_event.set()
+        with profiling.span('parse'):
             full_response = sh.utils.parse(text=response)
 
-        history.append((query, full_response))
-        image_filepath = self._draw_bbox_on_latest_picture(history=history)
+        # The raw response is kept in the history so that the next turn re-tokenizes to the same prefix that the
+        # engine has cached; only the chatbot shows the parsed text.
+        history.append((query, response))
+        with profiling.span('draw_bbox'):
+            image_filepath = self._draw_bbox_on_latest_picture(
+                history=history,
+                pretrained_model_name_or_path=session.loaded_model_name_or_path,
+            )
         if image_filepath is not None:
+            chatbot[-1] = (chatbot[-1][0], parser.parse(text=response))
             chatbot.append((None, (image_filepath,)))
+            session.artifacts.append(image_filepath)
         else:
             chatbot[-1] = (chatbot[-1][0], full_response)
-        self._history[-1] = (self._history[-1][0], full_response)
+        session.history[-1] = (session.history[-1][0], response)
 
         logger.info(f'🦈 Shirley: {full_response}')
-        self._generating = False
+        session.generating = False
         yield chatbot
 
 
-    def _postgenerate(self, *args, **kwargs) -> sh.GradioComponents:
+    def _postgenerate(self, request: gr.Request, *args, **kwargs) -> sh.GradioComponents:
+        # Ends the speech event even if generation failed before it could close the sentence queue.
+        session = self._get_session(request=request)
+        if session.sentences is not None:
+            session.sentences.put(None)
+
         components = [
             gr.MultimodalTextbox(interactive=True),
             gr.Button(variant='secondary', interactive=False),
@@ -124,15 +437,25 @@ class ChatInterface(Interface):
         return tuple(components)
 
 
-    def _validate(self, *args, **kwargs) -> None:
-        if not self._client.model:
+    def _validate(self, request: gr.Request, *args, **kwargs) -> None:
+        session = self._get_session(request=request)
+        status = self._client.get_status(pretrained_model_name_or_path=session.loaded_model_name_or_path)
+        if status in ('loading', 'warming up'):
+            raise gr.Error('Model is still loading. Please try again shortly.')
+        if not self._client.is_loaded(pretrained_model_name_or_path=session.loaded_model_name_or_path):
             logger.error('Model not loaded.')
             raise gr.Error('Model not loaded. Please load a model.')
 
 
-    def _submit(self, *args, **kwargs) -> Tuple[sh.ChatbotTuplesOutput, sh.MultimodalTextboxOutput]:
+    def _submit(
+        self,
+        request: gr.Request,
+        *args,
+        **kwargs,
+    ) -> Tuple[sh.ChatbotTuplesOutput, sh.MultimodalTextboxOutput]:
         chatbot: sh.ChatbotTuplesInput = args[0]
         multimodal_textbox: sh.MultimodalTextboxInput = args[1]
+        session = self._get_session(request=request)
 
         text = multimodal_textbox['text']
         if not text or not text.strip():
@@ -140,29 +463,43 @@ class ChatInterface(Interface):
 
         for filepath in multimodal_textbox['files']:
             chatbot = chatbot + [((filepath,), None)]
-            self._history = self._history + [((filepath,), None)]
+            session.append(((filepath,), None))
 
         if multimodal_textbox['text'] is not None:
             chatbot = chatbot + [(sh.utils.parse(text=multimodal_textbox['text']), None)]
-            self._history = self._history + [(multimodal_textbox['text'], None)]
+            session.append((multimodal_textbox['text'], None))
 
         return chatbot, None
 
 
-    def _stop(self, *args, **kwargs) -> sh.GradioComponents:
-        self._generating = False
+    def _stop(self, request: gr.Request, *args, **kwargs) -> sh.GradioComponents:
+        session = self._get_session(request=request)
+        session.generating = False
+        if session.cancel_event is not None:
+            session.cancel_event.set()
 
 
-    def _regenerate(self, *args, **kwargs) -> sh.ChatbotTuplesOutput | Iterator[sh.ChatbotTuplesOutput]:
+    def _unload(self, request: gr.Request, *args, **kwargs) -> None:
+        # The tab was closed or lost its connection; nobody is left to read the response.
+        self._stop(request, *args, **kwargs)
+
+
+    def _regenerate(
+        self,
+        request: gr.Request,
+        *args,
+        **kwargs,
+    ) -> sh.ChatbotTuplesOutput | Iterator[sh.ChatbotTuplesOutput]:
         chatbot: sh.ChatbotTuplesInput = args[0]
+        session = self._get_session(request=request)
 
-        if len(chatbot) < 1 or len(self._history) < 1:
+        if len(chatbot) < 1 or len(session.history) < 1:
             return chatbot
 
-        history_last = self._history[-1]
+        history_last = session.history[-1]
         if history_last[1] is None:
             return chatbot
-        self._history[-1] = (history_last[0], None)
+        session.history[-1] = (history_last[0], None)
 
         chatbot_last = chatbot.pop(-1)
         if chatbot_last[0] is None:
@@ -170,11 +507,13 @@ class ChatInterface(Interface):
         else:
             chatbot.append((chatbot_last[0], None))
 
-        yield from self._generate(*args, **kwargs)
+        yield from self._generate(request, *args, **kwargs)
 
 
-    def _reset(self, *args, **kwargs) -> sh.GradioComponents:
-        self._history = []
+    def _reset(self, request: gr.Request, *args, **kwargs) -> sh.GradioComponents:
+        session = self._get_session(request=request)
+        session.history = []
+        session.artifacts = []
 
         components = [
             gr.MultimodalTextbox(interactive=True),
@@ -186,20 +525,41 @@ class ChatInterface(Interface):
         return tuple(components)
 
 
-    def _model_dropdown_change(self, *args, **kwargs) -> None:
+    def _model_dropdown_change(self, request: gr.Request, *args, **kwargs) -> None:
         model_dropdown: sh.DropdownInput = args[0]
 
-        self._pretrained_model_name_or_path = self._client.get_model_name_or_path(model_name=model_dropdown)
+        session = self._get_session(request=request)
+        session.pretrained_model_name_or_path = self._client.get_model_name_or_path(model_name=model_dropdown)
 
 
-    def _load_button_click(self, *args, **kwargs) -> sh.GradioComponents:
-        if not self._client.model or self._pretrained_model_name_or_path != self._client.pretrained_model_name_or_path:
-            self._client.load_model(pretrained_model_name_or_path=self._pretrained_model_name_or_path)
+    def _load_button_click(self, request: gr.Request, *args, **kwargs) -> sh.GradioComponents:
+        session = self._get_session(request=request)
+        self._client.load_model(pretrained_model_name_or_path=session.pretrained_model_name_or_path)
+        session.loaded_model_name_or_path = session.pretrained_model_name_or_path
         gr.Info(message='Model loaded.')
 
         return gr.Dropdown(interactive=True), gr.Button(interactive=True)
 
 
+    def _get_model_config(self, request: gr.Request, *args, **kwargs) -> Dict | None:
+        session = self._get_session(request=request)
+        model_config = self._client.get_model_config(pretrained_model_name_or_path=session.loaded_model_name_or_path)
+        if model_config is not None and session.context_report is not None:
+            model_config['context'] = session.context_report
+        return model_config
+
+
+    def _watch_model_config(self, request: gr.Request, *args, **kwargs) -> Iterator[Dict | None]:
+        session = self._get_session(request=request)
+        while True:
+            yield self._get_model_config(request=request)
+            status = self._client.get_status(pretrained_model_name_or_path=session.loaded_model_name_or_path)
+            if status not in ('loading', 'warming up'):
+                break
+            # The preload thread wakes the watcher on each status change, so nothing polls in between.
+            self._client.wait_status(pretrained_model_name_or_path=session.loaded_model_name_or_path, status=status)
+
+
     def _multimodal_textbox_change(self, *args, **kwargs) -> sh.GradioComponents:
         multimodal_textbox: sh.MultimodalTextboxInput = args[0]
 
@@ -239,11 +599,26 @@ class ChatInterface(Interface):
             show_api=False,
         )
         load_button_click.then(
-            fn=lambda: self._client.get_model_config(),
+            fn=self._get_model_config,
+            inputs=None,
+            outputs=[model_config],
+            show_api=False,
+        )
+
+
+    def _setup_load(self, *args, **kwargs) -> None:
+        model_config: gr.JSON = kwargs['model_config']
+
+        if Context.root_block is None:
+            return
+        Context.root_block.load(
+            fn=self._watch_model_config,
             inputs=None,
             outputs=[model_config],
             show_api=False,
+            concurrency_limit=None,
         )
+        Context.root_block.unload(fn=self._unload)
 
 
     def _set_event_trigger_generate(self, dependency: Dependency, fn: Callable, *args, **kwargs) -> None:
@@ -253,6 +628,8 @@ class ChatInterface(Interface):
         stop_button: gr.Button = kwargs['stop_button']
         regenerate_button: gr.Button = kwargs['regenerate_button']
         reset_button: gr.ClearButton = kwargs['reset_button']
+        audio: gr.Audio | None = kwargs['audio']
+        model_config: gr.JSON = kwargs['model_config']
 
         success = dependency.success(fn=lambda:None, show_api=False)
         pregenerate = success.then(
@@ -266,13 +643,31 @@ class ChatInterface(Interface):
             inputs=[chatbot],
             outputs=[chatbot],
             show_api=False,
+            concurrency_limit=self._concurrency_limit,
+            concurrency_id='chat_generate',
         )
-        generate.then(
+        postgenerate = generate.then(
             fn=self._postgenerate,
             inputs=None,
             outputs=[multimodal_textbox, submit_button, stop_button, regenerate_button, reset_button],
             show_api=False,
         )
+        # The panel shows how the history of the last request was fitted into the context window.
+        postgenerate.then(
+            fn=self._get_model_config,
+            inputs=None,
+            outputs=[model_config],
+            show_api=False,
+        )
+        if audio is not None:
+            pregenerate.then(
+                fn=self._speak,
+                inputs=None,
+                outputs=[audio],
+                show_api=False,
+                concurrency_limit=self._concurrency_limit,
+                concurrency_id='chat_speak',
+            )
 
 
     def _setup_multimodal_textbox(self, *args, **kwargs) -> None:
@@ -350,6 +745,7 @@ class ChatInterface(Interface):
 
 
     def _setup(self, *args, **kwargs) -> None:
+        self._setup_load(*args, **kwargs)
         self._setup_model_dropdown(*args, **kwargs)
         self._setup_load_button(*args, **kwargs)
         self._setup_multimodal_textbox(*args, **kwargs)
@@ -365,7 +761,7 @@ class ChatInterface(Interface):
                 with gr.Group():
                     model_dropdown = gr.Dropdown(
                         choices=self._pretrained_models,
-                        value=self._pretrained_models[0],
+                        value=self._pretrained_model,
                         multiselect=False,
                         allow_custom_value=False,
                         label='🤗 Model (模型)',
@@ -385,6 +781,14 @@ class ChatInterface(Interface):
                     show_label=False,
                     interactive=True,
                 )
+                audio = None
+                if self._speech_client is not None:
+                    audio = gr.Audio(
+                        label='🔊 Speech (语音)',
+                        interactive=False,
+                        streaming=True,
+                        autoplay=True,
+                    )
                 with gr.Row():
                     submit_button = gr.Button(value='🚀 Submit (发送)', variant='secondary', interactive=False)
                     stop_button = gr.Button(value='🙈 Stop (停止)', variant='secondary', interactive=False)
@@ -401,4 +805,5 @@ class ChatInterface(Interface):
             stop_button=stop_button,
             regenerate_button=regenerate_button,
             reset_button=reset_button,
+            audio=audio,
         )
@@ -3,7 +3,10 @@ import logging
 import shirley as sh
 import sys
 from .interface import Interface
+from gradio.context import Context
 from shirley.options import TextToSpeechInterfaceOptions
+from shirley.utils import profiling
+from typing import AsyncIterator
 
 
 logger = logging.getLogger(__name__)
@@ -16,9 +19,12 @@ class TextToSpeechInterface(Interface):
         super().__init__(options=options)
 
         self._client = sh.TextToSpeechClient(options=options.client)
-        self._text: str = ''
-        self._locale: str | None = None
-        self._voice: str | None = None
+        self._concurrency_limit = options.concurrency_limit
+        self._streaming = options.streaming
+        self._profiler = sh.utils.Profiler(
+            directory=self._client.artifacts.register(kind='profiles', max_size=options.profiles_size),
+            rate=options.profile_rate,
+        )
 
         self._make_components(options=options)
 
@@ -37,8 +43,28 @@ class TextToSpeechInterface(Interface):
         return components
 
 
-    def _convert(self, *args, **kwargs) -> sh.AudioOutput:
-        return self._client.text_to_speech(text=self._text, voice=self._voice)
+    async def _convert(self, *args, **kwargs) -> sh.AudioOutput:
+        textbox: sh.TextboxInput = args[0]
+        voice_dropdown: sh.DropdownInput = args[1]
+
+        profile = self._profiler.sample(name='convert')
+        if profile is None:
+            return await self._client.text_to_speech_async(text=textbox, voice=voice_dropdown)
+        try:
+            with profile.trace():
+                return await self._client.text_to_speech_async(text=textbox, voice=voice_dropdown)
+        finally:
+            profile.save()
+
+
+    async def _convert_stream(self, *args, **kwargs) -> AsyncIterator[sh.AudioOutput]:
+        textbox: sh.TextboxInput = args[0]
+        voice_dropdown: sh.DropdownInput = args[1]
+
+        stream = self._client.text_to_speech_stream(text=textbox, voice=voice_dropdown)
+        profile = self._profiler.sample(name='convert')
+        async for chunk in stream if profile is None else profile.wrap_async(stream):
+            yield chunk
 
 
     def _postconvert(self, *args, **kwargs) -> sh.GradioComponents:
@@ -56,12 +82,8 @@ class TextToSpeechInterface(Interface):
         if not textbox or not textbox.strip():
             raise gr.Error('Text not valid.')
 
-        self._text = textbox
-
 
     def _reset(self, *args, **kwargs) -> sh.GradioComponents:
-        self._text = ''
-
         return gr.Button(interactive=False)
 
 
@@ -71,7 +93,6 @@ class TextToSpeechInterface(Interface):
         if not textbox or not textbox.strip():
             return gr.Button(variant='secondary', interactive=False)
 
-        self._text = textbox
         return gr.Button(variant='primary', interactive=True)
 
 
@@ -81,16 +102,8 @@ class TextToSpeechInterface(Interface):
         if not locale_dropdown or not locale_dropdown.strip():
             return gr.Dropdown(choices=None, interactive=False)
 
-        self._locale = locale_dropdown
         voices = self._client.get_available_voices(locale=locale_dropdown)
-        self._voice = None if not voices else voices[0]
-        return gr.Dropdown(choices=voices, value=self._voice, interactive=True)
-
-
-    def _voice_dropdown_change(self, *args, **kwargs) -> None:
-        voice_dropdown: sh.DropdownInput = args[0]
-
-        self._voice = voice_dropdown
+        return gr.Dropdown(choices=voices, value=None if not voices else voices[0], interactive=True)
 
 
     def _setup_textbox(self, *args, **kwargs) -> None:
@@ -117,19 +130,9 @@ class TextToSpeechInterface(Interface):
         )
 
 
-    def _setup_voice_dropdown(self, *args, **kwargs) -> None:
-        voice_dropdown: gr.Dropdown = kwargs['voice_dropdown']
-
-        voice_dropdown.change(
-            fn=self._voice_dropdown_change,
-            inputs=[voice_dropdown],
-            outputs=None,
-            show_api=False,
-        )
-
-
     def _setup_convert_button(self, *args, **kwargs) -> None:
         textbox: gr.Textbox = kwargs['textbox']
+        voice_dropdown: gr.Dropdown = kwargs['voice_dropdown']
         convert_button: gr.Button = kwargs['convert_button']
         reset_button: gr.ClearButton = kwargs['reset_button']
         audio: gr.Audio = kwargs['audio']
@@ -146,11 +149,14 @@ class TextToSpeechInterface(Interface):
             outputs=[textbox, convert_button, reset_button],
             show_api=False,
         )
+        # Text and voice are inputs of the event, so concurrent sessions each convert their own.
         convert = preconvert.then(
-            fn=self._convert,
-            inputs=None,
+            fn=self._convert_stream if self._streaming else self._convert,
+            inputs=[textbox, voice_dropdown],
             outputs=[audio],
             show_api=False,
+            concurrency_limit=self._concurrency_limit,
+            concurrency_id='tts_convert',
         )
         convert.then(
             fn=self._postconvert,
@@ -176,19 +182,32 @@ class TextToSpeechInterface(Interface):
         )
 
 
+    def _setup_load(self, *args, **kwargs) -> None:
+        locale_dropdown: gr.Dropdown = kwargs['locale_dropdown']
+        voice_dropdown: gr.Dropdown = kwargs['voice_dropdown']
+
+        # Voices are filled in once the page loads, so building the UI never waits on the speech service.
+        if Context.root_block is None:
+            return
+        Context.root_block.load(
+            fn=self._locale_dropdown_change,
+            inputs=[locale_dropdown],
+            outputs=[voice_dropdown],
+            show_api=False,
+        )
+
+
     def _setup(self, *args, **kwargs) -> None:
+        self._setup_load(*args, **kwargs)
         self._setup_textbox(*args, **kwargs)
         self._setup_locale_dropdown(*args, **kwargs)
-        self._setup_voice_dropdown(*args, **kwargs)
         self._setup_convert_button(*args, **kwargs)
         self._setup_reset_button(*args, **kwargs)
 
 
     def _make_components(self, options: TextToSpeechInterfaceOptions) -> None:
         locales = self._client.get_available_locales()
-        self._locale = locales[0]
-        voices = self._client.get_available_voices(locale=self._locale)
-        self._voice = None if not voices else voices[0]
+        voices = self._client.get_cached_voices(locale=locales[0])
 
         with gr.Row():
             with gr.Column():
@@ -202,14 +221,14 @@ class TextToSpeechInterface(Interface):
                 with gr.Row():
                     locale_dropdown = gr.Dropdown(
                         choices=locales,
-                        value=self._locale,
+                        value=locales[0],
                         multiselect=False,
                         allow_custom_value=False,
                         label='🌏 Locale (语言)',
                     )
                     voice_dropdown = gr.Dropdown(
                         choices=voices,
-                        value=self._voice,
+                        value=None if not voices else voices[0],
                         multiselect=False,
                         allow_custom_value=False,
                         label='🎤 Voice (声音)',
@@ -225,6 +244,8 @@ class TextToSpeechInterface(Interface):
                     scale=1,
                     interactive=False,
                     show_download_button=True,
+                    streaming=self._streaming,
+                    autoplay=self._streaming,
                 )
 
         self._setup(
@@ -1,17 +1,34 @@
 from dataclasses import dataclass
-from typing import Optional
+from typing import Callable, Optional
 
 
 @dataclass
 class ClientOptions:
-    pass
+    artifact_sweep_interval: Optional[float] = 600.0
 
 
 @dataclass
 class ChatClientOptions(ClientOptions):
     local: Optional[bool] = True
+    max_batch_size: Optional[int] = 8
+    prefix_cache_size: Optional[int] = 1024 ** 3
+    precision: Optional[str] = None
+    quantize: Optional[bool] = False
+    compile: Optional[bool] = False
+    max_memory: Optional[int] = None
+    draft_model: Optional[str] = None
+    num_draft_tokens: Optional[int] = 4
+    image_artifacts_size: Optional[int] = 256 * 1024 * 1024
+    image_artifacts_max_age: Optional[float] = 24 * 3600.0
 
 
 @dataclass
 class TextToSpeechClientOptions(ClientOptions):
-    pass
+    synthesizer_factory: Optional[Callable] = None
+    max_synthesizers_per_voice: Optional[int] = 4
+    voice_cache_ttl: Optional[float] = 24 * 3600.0
+    prefetch_voices: Optional[bool] = True
+    audio_cache_size: Optional[int] = 512 * 1024 * 1024
+    in_memory: Optional[bool] = False
+    audio_max_age: Optional[float] = 7 * 24 * 3600.0
+    max_chunk_chars: Optional[int] = 1000
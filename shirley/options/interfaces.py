@@ -26,8 +26,28 @@ class ChatInterfaceOptions(InterfaceOptions):
     client: Optional[ChatClientOptions] = ChatClientOptions()
     chatbot: Optional[ChatbotOptions] = ChatbotOptions()
     chat_stream_fn: Optional[Callable] = None
+    max_updates_per_second: Optional[float] = 20.0
+    min_update_chars: Optional[int] = 1
+    concurrency_limit: Optional[int] = 8
+    max_sessions: Optional[int] = 256
+    session_timeout: Optional[float] = 3600.0
+    max_session_history_size: Optional[int] = 4 * 1024 * 1024
+    max_context_tokens: Optional[int] = None
+    document_cache_size: Optional[int] = 256 * 1024 * 1024
+    document_workers: Optional[int] = None
+    speech: Optional[TextToSpeechClientOptions] = None
+    speech_voice: Optional[str] = 'zh-CN-XiaoxiaoNeural'
+    preload_model: Optional[str] = None
+    warmup: Optional[bool] = True
+    generation_timeout: Optional[float] = None
+    profile_rate: Optional[float] = 0.0
+    profiles_size: Optional[int] = 256 * 1024 * 1024
 
 
 @dataclass
 class TextToSpeechInterfaceOptions(InterfaceOptions):
     client: Optional[TextToSpeechClientOptions] = TextToSpeechClientOptions()
+    concurrency_limit: Optional[int] = 16
+    streaming: Optional[bool] = False
+    profile_rate: Optional[float] = 0.0
+    profiles_size: Optional[int] = 256 * 1024 * 1024
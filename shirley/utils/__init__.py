@@ -1,8 +1,26 @@
+from shirley.utils.artifactstore import ArtifactStore
+from shirley.utils.documentcache import DocumentCache
+from shirley.utils.eviction import evict_files
+from shirley.utils.filecache import FileCache
+from shirley.utils.incrementalparser import IncrementalParser
+from shirley.utils.lazyimport import lazy_import
+from shirley.utils.memorycache import MemoryCache
+from shirley.utils.metrics import Counter, Gauge, Histogram, MetricsRegistry
 from shirley.utils.pickleablegenerator import PickleableGenerator
+from shirley.utils.profiling import Profile, Profiler
+from shirley.utils.sentencesplitter import SentenceSplitter, split_chunks, split_sentences
+from shirley.utils.sessionstore import SessionStore
+from shirley.utils.synthesizerpool import SynthesizerPool
+from shirley.utils.throttle import Throttle
+from shirley.utils.tokenbudget import TokenCounter, fit_turns
+from shirley.utils.ttlcache import TTLCache
+from shirley.utils.wav import decode_wav, encode_wav
 
 import os
 import re
-from PIL import Image
+
+
+Image = lazy_import('PIL.Image')
 
 
 def getpath(filepath: str) -> str:
@@ -0,0 +1,100 @@
+import logging
+import pathlib
+import sys
+import threading
+from shirley.utils.eviction import evict_files
+from typing import Callable, Dict, Iterable, List, Tuple
+
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+
+
+class ArtifactStore:
+
+    def __init__(self, directory: str | pathlib.Path, sweep_interval: float | None = 600.0) -> None:
+        self._directory = pathlib.Path(directory)
+        self._sweep_interval = sweep_interval
+        self._kinds: Dict[str, Tuple[int | None, float | None]] = {}
+        self._references: List[Callable[[], Iterable[str]]] = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+
+    @property
+    def directory(self) -> pathlib.Path:
+        return self._directory
+
+
+    def register(self, kind: str, max_size: int | None = None, max_age: float | None = None) -> pathlib.Path:
+        # Clients sharing a tempdir may register the same kind; the tightest quota wins.
+        with self._lock:
+            if kind in self._kinds:
+                size, age = self._kinds[kind]
+                max_size = size if max_size is None else max_size if size is None else min(size, max_size)
+                max_age = age if max_age is None else max_age if age is None else min(age, max_age)
+            self._kinds[kind] = (max_size, max_age)
+        self._start()
+        return self._directory / kind
+
+
+    def add_references(self, fn: Callable[[], Iterable[str]]) -> None:
+        # `fn` returns the paths still in use (e.g. by live sessions); the sweeper never removes those.
+        with self._lock:
+            self._references.append(fn)
+
+
+    def path(self, kind: str, name: str) -> pathlib.Path:
+        directory = self._directory / kind
+        directory.mkdir(exist_ok=True, parents=True)
+        return directory / name
+
+
+    def sweep(self) -> int:
+        with self._lock:
+            kinds = dict(self._kinds)
+            references = list(self._references)
+
+        referenced = set()
+        for fn in references:
+            try:
+                referenced.update(str(pathlib.Path(path).resolve()) for path in fn())
+            except Exception:
+                logger.exception('Failed to collect referenced artifacts.')
+
+        removed = 0
+        for kind, (max_size, max_age) in kinds.items():
+            try:
+                filenames = [
+                    filename
+                    for filename in (self._directory / kind).iterdir()
+                    if filename.is_file() and str(filename.resolve()) not in referenced
+                ]
+            except FileNotFoundError:
+                continue
+            removed += evict_files(filenames=filenames, max_size=max_size, max_age=max_age)
+
+        if removed:
+            logger.info(f'{removed} artifact(s) removed from {str(self._directory)}.')
+        return removed
+
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is not None or self._sweep_interval is None:
+                return
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+
+    def _run(self) -> None:
+        while not self._stopped.wait(timeout=self._sweep_interval):
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception('Failed to sweep artifacts.')
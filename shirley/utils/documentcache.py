@@ -0,0 +1,126 @@
+import concurrent.futures
+import hashlib
+import logging
+import multiprocessing
+import os
+import pathlib
+import sys
+import threading
+from collections import OrderedDict
+from shirley.utils import metrics
+from shirley.utils.eviction import evict_files
+from shirley.utils.lazyimport import lazy_import
+from typing import List, Tuple
+
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+
+
+pypdf = lazy_import('pypdf')
+
+
+def _extract_pages(filepath: str, start: int, end: int) -> List[str]:
+    reader = pypdf.PdfReader(stream=filepath)
+    return [reader.pages[i].extract_text() for i in range(start, end)]
+
+
+class DocumentCache:
+
+    def __init__(
+        self,
+        directory: str | pathlib.Path,
+        max_size: int = 256 * 1024 * 1024,
+        max_workers: int | None = None,
+        pages_per_task: int = 16,
+    ) -> None:
+        self._directory = pathlib.Path(directory)
+        self._max_size = max_size
+        self._max_workers = max_workers or os.cpu_count() or 1
+        self._pages_per_task = pages_per_task
+        self._digests: OrderedDict[Tuple[str, int, int], str] = OrderedDict()
+        # A fixed pool of striped locks: the same document never extracts twice at once, and memory stays bounded.
+        self._locks: List[threading.Lock] = [threading.Lock() for _ in range(64)]
+        self._lock = threading.Lock()
+        self._executor: concurrent.futures.ProcessPoolExecutor | None = None
+
+
+    def get_text(self, filepath: str) -> str:
+        digest = self._get_digest(filepath=filepath)
+        filename = self._directory / f'{digest}.txt'
+
+        with self._get_lock(digest=digest):
+            try:
+                text = filename.read_text(encoding='utf-8')
+                os.utime(filename)
+                metrics.DOCUMENT_CACHE_LOOKUPS.inc(result='hit')
+                return text
+            except FileNotFoundError:
+                metrics.DOCUMENT_CACHE_LOOKUPS.inc(result='miss')
+
+            text = self._extract_text(filepath=filepath)
+            self._directory.mkdir(exist_ok=True, parents=True)
+            tempname = filename.with_suffix(f'.{threading.get_ident()}.tmp')
+            tempname.write_text(text, encoding='utf-8')
+            os.replace(tempname, filename)
+            logger.info(f'Text of {filepath} cached in {str(filename)}.')
+
+        self._evict()
+        return text
+
+
+    def _get_digest(self, filepath: str) -> str:
+        # The file content is hashed once per (path, mtime, size); later turns only stat the file.
+        stat = os.stat(filepath)
+        key = (os.path.abspath(filepath), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            digest = self._digests.get(key)
+            if digest is not None:
+                self._digests.move_to_end(key)
+                return digest
+
+        sha256 = hashlib.sha256()
+        with open(filepath, 'rb') as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b''):
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+
+        with self._lock:
+            self._digests[key] = digest
+            while len(self._digests) > 4096:
+                self._digests.popitem(last=False)
+        return digest
+
+
+    def _get_lock(self, digest: str) -> threading.Lock:
+        return self._locks[int(digest[:8], 16) % len(self._locks)]
+
+
+    def _get_executor(self) -> concurrent.futures.ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self._max_workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+            return self._executor
+
+
+    def _extract_text(self, filepath: str) -> str:
+        num_pages = len(pypdf.PdfReader(stream=filepath).pages)
+        ranges = [
+            (start, min(start + self._pages_per_task, num_pages))
+            for start in range(0, num_pages, self._pages_per_task)
+        ]
+
+        if len(ranges) < 2 or self._max_workers < 2:
+            pages = _extract_pages(filepath=filepath, start=0, end=num_pages)
+        else:
+            executor = self._get_executor()
+            futures = [executor.submit(_extract_pages, filepath, start, end) for start, end in ranges]
+            pages = [page for future in futures for page in future.result()]
+        return '\n'.join(pages)
+
+
+    def _evict(self) -> None:
+        evict_files(filenames=self._directory.glob('*.txt'), max_size=self._max_size)
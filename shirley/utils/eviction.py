@@ -0,0 +1,40 @@
+import pathlib
+import time
+from typing import Iterable
+
+
+def evict_files(
+    filenames: Iterable[pathlib.Path],
+    max_size: int | None = None,
+    max_age: float | None = None,
+    keep: pathlib.Path | None = None,
+) -> int:
+    # Oldest first by modification time, delete while a file is expired or the total is over `max_size`.
+    files = []
+    for filename in filenames:
+        if filename == keep:
+            continue
+        try:
+            files.append((filename, filename.stat()))
+        except FileNotFoundError:
+            pass
+
+    # A kept file still counts towards `max_size`, it is just never deleted.
+    size = sum(stat.st_size for _, stat in files)
+    if keep is not None and keep.exists():
+        size += keep.stat().st_size
+
+    now = time.time()
+    removed = 0
+    for filename, stat in sorted(files, key=lambda item: item[1].st_mtime):
+        expired = max_age is not None and now - stat.st_mtime > max_age
+        oversized = max_size is not None and size > max_size
+        if not expired and not oversized:
+            break
+        try:
+            filename.unlink()
+            removed += 1
+        except FileNotFoundError:
+            pass
+        size -= stat.st_size
+    return removed
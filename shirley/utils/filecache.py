@@ -0,0 +1,43 @@
+import os
+import pathlib
+import threading
+from shirley.utils.eviction import evict_files
+
+
+class FileCache:
+
+    def __init__(self, directory: str | pathlib.Path, suffix: str, max_size: int = 512 * 1024 * 1024) -> None:
+        self._directory = pathlib.Path(directory)
+        self._suffix = suffix
+        self._max_size = max_size
+        self._lock = threading.Lock()
+
+
+    @property
+    def directory(self) -> pathlib.Path:
+        return self._directory
+
+
+    def get(self, key: str) -> pathlib.Path | None:
+        filename = self._directory / f'{key}{self._suffix}'
+        try:
+            # The modification time doubles as the last access time for eviction.
+            os.utime(filename)
+        except FileNotFoundError:
+            return None
+        return filename
+
+
+    def put(self, key: str, data: bytes) -> pathlib.Path:
+        filename = self._directory / f'{key}{self._suffix}'
+        self._directory.mkdir(exist_ok=True, parents=True)
+        tempname = filename.with_suffix(f'.{threading.get_ident()}.tmp')
+        tempname.write_bytes(data)
+        os.replace(tempname, filename)
+        self._evict(keep=filename)
+        return filename
+
+
+    def _evict(self, keep: pathlib.Path) -> None:
+        with self._lock:
+            evict_files(filenames=self._directory.glob(f'*{self._suffix}'), max_size=self._max_size, keep=keep)
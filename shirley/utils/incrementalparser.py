@@ -0,0 +1,99 @@
+import re
+from typing import Tuple
+
+
+BOX_PATTERN = re.compile(r'<box>.*?(</box>|$)')
+
+
+class IncrementalParser:
+
+    def __init__(self, remove_image_tags: bool = False) -> None:
+        self._remove_image_tags = remove_image_tags
+        self.reset()
+
+
+    def reset(self) -> None:
+        self._text = ''
+        self._line = ''
+        self._lines = 0
+        self._count = 0
+        self._parsed = ''
+        self._pending = ''
+
+
+    def parse(self, text: str) -> str:
+        # Streams are cumulative, so only the appended text is split into lines. Complete lines are rendered once and
+        # kept; the trailing partial line is re-rendered on every call because a later chunk may still extend it.
+        if not text.startswith(self._text):
+            self.reset()
+
+        appended = text[len(self._text):]
+        self._text = text
+        if appended:
+            *lines, self._line = (self._line + appended).split('\n')
+            for line in lines:
+                self._commit(line=line)
+
+        partial = ''
+        if self._line != '':
+            partial, _ = self._parse_line(line=self._line, index=self._lines, count=self._count)
+
+        if not self._remove_image_tags:
+            return self._parsed + partial
+        return self._parsed + self._remove_tags(text=self._pending + partial)[0]
+
+
+    def _commit(self, line: str) -> None:
+        if line == '':
+            return
+
+        parsed, self._count = self._parse_line(line=line, index=self._lines, count=self._count)
+        self._lines += 1
+
+        if not self._remove_image_tags:
+            self._parsed += parsed
+            return
+
+        # Every line after the first starts with a tag, so tag removal never spans the boundary before it unless a
+        # `<box>` is still open; until it closes, the text since the last boundary stays pending.
+        self._pending += parsed
+        removed, is_open = self._remove_tags(text=self._pending)
+        if not is_open:
+            self._parsed += removed
+            self._pending = ''
+
+
+    def _parse_line(self, line: str, index: int, count: int) -> Tuple[str, int]:
+        if '```' in line:
+            count += 1
+            items = line.split('`')
+            if count % 2 == 1:
+                return f'<pre><code class=\'language-{items[-1]}\'>', count
+            else:
+                return f'<br></code></pre>', count
+
+        if index == 0:
+            return line, count
+
+        if count % 2 == 1:
+            line = line.replace('`', r'\`')
+            line = line.replace('<', '&lt;')
+            line = line.replace('>', '&gt;')
+            line = line.replace(' ', '&nbsp;')
+            line = line.replace('*', '&ast;')
+            line = line.replace('_', '&lowbar;')
+            line = line.replace('-', '&#45;')
+            line = line.replace('.', '&#46;')
+            line = line.replace('!', '&#33;')
+            line = line.replace('(', '&#40;')
+            line = line.replace(')', '&#41;')
+            line = line.replace('$', '&#36;')
+        return '<br>' + line, count
+
+
+    def _remove_tags(self, text: str) -> Tuple[str, bool]:
+        text = text.replace('<ref>', '').replace('</ref>', '')
+        is_open = False
+        for match in BOX_PATTERN.finditer(text):
+            is_open = match.group(1) == ''
+        return BOX_PATTERN.sub('', text), is_open
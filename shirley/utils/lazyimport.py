@@ -0,0 +1,31 @@
+import importlib
+import importlib.util
+from types import ModuleType
+
+
+class _LazyModule(ModuleType):
+
+    def __init__(self, name: str) -> None:
+        super().__init__(name)
+        self.__dict__['_module'] = None
+
+
+    def __getattr__(self, name: str):
+        module = self.__dict__['_module']
+        if module is None:
+            module = importlib.import_module(self.__name__)
+            self.__dict__['_module'] = module
+        return getattr(module, name)
+
+
+    def __dir__(self):
+        return dir(importlib.import_module(self.__name__))
+
+
+def lazy_import(name: str) -> ModuleType:
+    # A stand-in that imports the module on first attribute access, so heavy backends (torch, transformers, the speech
+    # SDK, ...) are not paid for until they are actually used. It stays out of `sys.modules`: a half-loaded entry
+    # there gets imported from under other imports that walk `sys.modules` (torch does, through `inspect`).
+    if importlib.util.find_spec(name) is None:
+        raise ModuleNotFoundError(f'No module named \'{name}\'', name=name)
+    return _LazyModule(name)
@@ -0,0 +1,39 @@
+import threading
+from collections import OrderedDict
+
+
+class MemoryCache:
+
+    def __init__(self, max_size: int = 512 * 1024 * 1024) -> None:
+        self._max_size = max_size
+        self._items: OrderedDict[str, bytes] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+            return data
+
+
+    def put(self, key: str, data: bytes) -> bytes:
+        with self._lock:
+            previous = self._items.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._items[key] = data
+            self._size += len(data)
+
+            # The newest item is kept even if it alone exceeds the budget.
+            while self._size > self._max_size and len(self._items) > 1:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= len(evicted)
+            return data
@@ -0,0 +1,210 @@
+import bisect
+import math
+import threading
+from typing import Dict, List, Sequence, Tuple
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+LOAD_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+TOKEN_RATE_BUCKETS = (1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0, 200.0, 500.0, 1000.0)
+TOKEN_COUNT_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+
+    TYPE = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self._name = name
+        self._documentation = documentation
+        self._labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+
+    def remove(self, **labels: str) -> None:
+        with self._lock:
+            self._values.pop(self._get_key(labels=labels), None)
+
+
+    def collect(self) -> List[str]:
+        lines = [f'# HELP {self._name} {_escape(self._documentation)}', f'# TYPE {self._name} {self.TYPE}']
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._collect_value(key=key, value=value))
+        return lines
+
+
+    def _collect_value(self, key: Tuple[str, ...], value: object) -> List[str]:
+        return [f'{self._name}{self._format_labels(key=key)} {_format_value(value)}']
+
+
+    def _get_key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self._labelnames):
+            raise ValueError(f'Metric {self._name} takes labels {list(self._labelnames)}, got {list(labels)}.')
+        return tuple(str(labels[name]) for name in self._labelnames)
+
+
+    def _format_labels(self, key: Tuple[str, ...], extra: Sequence[Tuple[str, str]] = ()) -> str:
+        pairs = list(zip(self._labelnames, key)) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Counter(Metric):
+
+    TYPE = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if amount < 0:
+            raise ValueError('Counters can only increase.')
+        key = self._get_key(labels=labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+
+    TYPE = 'gauge'
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._get_key(labels=labels)
+        with self._lock:
+            self._values[key] = value
+
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._get_key(labels=labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Histogram(Metric):
+
+    TYPE = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name=name, documentation=documentation, labelnames=labelnames)
+        self._buckets = tuple(sorted(buckets))
+
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._get_key(labels=labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self._buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self._buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+
+    def _collect_value(self, key: Tuple[str, ...], value: object) -> List[str]:
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self._buckets + (math.inf,), counts):
+            cumulative += count
+            labels = self._format_labels(key=key, extra=[('le', _format_value(bound))])
+            lines.append(f'{self._name}_bucket{labels} {cumulative}')
+        lines.append(f'{self._name}_sum{self._format_labels(key=key)} {_format_value(total)}')
+        lines.append(f'{self._name}_count{self._format_labels(key=key)} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name=name, documentation=documentation, labelnames=labelnames))
+
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name=name, documentation=documentation, labelnames=labelnames))
+
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        metric = Histogram(name=name, documentation=documentation, labelnames=labelnames, buckets=buckets)
+        return self._register(metric)
+
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(line for metric in metrics for line in metric.collect()) + '\n'
+
+
+    def _register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f'Metric {metric.name} already registered.')
+            self._metrics[metric.name] = metric
+        return metric
+
+
+REGISTRY = MetricsRegistry()
+
+CHAT_REQUESTS = REGISTRY.counter(
+    'shirley_chat_requests_total', 'Chat generation requests by outcome.', ('model', 'outcome'))
+CHAT_QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    'shirley_chat_queue_wait_seconds', 'Time from submission until the prefill starts.', ('model',))
+CHAT_TIME_TO_FIRST_TOKEN_SECONDS = REGISTRY.histogram(
+    'shirley_chat_time_to_first_token_seconds', 'Time from submission until the first token.', ('model',))
+CHAT_TOKENS_PER_SECOND = REGISTRY.histogram(
+    'shirley_chat_tokens_per_second', 'Decode rate of a request after its first token.', ('model',),
+    buckets=TOKEN_RATE_BUCKETS)
+CHAT_GENERATED_TOKENS = REGISTRY.counter(
+    'shirley_chat_generated_tokens_total', 'Tokens generated.', ('model',))
+CHAT_PROMPT_TOKENS = REGISTRY.histogram(
+    'shirley_chat_prompt_tokens', 'Prompt tokens per turn.', ('model',), buckets=TOKEN_COUNT_BUCKETS)
+CHAT_HISTORY_TOKENS = REGISTRY.histogram(
+    'shirley_chat_history_tokens', 'History tokens per turn kept within or dropped from the token budget.',
+    ('model', 'result'), buckets=TOKEN_COUNT_BUCKETS)
+CHAT_CONTEXT_LOAD_SECONDS = REGISTRY.histogram(
+    'shirley_chat_context_load_seconds', 'Time to load an uploaded file into the chat context.', ('model', 'kind'))
+MODEL_LOAD_SECONDS = REGISTRY.histogram(
+    'shirley_model_load_seconds', 'Time to load a pre-trained model.', ('model',), buckets=LOAD_BUCKETS)
+MODEL_RESIDENT_BYTES = REGISTRY.gauge(
+    'shirley_model_resident_bytes', 'Memory held by the weights of a resident model.', ('model',))
+PREFIX_CACHE_LOOKUPS = REGISTRY.counter(
+    'shirley_prefix_cache_lookups_total', 'Prefix cache lookups by result.', ('model', 'result'))
+PREFIX_CACHE_TOKENS = REGISTRY.counter(
+    'shirley_prefix_cache_tokens_total', 'Prompt tokens looked up in the prefix cache by result.', ('model', 'result'))
+DOCUMENT_CACHE_LOOKUPS = REGISTRY.counter(
+    'shirley_document_cache_lookups_total', 'Document text cache lookups by result.', ('result',))
+TTS_LATENCY_SECONDS = REGISTRY.histogram(
+    'shirley_tts_latency_seconds', 'Time to synthesize a text that was not cached.', ('voice',))
+TTS_CACHE_LOOKUPS = REGISTRY.counter(
+    'shirley_tts_cache_lookups_total', 'Synthesized audio cache lookups by result.', ('voice', 'result'))
@@ -0,0 +1,167 @@
+import contextlib
+import contextvars
+import cProfile
+import itertools
+import json
+import logging
+import os
+import pathlib
+import random
+import sys
+import threading
+import time
+from typing import AsyncIterator, Dict, Iterator, List, Tuple
+
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+
+
+_current: contextvars.ContextVar['Profile | None'] = contextvars.ContextVar('profile', default=None)
+_counter = itertools.count()
+
+
+class Profile:
+
+    def __init__(self, name: str, directory: pathlib.Path) -> None:
+        self._name = name
+        self._directory = directory
+        self._profiler = cProfile.Profile()
+        self._profiled = False
+        self._spans: List[Tuple[str, str, float, float]] = []
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._token: contextvars.Token | None = None
+
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+
+    def __enter__(self) -> 'Profile':
+        # Entered around each step of a request, on whichever thread runs that step: cProfile only follows the thread
+        # that enabled it, and the spans below pick the profile up from the context.
+        self._token = _current.set(self)
+        self._profiled = True
+        self._profiler.enable()
+        return self
+
+
+    def __exit__(self, *args) -> None:
+        self._profiler.disable()
+        _current.reset(self._token)
+        self._token = None
+
+
+    @contextlib.contextmanager
+    def trace(self) -> Iterator['Profile']:
+        # Spans only, for steps that await: across an await cProfile would charge this request with everything else
+        # the event loop runs in the meantime.
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+
+    @contextlib.contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name=name, start=start, end=time.perf_counter())
+
+
+    def add_span(self, name: str, start: float, end: float, thread: str | None = None) -> None:
+        with self._lock:
+            self._spans.append((name, thread or threading.current_thread().name, start, end))
+
+
+    def wrap(self, iterator: Iterator) -> Iterator:
+        try:
+            while True:
+                with self:
+                    try:
+                        item = next(iterator)
+                    except StopIteration:
+                        return
+                yield item
+        finally:
+            self.save()
+
+
+    async def wrap_async(self, iterator: AsyncIterator) -> AsyncIterator:
+        try:
+            while True:
+                with self.trace():
+                    try:
+                        item = await iterator.__anext__()
+                    except StopAsyncIteration:
+                        return
+                yield item
+        finally:
+            self.save()
+
+
+    def save(self) -> List[pathlib.Path]:
+        self.add_span(name=self._name, start=self._start, end=time.perf_counter(), thread='request')
+        stem = self._directory / f'{self._name}-{int(time.time() * 1000)}-{os.getpid()}-{next(_counter)}'
+        filenames = [stem.with_suffix('.trace.json')]
+        self._directory.mkdir(exist_ok=True, parents=True)
+        with open(filenames[0], 'w', encoding='utf-8') as file:
+            json.dump(self._get_trace(), file)
+        if self._profiled:
+            filenames.append(stem.with_suffix('.pstats'))
+            self._profiler.dump_stats(str(filenames[1]))
+        logger.info(f'Profile of {self._name} saved in {", ".join(str(filename) for filename in filenames)}.')
+        return filenames
+
+
+    def _get_trace(self) -> Dict:
+        # Chrome trace format, for chrome://tracing or Perfetto; every thread that ran a span gets its own row.
+        with self._lock:
+            spans = sorted(self._spans, key=lambda span: span[2])
+        threads: Dict[str, int] = {}
+        events = []
+        for name, thread, start, end in spans:
+            if thread not in threads:
+                threads[thread] = len(threads)
+                events.append({'name': 'thread_name', 'ph': 'M', 'pid': 0, 'tid': threads[thread],
+                               'args': {'name': thread}})
+            events.append({'name': name, 'ph': 'X', 'pid': 0, 'tid': threads[thread],
+                           'ts': (start - self._start) * 1e6, 'dur': (end - start) * 1e6})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+class Profiler:
+
+    def __init__(self, directory: pathlib.Path, rate: float = 0.0) -> None:
+        self._directory = pathlib.Path(directory)
+        self._rate = rate
+
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+
+    def sample(self, name: str) -> Profile | None:
+        if self._rate <= 0 or random.random() >= self._rate:
+            return None
+        return Profile(name=name, directory=self._directory)
+
+
+def current() -> Profile | None:
+    return _current.get()
+
+
+@contextlib.contextmanager
+def span(name: str) -> Iterator[None]:
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    with profile.span(name=name):
+        yield
@@ -0,0 +1,56 @@
+import re
+from typing import List
+
+
+# A sentence ends at CJK terminal punctuation, at western terminal punctuation followed by whitespace, or at a line
+# break. Closing quotes and brackets directly after the punctuation stay with the sentence.
+SENTENCE_END_PATTERN = re.compile(r'[。！？；]+[”’"\'）)\]」』]*|[.!?;:]+[”’"\'）)\]」』]*(?=\s)|\n+')
+
+
+def split_sentences(text: str) -> List[str]:
+    splitter = SentenceSplitter()
+    return splitter.feed(text) + splitter.flush()
+
+
+def split_chunks(text: str, max_chars: int) -> List[str]:
+    # Packs whole sentences into chunks of at most `max_chars`; a single longer sentence becomes its own chunk.
+    chunks = []
+    start = 0
+    end = 0
+    for boundary in [match.end() for match in SENTENCE_END_PATTERN.finditer(text)] + [len(text)]:
+        if boundary - start > max_chars and end > start:
+            chunks.append(text[start:end])
+            start = end
+        end = boundary
+    chunks.append(text[start:])
+    return [chunk.strip() for chunk in chunks if chunk.strip()]
+
+
+class SentenceSplitter:
+
+    def __init__(self, min_chars: int = 1) -> None:
+        self._min_chars = min_chars
+        self._buffer = ''
+
+
+    def feed(self, text: str) -> List[str]:
+        # Only text up to the last sentence end is released; the remainder may still be extended by later chunks.
+        self._buffer += text
+        sentences = []
+        start = 0
+        for match in SENTENCE_END_PATTERN.finditer(self._buffer):
+            if match.end() == len(self._buffer) and not match.group(0).endswith('\n'):
+                break
+            sentence = self._buffer[start:match.end()].strip()
+            if len(sentence) < self._min_chars:
+                continue
+            sentences.append(sentence)
+            start = match.end()
+        self._buffer = self._buffer[start:]
+        return sentences
+
+
+    def flush(self) -> List[str]:
+        sentence = self._buffer.strip()
+        self._buffer = ''
+        return [sentence] if sentence else []
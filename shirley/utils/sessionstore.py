@@ -0,0 +1,61 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, List, Tuple, TypeVar
+
+
+T = TypeVar('T')
+
+
+class SessionStore(Generic[T]):
+
+    def __init__(self, factory: Callable[[], T], max_sessions: int = 256, timeout: float | None = 3600.0) -> None:
+        self._factory = factory
+        self._max_sessions = max_sessions
+        self._timeout = timeout
+        self._sessions: OrderedDict[str, Tuple[T, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+
+    def get(self, session_id: str) -> T:
+        now = time.monotonic()
+        with self._lock:
+            if session_id in self._sessions:
+                session, _ = self._sessions.pop(session_id)
+            else:
+                session = self._factory()
+            self._sessions[session_id] = (session, now)
+            self._evict(now=now)
+            return session
+
+
+    def values(self) -> List[T]:
+        with self._lock:
+            return [session for session, _ in self._sessions.values()]
+
+
+    def pop(self, session_id: str) -> T | None:
+        with self._lock:
+            item = self._sessions.pop(session_id, None)
+            return None if item is None else item[0]
+
+
+    def _evict(self, now: float) -> None:
+        while len(self._sessions) > self._max_sessions:
+            self._sessions.popitem(last=False)
+
+        if self._timeout is None:
+            return
+        while self._sessions:
+            _, (_, last_access) = next(iter(self._sessions.items()))
+            if now - last_access <= self._timeout:
+                break
+            self._sessions.popitem(last=False)
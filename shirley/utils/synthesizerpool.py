@@ -0,0 +1,141 @@
+import asyncio
+import threading
+from typing import Any, Callable, Dict, List, Tuple
+
+
+class _PooledSynthesizer:
+
+    def __init__(self, synthesizer: Any) -> None:
+        self.synthesizer = synthesizer
+        self._future: asyncio.Future | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        synthesizer.synthesis_completed.connect(self._done)
+        synthesizer.synthesis_canceled.connect(self._done)
+
+
+    async def speak(self, text: str) -> Any:
+        # The SDK signals completion from its own thread; the event is forwarded to the awaiting loop so that no
+        # thread is parked on `ResultFuture.get()` while the service synthesizes.
+        self._loop = asyncio.get_running_loop()
+        self._future = self._loop.create_future()
+        try:
+            self.synthesizer.speak_text_async(text)
+            return await self._future
+        finally:
+            self._future = None
+
+
+    def _done(self, event: Any) -> None:
+        future, loop = self._future, self._loop
+        if future is not None and loop is not None:
+            loop.call_soon_threadsafe(_set_result, future, event.result)
+
+
+def _set_result(future: asyncio.Future, result: Any) -> None:
+    if not future.done():
+        future.set_result(result)
+
+
+class SynthesizerPool:
+
+    def __init__(self, factory: Callable[[str], Any], max_synthesizers: int = 4) -> None:
+        self._factory = factory
+        self._max_synthesizers = max_synthesizers
+        self._idle: Dict[str, List[_PooledSynthesizer]] = {}
+        self._counts: Dict[str, int] = {}
+        self._waiters: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]]] = {}
+        self._lock = threading.Lock()
+
+
+    def size(self, key: str) -> int:
+        with self._lock:
+            return self._counts.get(key, 0)
+
+
+    async def speak(self, key: str, text: str) -> Any:
+        synthesizer = await self._acquire(key=key)
+        try:
+            result = await synthesizer.speak(text=text)
+        except BaseException:
+            # A cancelled request may leave the synthesizer mid-utterance, so it is not handed to anyone else.
+            self._discard(key=key)
+            raise
+        self._release(key=key, synthesizer=synthesizer)
+        return result
+
+
+    def clear(self) -> None:
+        with self._lock:
+            for key, idle in self._idle.items():
+                self._counts[key] -= len(idle)
+            self._idle = {}
+
+
+    async def _acquire(self, key: str) -> _PooledSynthesizer:
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()
+            if self._counts.get(key, 0) < self._max_synthesizers:
+                self._counts[key] = self._counts.get(key, 0) + 1
+                create = True
+            else:
+                loop = asyncio.get_running_loop()
+                waiter = loop.create_future()
+                self._waiters.setdefault(key, []).append((loop, waiter))
+                create = False
+
+        if create:
+            try:
+                return _PooledSynthesizer(synthesizer=self._factory(key))
+            except BaseException:
+                self._discard(key=key)
+                raise
+
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            with self._lock:
+                if (loop, waiter) in self._waiters.get(key, []):
+                    self._waiters[key].remove((loop, waiter))
+            raise
+
+
+    def _release(self, key: str, synthesizer: _PooledSynthesizer) -> None:
+        with self._lock:
+            waiters = self._waiters.get(key)
+            if not waiters:
+                self._idle.setdefault(key, []).append(synthesizer)
+                return
+            loop, waiter = waiters.pop(0)
+        loop.call_soon_threadsafe(self._hand_over, key, synthesizer, waiter)
+
+
+    def _hand_over(self, key: str, synthesizer: _PooledSynthesizer, waiter: asyncio.Future) -> None:
+        if waiter.done():
+            self._release(key=key, synthesizer=synthesizer)
+        else:
+            waiter.set_result(synthesizer)
+
+
+    def _discard(self, key: str) -> None:
+        with self._lock:
+            self._counts[key] -= 1
+            waiters = self._waiters.get(key)
+            if not waiters:
+                return
+            # Let the next waiter create a replacement rather than wait for a synthesizer that will never return.
+            self._counts[key] += 1
+            loop, waiter = waiters.pop(0)
+
+        def create() -> None:
+            if waiter.done():
+                self._discard(key=key)
+                return
+            try:
+                waiter.set_result(_PooledSynthesizer(synthesizer=self._factory(key)))
+            except BaseException as error:
+                self._discard(key=key)
+                waiter.set_exception(error)
+
+        loop.call_soon_threadsafe(create)
@@ -0,0 +1,22 @@
+import time
+
+
+class Throttle:
+
+    def __init__(self, max_updates_per_second: float | None = None, min_chars: int | None = None) -> None:
+        self._interval = 1.0 / max_updates_per_second if max_updates_per_second else 0.0
+        self._min_chars = min_chars or 0
+        self._last_time: float | None = None
+        self._last_length = 0
+
+
+    def ready(self, length: int) -> bool:
+        now = time.monotonic()
+        if self._last_time is not None and now - self._last_time < self._interval:
+            return False
+        if length - self._last_length < self._min_chars:
+            return False
+
+        self._last_time = now
+        self._last_length = length
+        return True
@@ -0,0 +1,68 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Tuple
+
+
+FULL = 'full'
+TEXT = 'text'
+DROPPED = 'dropped'
+
+
+class TokenCounter:
+
+    def __init__(self, max_entries: int = 4096) -> None:
+        self._max_entries = max_entries
+        self._counts: OrderedDict[Hashable, int] = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+
+    def count(self, key: Hashable, fn: Callable[[], int]) -> int:
+        with self._lock:
+            if key in self._counts:
+                self._counts.move_to_end(key)
+                return self._counts[key]
+
+        count = fn()
+        with self._lock:
+            self._counts[key] = count
+            self._counts.move_to_end(key)
+            while len(self._counts) > self._max_entries:
+                self._counts.popitem(last=False)
+        return count
+
+
+def fit_turns(turns: List[Tuple[int, int]], max_tokens: int | None) -> Tuple[List[str], Dict]:
+    # `turns` holds the (text, document) token counts of each turn, oldest first. Turns are kept newest first while
+    # they fit; a turn that only fits without its documents keeps its text, and the first turn that does not fit at
+    # all is dropped with everything older. The latest turn is always kept whole.
+    decisions = [DROPPED] * len(turns)
+    remaining = float('inf') if max_tokens is None else max_tokens
+    kept_tokens, dropped_tokens = 0, 0
+    for i in reversed(range(len(turns))):
+        text, documents = turns[i]
+        if i == len(turns) - 1 or text + documents <= remaining:
+            decisions[i] = FULL
+            cost = text + documents
+        elif text <= remaining:
+            decisions[i] = TEXT
+            cost = text
+        else:
+            dropped_tokens += sum(text + documents for text, documents in turns[:i + 1])
+            break
+        remaining -= cost
+        kept_tokens += cost
+        dropped_tokens += text + documents - cost
+
+    report = OrderedDict([
+        ('max_tokens', max_tokens),
+        ('kept_turns', sum(decision != DROPPED for decision in decisions)),
+        ('dropped_turns', decisions.count(DROPPED)),
+        ('trimmed_turns', decisions.count(TEXT)),
+        ('kept_tokens', kept_tokens),
+        ('dropped_tokens', dropped_tokens),
+    ])
+    return decisions, report
@@ -0,0 +1,68 @@
+import json
+import logging
+import os
+import pathlib
+import sys
+import threading
+import time
+from typing import Any, Dict, Tuple
+
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+
+
+class TTLCache:
+
+    def __init__(self, filename: str | pathlib.Path | None = None, ttl: float | None = 86400.0) -> None:
+        self._filename = None if filename is None else pathlib.Path(filename)
+        self._ttl = ttl
+        self._items: Dict[str, Tuple[Any, float]] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+
+    def get(self, key: str, stale: bool = False) -> Any | None:
+        # Wall-clock time is used so that entries loaded from disk expire across restarts.
+        with self._lock:
+            item = self._items.get(key)
+        if item is None:
+            return None
+        value, updated = item
+        if not stale and self._ttl is not None and time.time() - updated > self._ttl:
+            return None
+        return value
+
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._items[key] = (value, time.time())
+            self._save()
+
+
+    def _load(self) -> None:
+        if self._filename is None:
+            return
+        try:
+            with open(self._filename, encoding='utf-8') as file:
+                items = json.load(file)
+            self._items = {key: (item['value'], item['updated']) for key, item in items.items()}
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, TypeError, AttributeError):
+            logger.warning(f'Ignoring unreadable cache file {str(self._filename)}.')
+
+
+    def _save(self) -> None:
+        if self._filename is None:
+            return
+        items = {key: {'value': value, 'updated': updated} for key, (value, updated) in self._items.items()}
+        self._filename.parent.mkdir(exist_ok=True, parents=True)
+        tempname = self._filename.with_suffix(f'.{threading.get_ident()}.tmp')
+        with open(tempname, 'w', encoding='utf-8') as file:
+            json.dump(items, file)
+        os.replace(tempname, self._filename)
@@ -0,0 +1,27 @@
+import io
+import numpy as np
+import wave
+from typing import Tuple
+
+
+def decode_wav(data: bytes) -> Tuple[int, np.ndarray]:
+    with wave.open(io.BytesIO(data), 'rb') as reader:
+        if reader.getsampwidth() != 2:
+            raise ValueError(f'Unsupported sample width: {reader.getsampwidth()} bytes.')
+        sample_rate = reader.getframerate()
+        channels = reader.getnchannels()
+        samples = np.frombuffer(reader.readframes(reader.getnframes()), dtype='<i2')
+    if channels > 1:
+        samples = samples.reshape(-1, channels)
+    return sample_rate, samples
+
+
+def encode_wav(sample_rate: int, samples: np.ndarray) -> bytes:
+    samples = np.asarray(samples, dtype='<i2')
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as writer:
+        writer.setnchannels(1 if samples.ndim == 1 else samples.shape[1])
+        writer.setsampwidth(2)
+        writer.setframerate(sample_rate)
+        writer.writeframes(samples.tobytes())
+    return buffer.getvalue()
@@ -0,0 +1,29 @@
+import pytest
+import transformers
+from shirley.engines import GenerationEngine
+from tests.models import STOP_TOKEN_ID, make_model
+from typing import Callable
+
+
+@pytest.fixture(scope='session')
+def model() -> transformers.PreTrainedModel:
+    return make_model()
+
+
+@pytest.fixture
+def make_engine() -> Callable[..., GenerationEngine]:
+    engines = []
+
+    def make(model: transformers.PreTrainedModel, max_new_tokens: int = 24, **kwargs) -> GenerationEngine:
+        engine = GenerationEngine(
+            model=model,
+            generation_config=transformers.GenerationConfig(do_sample=False, max_new_tokens=max_new_tokens),
+            stop_token_ids=[STOP_TOKEN_ID],
+            **kwargs,
+        )
+        engines.append(engine)
+        return engine
+
+    yield make
+    for engine in engines:
+        engine.shutdown()
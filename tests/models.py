@@ -0,0 +1,41 @@
+import torch
+import transformers
+from typing import List
+
+
+STOP_TOKEN_ID = 0
+
+
+def make_model(seed: int = 0, n_layer: int = 2) -> transformers.PreTrainedModel:
+    torch.manual_seed(seed)
+    config = transformers.GPT2Config(
+        vocab_size=64,
+        n_positions=512,
+        n_embd=32,
+        n_layer=n_layer,
+        n_head=4,
+        initializer_range=0.3,
+        bos_token_id=STOP_TOKEN_ID,
+        eos_token_id=STOP_TOKEN_ID,
+    )
+    return transformers.GPT2LMHeadModel(config).eval()
+
+
+def make_prompt(length: int, seed: int) -> List[int]:
+    generator = torch.Generator().manual_seed(seed)
+    return torch.randint(1, 64, (length,), generator=generator).tolist()
+
+
+def generate(model: transformers.PreTrainedModel, input_ids: List[int], max_new_tokens: int) -> List[int]:
+    # What a single greedy `generate` call produces, without the stop token.
+    with torch.inference_mode():
+        outputs = model.generate(
+            torch.tensor([input_ids]),
+            attention_mask=torch.ones((1, len(input_ids)), dtype=torch.long),
+            max_new_tokens=max_new_tokens,
+            do_sample=False,
+            eos_token_id=STOP_TOKEN_ID,
+            pad_token_id=STOP_TOKEN_ID,
+        )
+    output_ids = outputs[0, len(input_ids):].tolist()
+    return output_ids[:output_ids.index(STOP_TOKEN_ID)] if STOP_TOKEN_ID in output_ids else output_ids
@@ -0,0 +1,28 @@
+import os
+import time
+from shirley.utils.artifactstore import ArtifactStore
+
+
+def test_sweep_removes_expired_and_oversized_artifacts(tmp_path):
+    store = ArtifactStore(directory=tmp_path, sweep_interval=None)
+    store.register(kind='images', max_size=8, max_age=3600.0)
+    now = time.time()
+    for name, mtime in [('old.jpg', 0), ('a.jpg', now - 3), ('b.jpg', now - 2), ('c.jpg', now - 1)]:
+        filename = store.path(kind='images', name=name)
+        filename.write_bytes(b'1234')
+        os.utime(filename, (mtime, mtime))
+
+    assert store.sweep() == 2
+    assert sorted(os.listdir(tmp_path / 'images')) == ['b.jpg', 'c.jpg']
+
+
+def test_referenced_artifacts_are_kept(tmp_path):
+    store = ArtifactStore(directory=tmp_path, sweep_interval=None)
+    store.register(kind='images', max_age=0.0)
+    kept = store.path(kind='images', name='kept.jpg')
+    kept.write_bytes(b'1')
+    store.path(kind='images', name='removed.jpg').write_bytes(b'1')
+    store.add_references(fn=lambda: [str(kept)])
+
+    assert store.sweep() == 1
+    assert os.listdir(tmp_path / 'images') == ['kept.jpg']
@@ -0,0 +1,41 @@
+import json
+from batch import drop_partial_line, read_done, read_records
+
+
+def write_lines(filename, lines) -> None:
+    filename.write_text(''.join(lines), encoding='utf-8')
+
+
+def test_resume_skips_done_ids_and_retries_errored_and_truncated_ones(tmp_path):
+    write_lines(tmp_path / 'input.jsonl', [
+        json.dumps({'id': 'a', 'query': 'A'}) + '\n',
+        '\n',
+        json.dumps({'query': 'B'}) + '\n',
+        json.dumps({'id': 'c', 'query': 'C'}) + '\n',
+        json.dumps({'id': 'd', 'query': 'D'}) + '\n',
+    ])
+    write_lines(tmp_path / 'output.jsonl', [
+        json.dumps({'id': 'a', 'response': 'A'}) + '\n',
+        json.dumps({'id': 2, 'response': 'B'}) + '\n',
+        json.dumps({'id': 'c', 'error': 'out of memory'}) + '\n',
+        json.dumps({'id': 'd', 'response': 'D'})[:10],
+    ])
+
+    records = list(read_records(filename=tmp_path / 'input.jsonl'))
+    # A record without an id takes its line number, blank lines included, so it matches across runs.
+    assert [record['id'] for record in records] == ['a', 2, 'c', 'd']
+    done = read_done(filename=tmp_path / 'output.jsonl')
+    assert [record['id'] for record in records if json.dumps(record['id']) not in done] == ['c', 'd']
+
+
+def test_partial_last_line_is_dropped_before_appending(tmp_path):
+    filename = tmp_path / 'output.jsonl'
+    write_lines(filename, [json.dumps({'id': 'a', 'response': 'A'}) + '\n', '{"id": "b", "resp'])
+    drop_partial_line(filename=filename)
+    with open(filename, 'a', encoding='utf-8') as file:
+        file.write(json.dumps({'id': 'b', 'response': 'B'}) + '\n')
+    assert read_done(filename=filename) == {'"a"', '"b"'}
+
+    drop_partial_line(filename=filename)
+    assert len(filename.read_text(encoding='utf-8').splitlines()) == 2
+    drop_partial_line(filename=tmp_path / 'missing.jsonl')
@@ -0,0 +1,131 @@
+import json
+import pathlib
+import pytest
+import shirley as sh
+import torch
+from benchmarks import tinyqwen
+from shirley.clients.chat import ChatModel
+
+
+@pytest.fixture(scope='module')
+def models(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('models')
+    models = [tinyqwen.build(directory=directory / name, max_new_tokens=64, seed=i) for i, name in enumerate('ab')]
+    for model in models:
+        # Greedy decoding, so a generation runs the same way (and as long) every time.
+        filename = pathlib.Path(model) / 'generation_config.json'
+        generation_config = json.loads(filename.read_text())
+        generation_config['do_sample'] = False
+        filename.write_text(json.dumps(generation_config))
+    return models
+
+
+def test_a_generating_model_is_not_evicted(models, monkeypatch, tmp_path):
+    monkeypatch.setenv('GRADIO_TEMP_DIR', str(tmp_path))
+    client = sh.ChatClient(options=sh.ChatClientOptions(local=False))
+    client.load_model(pretrained_model_name_or_path=models[0])
+    stream = client.chat_stream(query='Hello!', pretrained_model_name_or_path=models[0])
+    next(stream)
+    assert not client.get_model(pretrained_model_name_or_path=models[0]).idle
+
+    with pytest.raises(RuntimeError, match='still generating'):
+        client.load_model(pretrained_model_name_or_path=models[1])
+    assert client.is_loaded(pretrained_model_name_or_path=models[0])
+    for _ in stream:
+        pass
+
+    client.load_model(pretrained_model_name_or_path=models[1])
+    assert not client.is_loaded(pretrained_model_name_or_path=models[0])
+    client.unload_model(pretrained_model_name_or_path=models[1])
+
+
+def test_preload_wakes_status_waiters_until_ready(models, monkeypatch, tmp_path):
+    monkeypatch.setenv('GRADIO_TEMP_DIR', str(tmp_path))
+    client = sh.ChatClient(options=sh.ChatClientOptions(local=False))
+    client.preload_model(pretrained_model_name_or_path=models[0])
+
+    statuses = [client.get_status(pretrained_model_name_or_path=models[0])]
+    while statuses[-1] in ('loading', 'warming up'):
+        statuses.append(client.wait_status(pretrained_model_name_or_path=models[0], status=statuses[-1], timeout=60))
+    assert statuses[-1] == 'ready'
+    assert client.is_loaded(pretrained_model_name_or_path=models[0])
+    client.unload_model(pretrained_model_name_or_path=models[0])
+
+
+def test_context_window_is_left_for_history_after_the_generation_budget(models, monkeypatch, tmp_path):
+    monkeypatch.setenv('GRADIO_TEMP_DIR', str(tmp_path))
+    client = sh.ChatClient(options=sh.ChatClientOptions(local=False))
+    client.load_model(pretrained_model_name_or_path=models[0])
+    assert client.get_max_context_tokens(pretrained_model_name_or_path=models[0]) == 8192 - 64
+
+    base = client.count_context_tokens(query='', pretrained_model_name_or_path=models[0])
+    turn = client.count_context_tokens(query='', history=[('', '')], pretrained_model_name_or_path=models[0]) - base
+    # The system prompt and each turn's ChatML markup take tokens of their own.
+    assert base > 0 and turn > 0
+    client.unload_model(pretrained_model_name_or_path=models[0])
+
+
+@pytest.fixture(scope='module')
+def plain_model(tmp_path_factory):
+    # A model without `make_context`, so the client falls back to the model's own `chat_stream`.
+    directory = tmp_path_factory.mktemp('models') / 'plain'
+    tinyqwen.build(directory=directory, max_new_tokens=16, make_context=False)
+    filename = directory / 'generation_config.json'
+    generation_config = json.loads(filename.read_text())
+    generation_config['do_sample'] = False
+    filename.write_text(json.dumps(generation_config))
+    return str(directory)
+
+
+def test_batch_without_make_context_falls_back_to_chat_stream(plain_model, monkeypatch, tmp_path):
+    monkeypatch.setenv('GRADIO_TEMP_DIR', str(tmp_path))
+    client = sh.ChatClient(options=sh.ChatClientOptions(local=False))
+    client.load_model(pretrained_model_name_or_path=plain_model)
+    assert client.get_model(pretrained_model_name_or_path=plain_model).engine is None
+
+    queries = [('Hello!', None), ('How are you?', [('Hello!', 'Hi.')])]
+    results = list(client.chat_batch(queries=queries, pretrained_model_name_or_path=plain_model))
+    assert [result.index for result in results] == [0, 1]
+    assert all(result.error is None for result in results)
+    for (query, history), result in zip(queries, results):
+        # `chat_stream` yields the whole response so far, like the model's own.
+        *_, response = client.chat_stream(query=query, history=history, pretrained_model_name_or_path=plain_model)
+        assert result.response == response
+    # The query and history text are counted, without any chat format markup.
+    assert [result.input_tokens for result in results] == [6, 12 + 6 + 3]
+    client.unload_model(pretrained_model_name_or_path=plain_model)
+
+
+def load(pretrained_model_name_or_path: str, **kwargs) -> ChatModel:
+    client = sh.ChatClient(options=sh.ChatClientOptions(local=False, **kwargs))
+    client.load_model(pretrained_model_name_or_path=pretrained_model_name_or_path)
+    chat_model = client.get_model(pretrained_model_name_or_path=pretrained_model_name_or_path)
+    client.unload_model(pretrained_model_name_or_path=pretrained_model_name_or_path)
+    return chat_model
+
+
+def test_resident_bytes_follow_the_load_precision(models, monkeypatch, tmp_path):
+    monkeypatch.setenv('GRADIO_TEMP_DIR', str(tmp_path))
+    fp32 = load(pretrained_model_name_or_path=models[0], precision='fp32')
+    bf16 = load(pretrained_model_name_or_path=models[0], precision='bf16')
+
+    assert bf16.precision == 'bf16'
+    assert {parameter.dtype for parameter in bf16.model.parameters()} == {torch.bfloat16}
+    # Every floating-point tensor takes two bytes per element instead of four; the boolean causal mask does not shrink.
+    tensors = [*bf16.model.parameters(), *bf16.model.buffers()]
+    assert fp32.nbytes - bf16.nbytes == sum(tensor.numel() * 2 for tensor in tensors if tensor.is_floating_point())
+
+
+def test_resident_bytes_count_dynamic_int8_weights(models, monkeypatch, tmp_path):
+    monkeypatch.setenv('GRADIO_TEMP_DIR', str(tmp_path))
+    fp32 = load(pretrained_model_name_or_path=models[0], precision='fp32')
+    int8 = load(pretrained_model_name_or_path=models[0], quantize=True)
+    quantized = [
+        module for module in int8.model.modules() if isinstance(module, torch.ao.nn.quantized.dynamic.Linear)
+    ]
+
+    assert int8.quantization == 'dynamic-int8'
+    assert [module.weight().dtype for module in quantized] == [torch.qint8]
+    # The tiny model's only Linear layer is its output head, tied to the fp32 input embeddings: quantizing it adds
+    # a one-byte-per-weight copy, with its float32 scale and int64 zero point, instead of freeing anything.
+    assert int8.nbytes == fp32.nbytes + quantized[0].weight().numel() + 4 + 8
@@ -0,0 +1,112 @@
+import asyncio
+import gradio as gr
+import json
+import pytest
+import shirley as sh
+import time
+from benchmarks import tinyqwen
+from benchmarks.fakesynthesizer import FakeSynthesizer
+from benchmarks.tts import make_result
+from shirley.interfaces.chat import ChatSession
+from types import SimpleNamespace
+
+
+@pytest.fixture(scope='module')
+def plain_model(tmp_path_factory):
+    # A model without `make_context`, so the client falls back to the model's own `chat_stream`.
+    directory = tmp_path_factory.mktemp('models') / 'plain'
+    tinyqwen.build(directory=directory, max_new_tokens=16, make_context=False)
+    filename = directory / 'generation_config.json'
+    generation_config = json.loads(filename.read_text())
+    generation_config['do_sample'] = False
+    filename.write_text(json.dumps(generation_config))
+    return str(directory)
+
+
+def make_interface(**kwargs) -> sh.ChatInterface:
+    with gr.Blocks():
+        return sh.ChatInterface(options=sh.ChatInterfaceOptions(client=sh.ChatClientOptions(local=False), **kwargs))
+
+
+def test_history_is_fitted_for_a_model_without_make_context(plain_model, monkeypatch, tmp_path):
+    monkeypatch.setenv('GRADIO_TEMP_DIR', str(tmp_path))
+    interface = make_interface(max_context_tokens=41)
+    interface._client.load_model(pretrained_model_name_or_path=plain_model)
+    session = ChatSession(pretrained_model_name_or_path=plain_model)
+    session.loaded_model_name_or_path = plain_model
+    session.history = [(f'Question {i}', f'Answer {i}') for i in range(5)] + [('Final', None)]
+
+    query, history = interface._get_query_and_history(session=session)
+    # Each earlier turn is 18 bytes of text and the latest one 5, and nothing else is counted without make_context.
+    assert query == 'Final'
+    assert history == [('Question 3', 'Answer 3'), ('Question 4', 'Answer 4')]
+    assert session.context_report['kept_tokens'] == 41
+    interface._client.unload_model(pretrained_model_name_or_path=plain_model)
+
+
+def stream_reply(reply: str):
+    # A `chat_stream_fn` that streams `reply` a few characters at a time, each update carrying the whole text so far.
+    def chat_stream(fn, query, history):
+        for end in range(3, len(reply) + 3, 3):
+            yield reply[:end]
+
+    return chat_stream
+
+
+def start_turn(interface: sh.ChatInterface, request, model: str, query: str):
+    session = interface._get_session(request=request)
+    session.loaded_model_name_or_path = model
+    chatbot, _ = interface._submit(request, [], {'text': query, 'files': []})
+    interface._pregenerate(request)
+    return chatbot
+
+
+def test_the_final_update_carries_the_whole_reply_however_throttled(plain_model, monkeypatch, tmp_path):
+    monkeypatch.setenv('GRADIO_TEMP_DIR', str(tmp_path))
+    reply = 'A reply that streams in many small pieces.'
+    interface = make_interface(chat_stream_fn=stream_reply(reply), max_updates_per_second=0.001, min_update_chars=1)
+    interface._client.load_model(pretrained_model_name_or_path=plain_model)
+    request = SimpleNamespace(session_hash='a')
+    chatbot = start_turn(interface=interface, request=request, model=plain_model, query='Hello!')
+
+    updates = [chatbot[-1][1] for chatbot in interface._generate_chatbot(request, chatbot)]
+    # Only the first partial update gets through the throttle; the final one always follows.
+    assert updates == [reply[:3], reply]
+    assert interface._get_session(request=request).history[-1] == ('Hello!', reply)
+    interface._client.unload_model(pretrained_model_name_or_path=plain_model)
+
+
+def test_sentences_are_spoken_in_order_while_the_reply_streams(plain_model, monkeypatch, tmp_path):
+    monkeypatch.setenv('GRADIO_TEMP_DIR', str(tmp_path))
+    sentences = ['First, a short one.', 'Then a second one!', 'And an unfinished tail']
+    delays = {sentence: 0.1 * (len(sentences) - i) for i, sentence in enumerate(sentences)}
+    spoken = []
+
+    def synthesize(voice: str, text: str):
+        # Earlier sentences take longer, so they finish out of order.
+        spoken.append(text)
+        time.sleep(delays[text])
+        return make_result(voice=voice, text=text)
+
+    speech = sh.TextToSpeechClientOptions(
+        synthesizer_factory=lambda voice: FakeSynthesizer(voice=voice, make_result=synthesize),
+        prefetch_voices=False,
+        in_memory=True,
+    )
+    interface = make_interface(chat_stream_fn=stream_reply(' '.join(sentences)), speech=speech, speech_voice='a')
+    interface._client.load_model(pretrained_model_name_or_path=plain_model)
+    request = SimpleNamespace(session_hash='a')
+    chatbot = start_turn(interface=interface, request=request, model=plain_model, query='Hello!')
+
+    async def speak():
+        return [chunk async for chunk in interface._speak(request)]
+
+    async def main():
+        _, chunks = await asyncio.gather(asyncio.to_thread(list, interface._generate_chatbot(request, chatbot)), speak())
+        return chunks
+
+    chunks = asyncio.run(main())
+    # The trailing partial sentence is flushed when the stream ends, and the audio plays in sentence order.
+    assert sorted(spoken) == sorted(sentences)
+    assert [len(samples) for _, samples in chunks] == [int(len(sentence) * 0.06 * 24000) for sentence in sentences]
+    interface._client.unload_model(pretrained_model_name_or_path=plain_model)
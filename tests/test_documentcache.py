@@ -0,0 +1,79 @@
+import os
+import shutil
+from shirley.utils.documentcache import DocumentCache
+
+
+def write_pdf(filename, text: str) -> None:
+    # A one-page PDF with a single line of text, written by hand so that the tests need no PDF writer.
+    stream = f'BT /F1 12 Tf 72 720 Td ({text}) Tj ET'.encode()
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R '
+        b'/Resources << /Font << /F1 5 0 R >> >> >>',
+        b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    data = b'%PDF-1.4\n'
+    offsets = []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += b'%d 0 obj\n' % i + obj + b'\nendobj\n'
+    xref = len(data)
+    data += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    data += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    data += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    filename.write_bytes(data)
+
+
+class CountingDocumentCache(DocumentCache):
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.extractions = 0
+
+
+    def _extract_text(self, filepath: str) -> str:
+        self.extractions += 1
+        return super()._extract_text(filepath=filepath)
+
+
+def test_text_is_extracted_once_per_path_mtime_and_size(tmp_path):
+    cache = CountingDocumentCache(directory=tmp_path / 'documents', max_workers=1)
+    filepath = tmp_path / 'a.pdf'
+    write_pdf(filepath, text='Hello')
+
+    assert 'Hello' in cache.get_text(filepath=str(filepath))
+    assert 'Hello' in cache.get_text(filepath=str(filepath))
+    assert cache.extractions == 1
+
+    write_pdf(filepath, text='Goodbye')
+    os.utime(filepath, (0, 0))
+    assert 'Goodbye' in cache.get_text(filepath=str(filepath))
+    assert cache.extractions == 2
+
+
+def test_copies_of_a_document_share_one_extraction(tmp_path):
+    cache = CountingDocumentCache(directory=tmp_path / 'documents', max_workers=1)
+    write_pdf(tmp_path / 'a.pdf', text='Hello')
+    shutil.copy(tmp_path / 'a.pdf', tmp_path / 'b.pdf')
+
+    assert cache.get_text(filepath=str(tmp_path / 'a.pdf')) == cache.get_text(filepath=str(tmp_path / 'b.pdf'))
+    assert cache.extractions == 1
+    assert len(list((tmp_path / 'documents').glob('*.txt'))) == 1
+
+
+def test_least_recently_used_texts_are_evicted_to_max_size(tmp_path):
+    directory = tmp_path / 'documents'
+    cache = CountingDocumentCache(directory=directory, max_size=12, max_workers=1)
+    for i, text in enumerate(['Apple', 'Banana', 'Cherry']):
+        write_pdf(tmp_path / f'{i}.pdf', text=text)
+        cache.get_text(filepath=str(tmp_path / f'{i}.pdf'))
+        for filename in directory.glob('*.txt'):
+            if filename.stat().st_mtime > i:
+                os.utime(filename, (i, i))
+
+    assert sum(filename.stat().st_size for filename in directory.glob('*.txt')) <= 12
+    assert 'Cherry' in cache.get_text(filepath=str(tmp_path / '2.pdf'))
+    cache.get_text(filepath=str(tmp_path / '0.pdf'))
+    assert cache.extractions == 4
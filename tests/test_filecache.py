@@ -0,0 +1,23 @@
+import os
+from shirley.utils.filecache import FileCache
+
+
+def test_put_and_get(tmp_path):
+    cache = FileCache(directory=tmp_path, suffix='.wav')
+    assert cache.get('a') is None
+    filename = cache.put('a', b'data')
+    assert cache.get('a') == filename
+    assert filename.read_bytes() == b'data'
+
+
+def test_least_recently_used_files_are_evicted(tmp_path):
+    cache = FileCache(directory=tmp_path, suffix='.wav', max_size=8)
+    cache.put('a', b'1234')
+    cache.put('b', b'1234')
+    os.utime(tmp_path / 'a.wav', (0, 0))
+    os.utime(tmp_path / 'b.wav', (1, 1))
+    cache.get('a')
+    cache.put('c', b'1234')
+    assert cache.get('a') is not None
+    assert cache.get('b') is None
+    assert cache.get('c') is not None
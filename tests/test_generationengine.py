@@ -0,0 +1,107 @@
+import contextlib
+import threading
+import time
+from tests.models import generate, make_prompt
+
+
+def test_a_single_request_matches_generate(model, make_engine):
+    engine = make_engine(model=model)
+    input_ids = make_prompt(length=12, seed=0)
+    assert list(engine.submit(input_ids=input_ids)) == generate(model=model, input_ids=input_ids, max_new_tokens=24)
+
+
+def test_requests_joining_and_leaving_the_batch_match_generate(model, make_engine):
+    # Prompts of different lengths and token budgets, more of them than the batch holds, so rows are padded on join
+    # and trimmed on leave while others keep decoding.
+    engine = make_engine(model=model, max_batch_size=3)
+    cases = [(make_prompt(length=4 + 7 * i, seed=i), 6 + 5 * i) for i in range(6)]
+    expected = [generate(model=model, input_ids=input_ids, max_new_tokens=count) for input_ids, count in cases]
+
+    results = [None] * len(cases)
+    first = engine.submit(input_ids=cases[0][0], max_new_tokens=cases[0][1])
+
+    def run(i: int) -> None:
+        results[i] = list(engine.submit(input_ids=cases[i][0], max_new_tokens=cases[i][1]))
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(1, len(cases))]
+    results[0] = [next(iter(first))]
+    for thread in threads:
+        thread.start()
+    results[0] += list(first)
+    for thread in threads:
+        thread.join()
+    assert results == expected
+    assert engine.idle
+
+
+def find_prompts(model, count: int, max_new_tokens: int):
+    # Prompts whose greedy continuation never reaches the stop token, so they only end when cut short.
+    prompts = []
+    for seed in range(100, 400):
+        input_ids = make_prompt(length=8 + seed % 5, seed=seed)
+        if len(generate(model=model, input_ids=input_ids, max_new_tokens=max_new_tokens)) == max_new_tokens:
+            prompts.append(input_ids)
+            if len(prompts) == count:
+                return prompts
+    raise AssertionError('Not enough prompts run to max_new_tokens.')
+
+
+@contextlib.contextmanager
+def record_batch_sizes(model, delay: float = 0.0):
+    sizes = []
+
+    def hook(module, args, kwargs) -> None:
+        sizes.append(kwargs['input_ids'].shape[0])
+        time.sleep(delay)
+
+    handle = model.register_forward_pre_hook(hook, with_kwargs=True)
+    try:
+        yield sizes
+    finally:
+        handle.remove()
+
+
+def test_a_cancelled_request_leaves_the_batch_and_others_are_unchanged(model, make_engine):
+    engine = make_engine(model=model, max_new_tokens=48, max_batch_size=3)
+    prompts = find_prompts(model=model, count=3, max_new_tokens=48)
+    with record_batch_sizes(model=model) as sizes:
+        requests = [engine.submit(input_ids=input_ids) for input_ids in prompts]
+        streams = [iter(request) for request in requests]
+        outputs = [[next(stream), next(stream)] for stream in streams]
+        requests[0].cancel()
+        assert requests[0].wait(timeout=10)
+        cancelled_at = len(sizes)
+        for output, stream in zip(outputs[1:], streams[1:]):
+            output.extend(stream)
+
+    assert requests[0].finish_reason == 'cancelled'
+    expected = [generate(model=model, input_ids=input_ids, max_new_tokens=48) for input_ids in prompts]
+    assert expected[0][:len(requests[0].output_ids)] == requests[0].output_ids
+    assert len(requests[0].output_ids) < 48
+    assert outputs[1:] == expected[1:]
+    assert [request.finish_reason for request in requests[1:]] == ['length', 'length']
+    # All three rows decoded together until the cancellation; no forward pass after it carries the cancelled row.
+    assert max(sizes[:cancelled_at]) == 3
+    assert max(sizes[cancelled_at:]) <= 2
+
+
+def test_a_request_past_its_deadline_stops_with_a_timeout(model, make_engine):
+    engine = make_engine(model=model, max_new_tokens=48, max_batch_size=2)
+    prompts = find_prompts(model=model, count=2, max_new_tokens=48)
+    # Every forward pass takes at least 10 ms, so 48 tokens cannot be decoded within the 100 ms deadline.
+    with record_batch_sizes(model=model, delay=0.01):
+        expired = engine.submit(input_ids=prompts[0], timeout=0.1)
+        other = engine.submit(input_ids=prompts[1])
+        output = list(other)
+        assert expired.wait(timeout=10)
+
+    assert expired.finish_reason == 'timeout'
+    assert 0 < len(expired.output_ids) < 48
+    expected = generate(model=model, input_ids=prompts[0], max_new_tokens=48)
+    assert expired.output_ids == expected[:len(expired.output_ids)]
+    assert output == generate(model=model, input_ids=prompts[1], max_new_tokens=48)
+    assert other.finish_reason == 'length'
+
+    late = engine.submit(input_ids=prompts[0], timeout=0.0)
+    assert late.wait(timeout=10)
+    assert (late.finish_reason, late.output_ids) == ('timeout', [])
@@ -0,0 +1,27 @@
+import random
+from shirley.utils import IncrementalParser, parse
+
+
+TOKENS = [
+    'a', ' ', '\n', '\n\n', '`', '```', '```python\n', '<box>', '</box>', '<ref>', '</ref>', '<re', 'f>',
+    '<', '>', '*', '_', '-', '.', '!', '(', ')', '$', '(1,2)',
+]
+
+
+def test_matches_parse_on_streamed_prefixes():
+    rng = random.Random(0)
+    for _ in range(500):
+        text = ''.join(rng.choice(TOKENS) for _ in range(rng.randint(0, 40)))
+        for remove_image_tags in (False, True):
+            parser = IncrementalParser(remove_image_tags=remove_image_tags)
+            end = 0
+            while end < len(text):
+                end = min(len(text), end + rng.randint(1, 5))
+                expected = parse(text=text[:end], remove_image_tags=remove_image_tags)
+                assert parser.parse(text=text[:end]) == expected
+
+
+def test_resets_when_text_is_not_an_extension():
+    parser = IncrementalParser()
+    parser.parse(text='first\n```python\nprint(1)')
+    assert parser.parse(text='second\nline') == parse(text='second\nline')
@@ -0,0 +1,59 @@
+import torch
+from shirley.engines import KVCacheLayout, RotaryKVCacheLayout
+
+
+class RotaryEmbedding(torch.nn.Module):
+
+    def __init__(self, dim: int, base: float = 10000.0) -> None:
+        super().__init__()
+        self.register_buffer('inv_freq', 1.0 / (base ** (torch.arange(0, dim, 2).float() / dim)))
+
+
+def rotate(keys: torch.Tensor, positions: torch.Tensor, inv_freq: torch.Tensor) -> torch.Tensor:
+    # Qwen's rotary embedding on keys laid out as (batch, seq, heads, head_dim), over the first `rot_dim` channels.
+    freqs = torch.outer(positions.float(), inv_freq)
+    angles = torch.cat([freqs, freqs], dim=-1)[None, :, None, :]
+    rot_dim = angles.shape[-1]
+    rotated, rest = keys[..., :rot_dim], keys[..., rot_dim:]
+    first, second = rotated.chunk(2, dim=-1)
+    rotated = rotated * angles.cos() + torch.cat([-second, first], dim=-1) * angles.sin()
+    return torch.cat([rotated, rest], dim=-1)
+
+
+def make_cache(keys: torch.Tensor, values: torch.Tensor, inv_freq: torch.Tensor, offset: int = 0):
+    positions = torch.arange(offset, offset + keys.shape[1])
+    return ((rotate(keys, positions=positions, inv_freq=inv_freq), values),)
+
+
+def test_rotary_pad_re_rotates_keys_to_the_shifted_positions():
+    torch.manual_seed(0)
+    rotary_emb = RotaryEmbedding(dim=8)
+    layout = RotaryKVCacheLayout(rotary_emb=rotary_emb, seq_dim=1)
+    keys, values = torch.randn(2, 5, 3, 12), torch.randn(2, 5, 3, 12)
+
+    padded = layout.pad(make_cache(keys=keys, values=values, inv_freq=rotary_emb.inv_freq), count=4)
+    expected = make_cache(keys=keys, values=values, inv_freq=rotary_emb.inv_freq, offset=4)
+    assert layout.length(padded) == 9
+    assert torch.equal(padded[0][0][:, :4], torch.zeros(2, 4, 3, 12))
+    assert torch.allclose(padded[0][0][:, 4:], expected[0][0], atol=1e-5)
+    assert torch.equal(padded[0][1][:, 4:], values)
+
+
+def test_rotary_pad_and_trim_round_trip():
+    torch.manual_seed(0)
+    rotary_emb = RotaryEmbedding(dim=8)
+    layout = RotaryKVCacheLayout(rotary_emb=rotary_emb, seq_dim=1)
+    cache = make_cache(keys=torch.randn(1, 6, 2, 8), values=torch.randn(1, 6, 2, 8), inv_freq=rotary_emb.inv_freq)
+
+    trimmed = layout.trim(layout.pad(cache, count=7), count=7)
+    assert layout.length(trimmed) == 6
+    assert torch.allclose(trimmed[0][0], cache[0][0], atol=1e-5)
+    assert torch.equal(trimmed[0][1], cache[0][1])
+
+
+def test_plain_pad_and_trim_leave_keys_unchanged():
+    layout = KVCacheLayout(seq_dim=2)
+    cache = ((torch.randn(1, 2, 5, 4), torch.randn(1, 2, 5, 4)),)
+    padded = layout.pad(cache, count=3)
+    assert torch.equal(padded[0][0][:, :, 3:], cache[0][0])
+    assert torch.equal(layout.trim(padded, count=3)[0][0], cache[0][0])
@@ -0,0 +1,12 @@
+from shirley.utils.memorycache import MemoryCache
+
+
+def test_least_recently_used_items_are_evicted():
+    cache = MemoryCache(max_size=8)
+    cache.put('a', b'1234')
+    cache.put('b', b'1234')
+    assert cache.get('a') == b'1234'
+    cache.put('c', b'1234')
+    assert cache.get('a') == b'1234'
+    assert cache.get('b') is None
+    assert cache.size == 8
@@ -0,0 +1,42 @@
+import pytest
+from shirley.utils.metrics import MetricsRegistry
+
+
+def test_counters_and_gauges_render_by_label():
+    registry = MetricsRegistry()
+    requests = registry.counter('requests_total', 'Requests.', ('model', 'outcome'))
+    memory = registry.gauge('resident_bytes', 'Memory.', ('model',))
+    requests.inc(model='qwen', outcome='completed')
+    requests.inc(2, model='qwen', outcome='completed')
+    memory.set(1024, model='qwen')
+    memory.set(2048, model='qwen-vl')
+    memory.remove(model='qwen-vl')
+
+    text = registry.render()
+    assert '# TYPE requests_total counter' in text
+    assert 'requests_total{model="qwen",outcome="completed"} 3' in text
+    assert 'resident_bytes{model="qwen"} 1024' in text
+    assert 'qwen-vl' not in text
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    latency = registry.histogram('latency_seconds', 'Latency.', ('model',), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 5.0):
+        latency.observe(value, model='qwen')
+
+    text = registry.render()
+    assert 'latency_seconds_bucket{model="qwen",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{model="qwen",le="1"} 3' in text
+    assert 'latency_seconds_bucket{model="qwen",le="+Inf"} 4' in text
+    assert 'latency_seconds_sum{model="qwen"} 6.25' in text
+    assert 'latency_seconds_count{model="qwen"} 4' in text
+
+
+def test_labels_and_names_are_checked():
+    registry = MetricsRegistry()
+    requests = registry.counter('requests_total', 'Requests.', ('model',))
+    with pytest.raises(ValueError):
+        requests.inc(voice='en-US-JennyNeural')
+    with pytest.raises(ValueError):
+        registry.counter('requests_total', 'Requests.')
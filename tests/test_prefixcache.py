@@ -0,0 +1,76 @@
+import time
+import torch
+from shirley.engines import KVCacheLayout, PrefixCache
+from tests.models import generate, make_prompt
+
+
+# One layer, one head and one channel holding the token id, so every cached position is 2 * 4 bytes and a slice shows
+# exactly which tokens it covers.
+TOKEN_BYTES = 8
+
+
+def make_cache(input_ids):
+    keys = torch.tensor(input_ids, dtype=torch.float32).view(1, 1, -1, 1)
+    return ((keys, keys.clone()),)
+
+
+def get_tokens(past_key_values):
+    return [int(token) for token in past_key_values[0][0].flatten().tolist()]
+
+
+def make_prefix_cache(max_bytes: int = 1024) -> PrefixCache:
+    return PrefixCache(layout=KVCacheLayout(seq_dim=2), max_bytes=max_bytes)
+
+
+def test_match_is_bounded_by_min_and_max_length():
+    cache = make_prefix_cache()
+    cache.insert(input_ids=[1, 2, 3, 4, 5], past_key_values=make_cache([1, 2, 3, 4, 5]))
+
+    length, past_key_values = cache.match(input_ids=[1, 2, 3, 4, 5, 6])
+    assert (length, get_tokens(past_key_values)) == (5, [1, 2, 3, 4, 5])
+    length, past_key_values = cache.match(input_ids=[1, 2, 3, 4, 5, 6], max_length=3)
+    assert (length, get_tokens(past_key_values)) == (3, [1, 2, 3])
+    assert cache.match(input_ids=[1, 2, 3, 4, 5, 6], min_length=6) == (0, None)
+    assert cache.match(input_ids=[9, 1, 2]) == (0, None)
+    assert cache.stats()['hits'] == 2
+
+
+def test_insert_splits_a_partially_matching_edge():
+    cache = make_prefix_cache()
+    cache.insert(input_ids=[1, 2, 3, 4], past_key_values=make_cache([1, 2, 3, 4]))
+    cache.insert(input_ids=[1, 2, 7, 8], past_key_values=make_cache([1, 2, 7, 8]))
+
+    for input_ids in ([1, 2, 3, 4], [1, 2, 7, 8]):
+        length, past_key_values = cache.match(input_ids=input_ids)
+        assert (length, get_tokens(past_key_values)) == (4, input_ids)
+    length, past_key_values = cache.match(input_ids=[1, 2, 5])
+    assert (length, get_tokens(past_key_values)) == (2, [1, 2])
+    # The shared head and both tails hold six positions between them, and nothing is counted twice.
+    assert cache.nbytes == 6 * TOKEN_BYTES
+
+
+def test_least_recently_used_leaves_are_evicted_to_max_bytes():
+    cache = make_prefix_cache(max_bytes=8 * TOKEN_BYTES)
+    cache.insert(input_ids=[1, 2, 3, 4], past_key_values=make_cache([1, 2, 3, 4]))
+    time.sleep(0.001)
+    cache.insert(input_ids=[5, 6, 7, 8], past_key_values=make_cache([5, 6, 7, 8]))
+    time.sleep(0.001)
+    cache.match(input_ids=[1, 2, 3, 4])
+    time.sleep(0.001)
+    cache.insert(input_ids=[9, 10, 11, 12], past_key_values=make_cache([9, 10, 11, 12]))
+
+    assert cache.match(input_ids=[5, 6, 7, 8]) == (0, None)
+    assert cache.match(input_ids=[1, 2, 3, 4])[0] == 4
+    assert cache.match(input_ids=[9, 10, 11, 12])[0] == 4
+    assert cache.nbytes == 8 * TOKEN_BYTES
+    assert cache.stats()['evictions'] == 1
+
+
+def test_a_prefix_cache_hit_generates_the_same_tokens_as_a_cold_prefill(model, make_engine):
+    engine = make_engine(model=model, prefix_cache_size=64 * 1024 * 1024)
+    prefix = make_prompt(length=40, seed=0)
+    list(engine.submit(input_ids=prefix + make_prompt(length=5, seed=1)))
+
+    input_ids = prefix + make_prompt(length=8, seed=2)
+    assert list(engine.submit(input_ids=input_ids)) == generate(model=model, input_ids=input_ids, max_new_tokens=24)
+    assert engine.prefix_cache.stats()['hit_tokens'] >= len(prefix)
@@ -0,0 +1,52 @@
+import asyncio
+import json
+import pstats
+import threading
+from shirley.utils import profiling
+from shirley.utils.profiling import Profiler
+
+
+def test_requests_are_not_sampled_by_default(tmp_path):
+    assert Profiler(directory=tmp_path).sample(name='generate') is None
+    assert Profiler(directory=tmp_path, rate=1.0).sample(name='generate') is not None
+
+
+def test_steps_on_other_threads_are_profiled_and_saved(tmp_path):
+    def generate():
+        for i in range(3):
+            with profiling.span('step'):
+                yield i
+
+    profile = Profiler(directory=tmp_path, rate=1.0).sample(name='generate')
+    stream = profile.wrap(generate())
+    items = []
+    for _ in range(4):
+        thread = threading.Thread(target=lambda: items.extend(stream))
+        thread.start()
+        thread.join()
+    assert items == [0, 1, 2]
+    assert profiling.current() is None
+
+    pstats.Stats(str(next(tmp_path.glob('generate-*.pstats'))))
+    trace = json.loads(next(tmp_path.glob('generate-*.trace.json')).read_text(encoding='utf-8'))
+    names = [event['name'] for event in trace['traceEvents'] if event['ph'] == 'X']
+    assert names.count('step') == 3
+    assert 'generate' in names
+
+
+def test_async_streams_record_spans_without_cprofile(tmp_path):
+    async def convert():
+        for i in range(2):
+            with profiling.span('synthesize'):
+                await asyncio.sleep(0)
+            yield i
+
+    async def run():
+        profile = Profiler(directory=tmp_path, rate=1.0).sample(name='convert')
+        return [item async for item in profile.wrap_async(convert())]
+
+    assert asyncio.run(run()) == [0, 1]
+    assert profiling.current() is None
+    assert not list(tmp_path.glob('convert-*.pstats'))
+    trace = json.loads(next(tmp_path.glob('convert-*.trace.json')).read_text(encoding='utf-8'))
+    assert [event['name'] for event in trace['traceEvents'] if event['ph'] == 'X'].count('synthesize') == 2
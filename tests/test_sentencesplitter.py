@@ -0,0 +1,28 @@
+from shirley.utils.sentencesplitter import SentenceSplitter, split_chunks, split_sentences
+
+
+def test_split_sentences():
+    text = 'Hello world. How are you?\n你好。我很好！She said "fine." The end'
+    assert split_sentences(text) == [
+        'Hello world.',
+        'How are you?',
+        '你好。',
+        '我很好！',
+        'She said "fine."',
+        'The end',
+    ]
+
+
+def test_streamed_text_yields_the_same_sentences():
+    text = 'First one. Second one! 第一句。“第二句？”Trailing text'
+    splitter = SentenceSplitter()
+    sentences = []
+    for char in text:
+        sentences += splitter.feed(char)
+    assert sentences + splitter.flush() == split_sentences(text)
+
+
+def test_split_chunks_packs_whole_sentences():
+    text = 'One two. Three four. Five six seven eight nine. Ten.'
+    assert split_chunks(text, max_chars=20) == ['One two. Three four.', 'Five six seven eight nine.', 'Ten.']
+    assert split_chunks(text, max_chars=1000) == [text]
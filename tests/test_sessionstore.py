@@ -0,0 +1,30 @@
+import time
+from shirley.utils.sessionstore import SessionStore
+
+
+def test_get_creates_and_reuses_session():
+    store = SessionStore(factory=list)
+    session = store.get('a')
+    session.append(1)
+    assert store.get('a') == [1]
+    assert len(store) == 1
+
+
+def test_least_recently_used_session_is_evicted():
+    store = SessionStore(factory=list, max_sessions=2)
+    store.get('a')
+    store.get('b')
+    store.get('a')
+    store.get('c')
+    assert 'a' in store
+    assert 'b' not in store
+    assert 'c' in store
+
+
+def test_idle_session_is_evicted():
+    store = SessionStore(factory=list, timeout=0.05)
+    store.get('a')
+    time.sleep(0.1)
+    store.get('b')
+    assert 'a' not in store
+    assert 'b' in store
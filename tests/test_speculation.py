@@ -0,0 +1,44 @@
+import pytest
+from tests.models import generate, make_model, make_prompt
+
+
+MAX_NEW_TOKENS = 24
+
+
+@pytest.fixture(scope='module')
+def draft_model():
+    return make_model(seed=1, n_layer=1)
+
+
+@pytest.mark.parametrize('draft', ['other', 'same'])
+def test_greedy_output_with_a_draft_equals_output_without(model, draft_model, make_engine, draft):
+    engine = make_engine(model=model, draft_model=draft_model if draft == 'other' else model, num_draft_tokens=4)
+    for seed in range(6):
+        input_ids = make_prompt(length=10 + seed, seed=seed)
+        assert list(engine.submit(input_ids=input_ids)) == generate(
+            model=model, input_ids=input_ids, max_new_tokens=MAX_NEW_TOKENS,
+        )
+    assert engine.speculative_decoder.stats()['steps'] > 0
+
+
+def test_max_new_tokens_inside_an_accepted_draft_run(model, make_engine):
+    # With the target as its own draft every proposal is accepted, so the budget runs out in the middle of a run.
+    engine = make_engine(model=model, draft_model=model, num_draft_tokens=4)
+    input_ids = make_prompt(length=12, seed=0)
+    for max_new_tokens in (2, 3, 6, 7):
+        expected = generate(model=model, input_ids=input_ids, max_new_tokens=max_new_tokens)
+        assert list(engine.submit(input_ids=input_ids, max_new_tokens=max_new_tokens)) == expected
+
+
+def test_stop_token_inside_an_accepted_draft_run(model, make_engine):
+    engine = make_engine(model=model, draft_model=model, num_draft_tokens=8)
+    # A prompt whose greedy continuation stops well before the budget, so the stop token is an accepted draft token.
+    input_ids = next(
+        input_ids
+        for input_ids in (make_prompt(length=12, seed=seed) for seed in range(100, 400))
+        if 4 <= len(generate(model=model, input_ids=input_ids, max_new_tokens=MAX_NEW_TOKENS)) < MAX_NEW_TOKENS - 8
+    )
+    assert list(engine.submit(input_ids=input_ids)) == generate(
+        model=model, input_ids=input_ids, max_new_tokens=MAX_NEW_TOKENS,
+    )
+    assert engine.speculative_decoder.stats()['accepted_tokens'] > 0
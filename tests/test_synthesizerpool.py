@@ -0,0 +1,46 @@
+import asyncio
+from benchmarks.fakesynthesizer import FakeSynthesizer
+from shirley.utils.synthesizerpool import SynthesizerPool
+
+
+def test_speak_returns_result_of_each_request():
+    pool = SynthesizerPool(factory=FakeSynthesizer, max_synthesizers=2)
+
+    async def main():
+        return await asyncio.gather(*[pool.speak(key='a', text=str(i)) for i in range(6)])
+
+    assert asyncio.run(main()) == [('a', str(i)) for i in range(6)]
+    assert pool.size('a') == 2
+
+
+def test_synthesizers_are_reused_across_calls():
+    created = []
+
+    def factory(voice: str) -> FakeSynthesizer:
+        created.append(voice)
+        return FakeSynthesizer(voice=voice, latency=0.0)
+
+    pool = SynthesizerPool(factory=factory, max_synthesizers=4)
+
+    async def main():
+        for i in range(3):
+            await pool.speak(key='a', text=str(i))
+        await pool.speak(key='b', text='x')
+
+    asyncio.run(main())
+    assert created == ['a', 'b']
+
+
+def test_cancelled_request_discards_synthesizer():
+    pool = SynthesizerPool(factory=lambda voice: FakeSynthesizer(voice=voice, latency=0.2), max_synthesizers=1)
+
+    async def main():
+        task = asyncio.ensure_future(pool.speak(key='a', text='slow'))
+        await asyncio.sleep(0.05)
+        waiting = asyncio.ensure_future(pool.speak(key='a', text='next'))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        return await waiting
+
+    assert asyncio.run(main()) == ('a', 'next')
+    assert pool.size('a') == 1
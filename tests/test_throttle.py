@@ -0,0 +1,25 @@
+from shirley.utils import throttle
+from shirley.utils.throttle import Throttle
+
+
+def use_clock(monkeypatch, times):
+    clock = iter(times)
+    monkeypatch.setattr(throttle.time, 'monotonic', lambda: next(clock))
+
+
+def test_updates_are_spaced_by_the_interval(monkeypatch):
+    use_clock(monkeypatch, [0.0, 0.05, 0.09, 0.1, 0.15, 0.25])
+    limiter = Throttle(max_updates_per_second=10)
+    assert [limiter.ready(length=length) for length in range(1, 7)] == [True, False, False, True, False, True]
+
+
+def test_updates_wait_for_enough_new_characters(monkeypatch):
+    use_clock(monkeypatch, [0.0, 1.0, 2.0, 3.0])
+    limiter = Throttle(max_updates_per_second=10, min_chars=5)
+    # A skipped update does not move the baseline, so characters accumulate until there are enough.
+    assert [limiter.ready(length=length) for length in (5, 8, 10, 14)] == [True, False, True, False]
+
+
+def test_without_limits_every_update_is_ready():
+    limiter = Throttle()
+    assert all(limiter.ready(length=length) for length in range(10))
@@ -0,0 +1,37 @@
+from shirley.utils.tokenbudget import DROPPED, FULL, TEXT, TokenCounter, fit_turns
+
+
+def test_counts_are_cached_per_key():
+    calls = []
+    counter = TokenCounter(max_entries=2)
+    assert counter.count(key='a', fn=lambda: calls.append('a') or 1) == 1
+    assert counter.count(key='a', fn=lambda: calls.append('a') or 1) == 1
+    counter.count(key='b', fn=lambda: calls.append('b') or 2)
+    counter.count(key='c', fn=lambda: calls.append('c') or 3)
+    counter.count(key='a', fn=lambda: calls.append('a') or 1)
+    assert calls == ['a', 'b', 'c', 'a']
+    assert len(counter) == 2
+
+
+def test_newest_turns_are_kept_and_old_documents_dropped_first():
+    turns = [(10, 0), (10, 500), (10, 0), (20, 0)]
+    decisions, report = fit_turns(turns=turns, max_tokens=100)
+    assert decisions == [FULL, TEXT, FULL, FULL]
+    assert report['kept_tokens'] == 50
+    assert report['dropped_tokens'] == 500
+    assert report['trimmed_turns'] == 1
+
+
+def test_turns_older_than_the_first_that_does_not_fit_are_dropped():
+    turns = [(1, 0), (50, 0), (10, 0), (60, 0)]
+    decisions, report = fit_turns(turns=turns, max_tokens=100)
+    assert decisions == [DROPPED, DROPPED, FULL, FULL]
+    assert (report['kept_turns'], report['dropped_turns']) == (2, 2)
+    assert report['dropped_tokens'] == 51
+
+
+def test_the_latest_turn_is_always_kept():
+    decisions, _ = fit_turns(turns=[(10, 0), (200, 300)], max_tokens=100)
+    assert decisions == [DROPPED, FULL]
+    decisions, _ = fit_turns(turns=[(10, 0), (200, 300)], max_tokens=None)
+    assert decisions == [FULL, FULL]
@@ -0,0 +1,17 @@
+import time
+from shirley.utils.ttlcache import TTLCache
+
+
+def test_entries_persist_across_instances(tmp_path):
+    filename = tmp_path / 'cache.json'
+    TTLCache(filename=filename).set('en-US', ['en-US-JennyNeural'])
+    assert TTLCache(filename=filename).get('en-US') == ['en-US-JennyNeural']
+
+
+def test_expired_entries_are_only_returned_when_stale():
+    cache = TTLCache(ttl=0.05)
+    cache.set('en-US', ['en-US-JennyNeural'])
+    assert 'en-US' in cache
+    time.sleep(0.1)
+    assert cache.get('en-US') is None
+    assert cache.get('en-US', stale=True) == ['en-US-JennyNeural']
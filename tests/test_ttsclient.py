@@ -0,0 +1,68 @@
+import asyncio
+import pytest
+import shirley as sh
+from benchmarks.fakesynthesizer import FakeSynthesizer
+from benchmarks.tts import make_result
+
+
+@pytest.fixture
+def make_client(monkeypatch, tmp_path):
+    monkeypatch.setenv('GRADIO_TEMP_DIR', str(tmp_path))
+
+    def make(**kwargs) -> sh.TextToSpeechClient:
+        return sh.TextToSpeechClient(options=sh.TextToSpeechClientOptions(prefetch_voices=False, **kwargs))
+
+    return make
+
+
+def test_concurrent_identical_requests_share_one_synthesis(make_client):
+    texts = []
+
+    def count(voice: str, text: str):
+        texts.append(text)
+        return make_result(voice=voice, text=text)
+
+    client = make_client(
+        synthesizer_factory=lambda voice: FakeSynthesizer(voice=voice, latency=0.05, make_result=count),
+        in_memory=True,
+    )
+
+    async def main():
+        return await asyncio.gather(*[client.text_to_speech_async(text='Hello.', voice='a') for _ in range(4)])
+
+    results = asyncio.run(main())
+    assert texts == ['Hello.']
+    assert all(sample_rate == results[0][0] and (samples == results[0][1]).all() for sample_rate, samples in results)
+    assert client._audios_in_flight == {}
+
+    asyncio.run(client.text_to_speech_async(text='Hello.', voice='a'))
+    asyncio.run(client.text_to_speech_async(text='Hello.', voice='b'))
+    # The repeat is served from the cache; another voice is another audio.
+    assert texts == ['Hello.', 'Hello.']
+
+
+def test_a_failed_synthesis_fails_every_waiter_and_is_retried(make_client):
+    client = make_client(synthesizer_factory=lambda voice: FakeSynthesizer(voice=voice), in_memory=True)
+    calls = []
+
+    async def fail(text: str, voice: str):
+        calls.append(text)
+        await asyncio.sleep(0.05)
+        raise RuntimeError('Speech service unavailable.')
+
+    client._speak_chunk = fail
+
+    async def main():
+        return await asyncio.gather(
+            *[client.text_to_speech_async(text='Hello.', voice='a') for _ in range(3)],
+            return_exceptions=True,
+        )
+
+    errors = asyncio.run(main())
+    assert len(calls) == 1
+    assert [str(error) for error in errors] == ['Speech service unavailable.'] * 3
+    assert client._audios_in_flight == {}
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(client.text_to_speech_async(text='Hello.', voice='a'))
+    assert len(calls) == 2
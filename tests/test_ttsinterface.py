@@ -0,0 +1,32 @@
+import asyncio
+import gradio as gr
+import shirley as sh
+from benchmarks.fakesynthesizer import FakeSynthesizer
+from benchmarks.tts import make_result
+
+
+def test_concurrent_conversions_use_their_own_text_and_voice(monkeypatch, tmp_path):
+    monkeypatch.setenv('GRADIO_TEMP_DIR', str(tmp_path))
+    requests = []
+
+    def record(voice: str, text: str):
+        requests.append((voice, text))
+        return make_result(voice=voice, text=text)
+
+    client = sh.TextToSpeechClientOptions(
+        synthesizer_factory=lambda voice: FakeSynthesizer(voice=voice, latency=0.05, make_result=record),
+        prefetch_voices=False,
+        in_memory=True,
+    )
+    with gr.Blocks():
+        interface = sh.TextToSpeechInterface(options=sh.TextToSpeechInterfaceOptions(client=client))
+
+    async def main():
+        return await asyncio.gather(
+            interface._convert('Hello.', 'a'),
+            interface._convert('Goodbye, then.', 'b'),
+        )
+
+    (_, first), (_, second) = asyncio.run(main())
+    assert sorted(requests) == [('a', 'Hello.'), ('b', 'Goodbye, then.')]
+    assert len(first) < len(second)
@@ -1,8 +1,14 @@
+import fastapi
 import gradio as gr
+import os
 import shirley as sh
+import uvicorn
+from fastapi.responses import PlainTextResponse
+from shirley.utils import metrics
 
 
 def main() -> None:
+    profile_rate = float(os.environ.get('SHIRLEY_PROFILE_RATE') or 0.0)
     avatar_images=(
         sh.utils.getpath('./static/images/grinning-face.png'),
         sh.utils.getpath('./static/images/shark.png'),
@@ -22,18 +28,24 @@ def main() -> None:
             sh.ChatInterface(
                 options=sh.ChatInterfaceOptions(
                     chatbot=sh.ChatbotOptions(avatar_images=avatar_images),
+                    preload_model=os.environ.get('SHIRLEY_PRELOAD_MODEL'),
+                    profile_rate=profile_rate,
                 ),
             )
         with gr.Tab(label='🗣️ Text-To-Speech (文字转语音)'):
-            sh.TextToSpeechInterface()
+            sh.TextToSpeechInterface(options=sh.TextToSpeechInterfaceOptions(profile_rate=profile_rate))
         sh.FooterInterface()
 
-    blocks.queue().launch(
-        server_name='127.0.0.1',
-        server_port=8000,
-        favicon_path=sh.utils.getpath('./static/favicon.ico'),
-        show_api=False,
-    )
+    # The app is served beside a Prometheus `/metrics` route, so it is mounted instead of launched.
+    app = fastapi.FastAPI()
+
+    @app.get('/metrics')
+    def get_metrics() -> PlainTextResponse:
+        return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+    blocks.show_api = False
+    app = gr.mount_gradio_app(app, blocks.queue(), path='/', favicon_path=sh.utils.getpath('./static/favicon.ico'))
+    uvicorn.run(app, host='127.0.0.1', port=int(os.environ.get('SHIRLEY_PORT') or 8000))
 
 
 if __name__ == '__main__':